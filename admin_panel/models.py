@@ -1,3 +1,17 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class DashboardStat(models.Model):
+    """One materialized dashboard figure, maintained by admin_panel.stats
+
+    Totals and monthly article counts live in count and are adjusted with
+    F() deltas; chart series and top-N lists live in data.
+    """
+    key = models.CharField(max_length=50, unique=True)
+    count = models.BigIntegerField(default=0)
+    data = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.key
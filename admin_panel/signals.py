@@ -0,0 +1,116 @@
+"""
+Signal handlers keeping the dashboard snapshot in step with content writes
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import Article, Category, Newsletter, SubCategory
+from . import stats
+
+
+def article_totals(is_featured, status, sign):
+    return {
+        'featured': sign if is_featured else 0,
+        'published': sign if status == 'published' else 0,
+        'draft': sign if status == 'draft' else 0,
+    }
+
+
+@receiver(pre_save, sender=Article)
+def remember_article_state(sender, instance, raw=False, **kwargs):
+    """Capture the featured flag and status the article is currently counted under"""
+    instance._was_counted = None
+    if raw or instance.pk is None:
+        return
+    # Values as loaded (see Article.from_db), or the row itself after a partial load
+    loaded = getattr(instance, '_loaded_values', {})
+    if 'is_featured' in loaded and 'status' in loaded:
+        instance._was_counted = (loaded['is_featured'], loaded['status'])
+    else:
+        instance._was_counted = Article.objects.filter(pk=instance.pk).values_list('is_featured', 'status').first()
+
+
+@receiver(post_save, sender=Article)
+def article_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = article_totals(instance.is_featured, instance.status, 1)
+    if created:
+        deltas['articles'] = 1
+        deltas[stats.month_key(instance.created_at)] = 1
+    else:
+        was_counted = getattr(instance, '_was_counted', None)
+        if was_counted is not None:
+            for key, delta in article_totals(*was_counted, -1).items():
+                deltas[key] += delta
+    stats.adjust(deltas)
+    stats.invalidate('recent_articles', 'top_articles', 'top_categories')
+
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, **kwargs):
+    deltas = article_totals(instance.is_featured, instance.status, -1)
+    deltas['articles'] = -1
+    deltas[stats.month_key(instance.created_at)] = -1
+    stats.adjust(deltas)
+    stats.invalidate('recent_articles', 'top_articles', 'top_categories')
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.adjust({'categories': 1})
+    stats.invalidate('top_categories')
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    stats.adjust({'categories': -1})
+    stats.invalidate('top_categories')
+
+
+@receiver(post_save, sender=SubCategory)
+def subcategory_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust({'subcategories': 1})
+
+
+@receiver(post_delete, sender=SubCategory)
+def subcategory_deleted(sender, instance, **kwargs):
+    stats.adjust({'subcategories': -1})
+
+
+@receiver(pre_save, sender=Newsletter)
+def remember_newsletter_state(sender, instance, raw=False, **kwargs):
+    instance._was_active = None
+    if instance.pk and not raw:
+        instance._was_active = Newsletter.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+
+
+@receiver(post_save, sender=Newsletter)
+def newsletter_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    was_active = getattr(instance, '_was_active', None)
+    stats.adjust({'newsletters': int(instance.is_active) - int(bool(was_active))})
+    stats.invalidate('recent_newsletters')
+
+
+@receiver(post_delete, sender=Newsletter)
+def newsletter_deleted(sender, instance, **kwargs):
+    stats.adjust({'newsletters': -1 if instance.is_active else 0})
+    stats.invalidate('recent_newsletters')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust({'users': 1})
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    stats.adjust({'users': -1})
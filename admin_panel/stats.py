@@ -0,0 +1,218 @@
+"""
+Materialized admin dashboard statistics
+The dashboard reads a snapshot of DashboardStat rows in one query instead
+of counting and grouping the content tables on every load. Write
+signals keep the snapshot current: totals and monthly article counts
+take F() deltas, and the short lists they affect are dropped and
+re-read on the next load with small indexed queries.
+refresh_dashboard_stats rebuilds everything, correcting any
+drift from bulk writes that bypass signals (imports, view counts).
+"""
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import events
+from core.models import Article, Category, Newsletter, SubCategory
+from core.pagination import ARTICLE_ORDERINGS, ARTICLE_STATUSES, KeysetPaginator
+from .models import DashboardStat
+
+
+MONTHS = 6
+TOP_CATEGORIES = 8
+TOP_ARTICLES = 5
+RECENT_ITEMS = 5
+ACTIVITY_DAYS = 30
+
+# Lists are re-read at least this often, since view counts and event
+# rollups change through bulk updates that send no signals
+LIST_MAX_AGE = 300
+
+# Totals and how to count them from scratch
+TOTALS = {
+    'articles': lambda: Article.objects.count(),
+    'categories': lambda: Category.objects.count(),
+    'subcategories': lambda: SubCategory.objects.count(),
+    'newsletters': lambda: Newsletter.objects.filter(is_active=True).count(),
+    'users': lambda: User.objects.count(),
+    'featured': lambda: Article.objects.filter(is_featured=True).count(),
+    'published': lambda: Article.objects.filter(status='published').count(),
+    'draft': lambda: Article.objects.filter(status='draft').count(),
+}
+
+
+def month_key(moment):
+    return f'month:{timezone.localtime(moment):%Y-%m}'
+
+
+def month_start(moment, months_back=0):
+    """First instant of the month months_back before moment's month"""
+    moment = timezone.localtime(moment)
+    year, month = divmod(moment.year * 12 + moment.month - 1 - months_back, 12)
+    return moment.replace(year=year, month=month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def top_categories():
+    return [
+        {'name': name, 'count': count}
+        for name, count in Category.objects.order_by('-article_count', 'pk').values_list('name', 'article_count')[:TOP_CATEGORIES]
+    ]
+
+
+def top_articles():
+    return [
+        {'title': card.title, 'views': card.views}
+        for card in KeysetPaginator(Article.objects.cards(), ARTICLE_ORDERINGS['popular'], TOP_ARTICLES, ARTICLE_STATUSES).get_page()
+    ]
+
+
+def recent_articles():
+    return [
+        {
+            'slug': card.slug,
+            'title': card.title,
+            'category': {'name': card.category.name},
+            'created_at': card.created_at,
+            'is_featured': card.is_featured,
+        }
+        for card in KeysetPaginator(Article.objects.cards(), ARTICLE_ORDERINGS['newest'], RECENT_ITEMS, ARTICLE_STATUSES).get_page()
+    ]
+
+
+def recent_newsletters():
+    return list(
+        Newsletter.objects.order_by('-subscribed_at')
+        .values('email', 'subscribed_at', 'is_active')[:RECENT_ITEMS]
+    )
+
+
+def daily_activity():
+    return [
+        {'date': day, 'views': views, 'likes': likes, 'saves': saves}
+        for day, views, likes, saves in events.daily_series(ACTIVITY_DAYS)
+    ]
+
+
+# Lists stored in data and how to rebuild them
+LISTS = {
+    'top_categories': top_categories,
+    'top_articles': top_articles,
+    'recent_articles': recent_articles,
+    'recent_newsletters': recent_newsletters,
+    'daily_activity': daily_activity,
+}
+
+
+def adjust(deltas):
+    """Apply {key: delta} to stored counters in a single UPDATE"""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = DashboardStat.objects.filter(key__in=deltas).update(count=F('count') + Case(
+        *[When(key=key, then=Value(delta)) for key, delta in deltas.items()],
+        default=Value(0),
+    ))
+    if updated < len(deltas):
+        for key, delta in deltas.items():
+            if key.startswith('month:') and delta > 0:
+                # First article of a new month
+                DashboardStat.objects.get_or_create(key=key, defaults={'count': delta})
+
+
+def invalidate(*names):
+    """Drop stored lists so the next dashboard load re-reads them"""
+    DashboardStat.objects.filter(key__in=names).delete()
+
+
+def build_lists(*names):
+    return [DashboardStat(key=name, data=LISTS[name]()) for name in names]
+
+
+def upsert(rows):
+    """Insert rows, overwriting any stored under the same keys"""
+    return DashboardStat.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['key'], update_fields=['count', 'data', 'updated_at'],
+    )
+
+
+def refresh_lists(*names):
+    """Re-read the given lists into the snapshot, returning their rows"""
+    return upsert(build_lists(*names)) if names else []
+
+
+def refresh_all():
+    """Rebuild the whole snapshot from the content tables"""
+    since = month_start(timezone.now(), MONTHS - 1)
+    months = (
+        Article.objects.filter(created_at__gte=since)
+        .annotate(month=TruncMonth('created_at')).values('month')
+        .annotate(total=Count('id')).values_list('month', 'total')
+    )
+    rows = [DashboardStat(key=key, count=count()) for key, count in TOTALS.items()]
+    rows += [DashboardStat(key=month_key(month), count=total) for month, total in months]
+    rows += build_lists(*LISTS)
+    with transaction.atomic():
+        DashboardStat.objects.exclude(key__in=[row.key for row in rows]).delete()
+        upsert(rows)
+
+
+class Snapshot:
+    """Dashboard figures read from DashboardStat in one query"""
+
+    def __init__(self, rows):
+        self.counts = {row.key: row.count for row in rows}
+        self.data = {row.key: row.data for row in rows}
+
+    def total(self, key):
+        return self.counts.get(key, 0)
+
+    def list(self, key):
+        return self.data.get(key) or []
+
+    def months(self, now=None):
+        """[(label, count)] for the last MONTHS months, oldest first"""
+        now = now or timezone.now()
+        series = []
+        for back in reversed(range(MONTHS)):
+            start = month_start(now, back)
+            series.append((start.strftime('%b %Y'), self.counts.get(month_key(start), 0)))
+        return series
+
+    def dated(self, key, field):
+        """A stored list with its timestamps turned back into datetimes"""
+        items = []
+        for item in self.list(key):
+            item = dict(item)
+            if isinstance(item.get(field), str):
+                item[field] = parse_datetime(item[field])
+            items.append(item)
+        return items
+
+
+def get_snapshot():
+    """Read the snapshot, rebuilding whatever is missing or stale"""
+    rows = {row.key: row for row in DashboardStat.objects.all()}
+    if any(key not in rows for key in TOTALS):
+        refresh_all()
+        rows = {row.key: row for row in DashboardStat.objects.all()}
+    stale_before = timezone.now() - timedelta(seconds=LIST_MAX_AGE)
+    stale = [name for name in LISTS if name not in rows or rows[name].updated_at < stale_before]
+    for row in refresh_lists(*stale):
+        rows[row.key] = row
+    return Snapshot(rows.values())
+
+
+async def aget_totals(*keys):
+    """{key: total} for async views, read without the lists"""
+    totals = DashboardStat.objects.filter(key__in=keys).values_list('key', 'count')
+    counts = {key: count async for key, count in totals}
+    if len(counts) < len(keys):
+        await sync_to_async(refresh_all)()
+        counts = {key: count async for key, count in totals.all()}
+    return counts
@@ -1,3 +1,128 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from core.models import Article, Category, Newsletter
+from core.queryinspector import get_query_budget
+from core.tests import AsyncViewTestCase, QueryBudgetTestCase, create_sample_content
+from . import stats, urls as admin_urls
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user('editor', 'editor@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def test_every_view_declares_a_budget(self):
+        for pattern in admin_urls.urlpatterns:
+            self.assertIsNotNone(get_query_budget(pattern.callback), f'{pattern.name} has no query budget')
+
+    def test_dashboard(self):
+        # Built snapshot with every list due for a re-read
+        stats.refresh_all()
+        stats.invalidate(*stats.LISTS)
+        self.assertWithinBudget(reverse('admin_panel:dashboard'))
+        self.assertWithinBudget(reverse('admin_panel:stats'))
+
+    def test_category_list(self):
+        self.assertWithinBudget(reverse('admin_panel:category_list'))
+
+    def test_category_delete_checks_for_articles(self):
+        # A drifted counter doesn't let the articles be deleted with their category
+        category = self.articles[0].category
+        Category.objects.filter(pk=category.pk).update(article_count=0)
+        self.assertWithinBudget(reverse('admin_panel:category_delete', args=[category.slug]), 'post')
+        self.assertTrue(Category.objects.filter(pk=category.pk).exists())
+
+    def test_article_list(self):
+        self.assertWithinBudget(reverse('admin_panel:article_list'))
+        self.assertWithinBudget(reverse('admin_panel:article_list') + '?category=category-1&status=published')
+
+    def test_article_forms(self):
+        self.assertWithinBudget(reverse('admin_panel:article_create'))
+        self.assertWithinBudget(reverse('admin_panel:article_edit', args=[self.articles[0].slug]))
+
+    def test_article_stats(self):
+        self.assertWithinBudget(reverse('admin_panel:article_stats', args=[self.articles[0].slug]) + '?days=90')
+
+    def test_newsletter_list(self):
+        self.assertWithinBudget(reverse('admin_panel:newsletter_list'))
+
+    def test_user_list(self):
+        self.assertWithinBudget(reverse('admin_panel:user_list'))
+
+    def test_get_subcategories(self):
+        category = self.articles[0].category
+        self.assertWithinBudget(reverse('admin_panel:get_subcategories') + f'?category_id={category.id}')
+
+
+class AdminAsyncViewTests(AsyncViewTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user('editor', 'editor@example.com', 'password', is_staff=True)
+
+    async def test_api_under_asgi(self):
+        category = self.articles[0].category
+        await sync_to_async(self.async_client.force_login)(self.staff)
+        response = await self.async_client.get(reverse('admin_panel:get_subcategories'), {'category_id': category.id})
+        self.assertEqual(len(response.json()['subcategories']), await category.subcategories.acount())
+        await sync_to_async(stats.refresh_all)()
+        response = await self.async_client.get(reverse('admin_panel:stats'))
+        self.assertEqual(response.json()['users'], 2)
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('admin_panel:stats'))
+        self.assertRedirects(response, reverse('core:home'), fetch_redirect_response=False)
+
+
+class DashboardStatsTests(TestCase):
+
+    def test_snapshot_follows_writes(self):
+        create_sample_content(categories=2, articles_per_category=2)
+        stats.refresh_all()
+        category = Category.objects.first()
+        Article.objects.create(title='New', slug='new', excerpt='', content='', category=category, is_featured=True)
+        article = Article.objects.get(slug='healthy-habit-0-1')
+        article.status = 'draft'
+        article.save()
+        Article.objects.get(slug='healthy-habit-1-1').delete()
+        newsletter = Newsletter.objects.get()
+        newsletter.is_active = False
+        newsletter.save()
+        User.objects.create_user('another')
+
+        snapshot = stats.get_snapshot()
+        for key, count in stats.TOTALS.items():
+            self.assertEqual(snapshot.total(key), count(), key)
+        self.assertEqual(snapshot.months()[-1][1], 4)
+        self.assertEqual(snapshot.list('recent_articles')[0]['title'], 'New')
+
+    def test_partially_loaded_articles_keep_totals_exact(self):
+        create_sample_content(categories=1, articles_per_category=3)
+        stats.refresh_all()
+        article = Article.objects.only('id', 'title').get(slug='healthy-habit-0-1')
+        article.status = 'draft'
+        article.save()
+        # Built by hand with an existing pk, so nothing was loaded
+        featured = Article.objects.get(slug='healthy-habit-0-0')
+        copy = Article(**{field.attname: getattr(featured, field.attname) for field in Article._meta.concrete_fields})
+        copy.is_featured = False
+        copy.save()
+
+        snapshot = stats.get_snapshot()
+        for key in ('articles', 'featured', 'published', 'draft'):
+            self.assertEqual(snapshot.total(key), stats.TOTALS[key](), key)
+
+    def test_missing_snapshot_is_rebuilt(self):
+        create_sample_content(categories=1, articles_per_category=2)
+        self.assertEqual(async_to_sync(stats.aget_totals)('articles', 'users'), {'articles': 2, 'users': 0})
+        self.assertEqual(stats.get_snapshot().total('categories'), 1)
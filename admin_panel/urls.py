@@ -1,11 +1,15 @@
 """
 Admin Panel URLs
 """
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'admin_panel'
 
+# The JSON endpoints' async views, for healthline.asgi (see core/urls.py)
+ASYNC = settings.ASYNC_VIEWS
+
 urlpatterns = [
     # Authentication
     path('login/', views.admin_login, name='login'),
@@ -13,7 +17,7 @@ urlpatterns = [
     
     # Dashboard
     path('', views.dashboard, name='dashboard'),
-    path('stats/', views.dashboard_stats, name='stats'),
+    path('stats/', views.adashboard_stats if ASYNC else views.dashboard_stats, name='stats'),
     
     # Categories
     path('categories/', views.category_list, name='category_list'),
@@ -26,6 +30,7 @@ urlpatterns = [
     path('articles/create/', views.article_create, name='article_create'),
     path('articles/<slug:slug>/edit/', views.article_edit, name='article_edit'),
     path('articles/<slug:slug>/delete/', views.article_delete, name='article_delete'),
+    path('articles/<slug:slug>/stats/', views.article_stats, name='article_stats'),
     
     # Newsletters
     path('newsletters/', views.newsletter_list, name='newsletter_list'),
@@ -37,5 +42,5 @@ urlpatterns = [
     path('users/<int:pk>/toggle-staff/', views.user_toggle_staff, name='user_toggle_staff'),
     
     # API
-    path('api/subcategories/', views.get_subcategories, name='get_subcategories'),
+    path('api/subcategories/', views.aget_subcategories if ASYNC else views.get_subcategories, name='get_subcategories'),
 ]
\ No newline at end of file
@@ -2,18 +2,29 @@
 Custom Admin Panel Views
 Modern admin interface for managing content
 """
+from functools import wraps
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import JsonResponse
 from django.core.paginator import Paginator
-from django.db.models import Count
+from django.utils.dateparse import parse_date
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.urls import reverse
 
+from core import events
+from core.asyncviews import aget_user
 from core.models import Category, SubCategory, Article, Newsletter, UserProfile
+from core.pagination import ARTICLE_ORDERINGS, ARTICLE_STATUSES, KeysetPaginator
+from core.queryinspector import query_budget
+
+from . import stats
+
+
+ARTICLE_STATS_PERIODS = (7, 30, 90, 365)
 
 
 def is_staff_user(user):
@@ -39,9 +50,28 @@ def staff_required(login_url=None):
     return decorator
 
 
+def async_staff_required():
+    """staff_required for async views"""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            user = await aget_user(request)
+            if not user.is_authenticated:
+                # aget_user() has loaded the session, so this only touches memory
+                request.session['admin_next_url'] = request.get_full_path()
+                return redirect(reverse('admin_panel:login'))
+            if not user.is_staff:
+                messages.error(request, 'You do not have permission to access the admin panel.')
+                return redirect(reverse('core:home'))
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 # Admin Login View
 from django.views.decorators.csrf import ensure_csrf_cookie
 
+@query_budget(5)
 @ensure_csrf_cookie
 def admin_login(request):
     """Custom admin login page"""
@@ -75,6 +105,7 @@ def admin_login(request):
     return render(request, 'admin_panel/login.html')
 
 
+@query_budget(4)
 def admin_logout(request):
     """Admin logout"""
     logout(request)
@@ -82,64 +113,44 @@ def admin_logout(request):
     return redirect('admin_panel:login')
 
 
+@query_budget(11)
 @staff_required()
 def dashboard(request):
     """Admin dashboard with statistics"""
-    from django.db.models.functions import TruncMonth
     import json
     
-    # Basic stats
-    total_articles = Article.objects.count()
-    total_categories = Category.objects.count()
-    total_subcategories = SubCategory.objects.count()
-    total_newsletters = Newsletter.objects.filter(is_active=True).count()
-    total_users = User.objects.count()
-    featured_articles = Article.objects.filter(is_featured=True).count()
+    # Figures come from the materialized snapshot (see admin_panel.stats)
+    snapshot = stats.get_snapshot()
     
     # Articles by category for chart
-    articles_by_category = Category.objects.annotate(
-        article_count=Count('articles')
-    ).order_by('-article_count')[:8]
-    
-    category_names = json.dumps([cat.name for cat in articles_by_category])
-    category_counts = [cat.article_count for cat in articles_by_category]
+    articles_by_category = snapshot.list('top_categories')
+    category_names = json.dumps([cat['name'] for cat in articles_by_category])
+    category_counts = [cat['count'] for cat in articles_by_category]
     
     # Articles over time (last 6 months)
-    from datetime import datetime, timedelta
-    from django.utils import timezone
-    
-    six_months_ago = timezone.now() - timedelta(days=180)
-    articles_by_month = Article.objects.filter(
-        created_at__gte=six_months_ago
-    ).annotate(
-        month=TruncMonth('created_at')
-    ).values('month').annotate(
-        count=Count('id')
-    ).order_by('month')
-    
-    article_months = json.dumps([
-        item['month'].strftime('%b %Y') for item in articles_by_month
-    ])
-    article_counts_by_month = [item['count'] for item in articles_by_month]
-    
-    # Article status counts
-    published_count = Article.objects.filter(status='published').count()
-    draft_count = Article.objects.filter(status='draft').count()
+    articles_by_month = snapshot.months()
+    article_months = json.dumps([month for month, count in articles_by_month])
+    article_counts_by_month = [count for month, count in articles_by_month]
     
     # Top viewed articles
-    top_articles = Article.objects.order_by('-views')[:5]
-    top_articles_titles = json.dumps([article.title[:30] + '...' if len(article.title) > 30 else article.title for article in top_articles])
-    top_articles_views = [article.views for article in top_articles]
+    top_articles = snapshot.list('top_articles')
+    top_articles_titles = json.dumps([article['title'][:30] + '...' if len(article['title']) > 30 else article['title'] for article in top_articles])
+    top_articles_views = [article['views'] for article in top_articles]
+    
+    # Reader activity (last 30 days), from the daily event rollups
+    daily_activity = snapshot.list('daily_activity')
+    activity_days = json.dumps([parse_date(str(day['date'])).strftime('%b %d') for day in daily_activity])
+    activity_views = [day['views'] for day in daily_activity]
     
     context = {
-        'total_articles': total_articles,
-        'total_categories': total_categories,
-        'total_subcategories': total_subcategories,
-        'total_newsletters': total_newsletters,
-        'total_users': total_users,
-        'featured_articles': featured_articles,
-        'recent_articles': Article.objects.order_by('-created_at')[:5],
-        'recent_newsletters': Newsletter.objects.order_by('-subscribed_at')[:5],
+        'total_articles': snapshot.total('articles'),
+        'total_categories': snapshot.total('categories'),
+        'total_subcategories': snapshot.total('subcategories'),
+        'total_newsletters': snapshot.total('newsletters'),
+        'total_users': snapshot.total('users'),
+        'featured_articles': snapshot.total('featured'),
+        'recent_articles': snapshot.dated('recent_articles', 'created_at'),
+        'recent_newsletters': snapshot.dated('recent_newsletters', 'subscribed_at'),
         'articles_by_category': articles_by_category,
         
         # Chart data
@@ -147,19 +158,22 @@ def dashboard(request):
         'category_counts': category_counts,
         'article_months': article_months,
         'article_counts_by_month': article_counts_by_month,
-        'published_count': published_count,
-        'draft_count': draft_count,
+        'published_count': snapshot.total('published'),
+        'draft_count': snapshot.total('draft'),
         'top_articles_titles': top_articles_titles,
         'top_articles_views': top_articles_views,
+        'activity_days': activity_days,
+        'activity_views': activity_views,
     }
     return render(request, 'admin_panel/dashboard.html', context)
 
 
 # Category CRUD
+@query_budget(5)
 @staff_required()
 def category_list(request):
     """List all categories"""
-    categories = Category.objects.annotate(article_count=Count('articles')).order_by('order')
+    categories = Category.objects.order_by('order')
     
     paginator = Paginator(categories, 10)
     page = request.GET.get('page')
@@ -172,6 +186,7 @@ def category_list(request):
     return render(request, 'admin_panel/category_list.html', context)
 
 
+@query_budget(6)
 @staff_required()
 def category_create(request):
     """Create new category"""
@@ -204,6 +219,7 @@ def category_create(request):
     return render(request, 'admin_panel/category_form.html', {'action': 'Create'})
 
 
+@query_budget(10)
 @staff_required()
 def category_edit(request, slug):
     """Edit category"""
@@ -234,15 +250,16 @@ def category_edit(request, slug):
     })
 
 
+@query_budget(9)
 @staff_required()
 def category_delete(request, slug):
     """Delete category"""
     category = get_object_or_404(Category, slug=slug)
     
     if request.method == 'POST':
-        article_count = category.article_set.count()
-        if article_count > 0:
-            messages.error(request, f'Cannot delete category with {article_count} articles. Move or delete articles first.')
+        # The stored count can drift, and deleting would cascade to the articles
+        if category.articles.exists():
+            messages.error(request, 'Cannot delete a category that has articles. Move or delete articles first.')
         else:
             category.delete()
             messages.success(request, f'Category "{category.name}" deleted successfully.')
@@ -252,10 +269,11 @@ def category_delete(request, slug):
 
 
 # Article CRUD
+@query_budget(5)
 @staff_required()
 def article_list(request):
     """List all articles with filters"""
-    articles = Article.objects.select_related('category').all()
+    articles = Article.objects.cards()
     
     # Filters
     category_filter = request.GET.get('category')
@@ -269,20 +287,22 @@ def article_list(request):
     if search:
         articles = articles.filter(title__icontains=search)
     
-    articles = articles.order_by('-created_at')
+    paginator = KeysetPaginator(articles, ARTICLE_ORDERINGS['newest'], 15, partition=None if status_filter else ARTICLE_STATUSES)
+    articles = paginator.get_page(request.GET.get('cursor'))
     
-    paginator = Paginator(articles, 15)
-    page = request.GET.get('page')
-    articles = paginator.get_page(page)
+    # Filters without the cursor, for the pagination links
+    filters = request.GET.copy()
+    filters.pop('cursor', None)
     
     context = {
         'articles': articles,
+        'filters': filters.urlencode(),
         'categories': Category.objects.all(),
-        'total_count': Article.objects.count(),
     }
     return render(request, 'admin_panel/article_list.html', context)
 
 
+@query_budget(13)
 @staff_required()
 def article_create(request):
     """Create new article"""
@@ -294,8 +314,8 @@ def article_create(request):
         category_id = request.POST.get('category')
         subcategory_id = request.POST.get('subcategory')
         author = request.POST.get('author', 'Healthline Team')
+        tags = request.POST.get('tags', '')
         image_url = request.POST.get('image_url', '')
-        read_time = request.POST.get('read_time', 5)
         is_featured = request.POST.get('is_featured') == 'on'
         is_trending = request.POST.get('is_trending') == 'on'
         status = request.POST.get('status', 'published')
@@ -314,8 +334,8 @@ def article_create(request):
                 category=category,
                 subcategory=subcategory,
                 author=author,
+                tags=tags,
                 image_url=image_url,
-                read_time=read_time,
                 is_featured=is_featured,
                 is_trending=is_trending,
                 status=status
@@ -337,6 +357,7 @@ def article_create(request):
     return render(request, 'admin_panel/article_form.html', context)
 
 
+@query_budget(12)
 @staff_required()
 def article_edit(request, slug):
     """Edit article"""
@@ -355,8 +376,8 @@ def article_edit(request, slug):
         article.subcategory = SubCategory.objects.get(id=subcategory_id) if subcategory_id else None
         
         article.author = request.POST.get('author', 'Healthline Team')
+        article.tags = request.POST.get('tags', '')
         article.image_url = request.POST.get('image_url', '')
-        article.read_time = request.POST.get('read_time', 5)
         article.is_featured = request.POST.get('is_featured') == 'on'
         article.is_trending = request.POST.get('is_trending') == 'on'
         article.status = request.POST.get('status', 'published')
@@ -382,6 +403,7 @@ def article_edit(request, slug):
     return render(request, 'admin_panel/article_form.html', context)
 
 
+@query_budget(16)
 @staff_required()
 def article_delete(request, slug):
     """Delete article"""
@@ -395,7 +417,39 @@ def article_delete(request, slug):
     return render(request, 'admin_panel/article_confirm_delete.html', {'article': article})
 
 
+@query_budget(4)
+@staff_required()
+def article_stats(request, slug):
+    """Views, likes and saves of one article over time"""
+    import json
+    
+    article = get_object_or_404(Article.objects.cards(), slug=slug)
+    
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    days = days if days in ARTICLE_STATS_PERIODS else 30
+    
+    # Served from the daily rollups, not the raw event log
+    series = events.daily_series(days, article_id=article.id)
+    
+    context = {
+        'article': article,
+        'days': days,
+        'periods': ARTICLE_STATS_PERIODS,
+        'series': series,
+        'total_views': sum(views for day, views, likes, saves in series),
+        'total_likes': sum(likes for day, views, likes, saves in series),
+        'total_saves': sum(saves for day, views, likes, saves in series),
+        'chart_days': json.dumps([day.strftime('%b %d') for day, views, likes, saves in series]),
+        'chart_views': [views for day, views, likes, saves in series],
+    }
+    return render(request, 'admin_panel/article_stats.html', context)
+
+
 # Newsletter Management
+@query_budget(6)
 @staff_required()
 def newsletter_list(request):
     """List all newsletter subscriptions"""
@@ -418,6 +472,7 @@ def newsletter_list(request):
     return render(request, 'admin_panel/newsletter_list.html', context)
 
 
+@query_budget(7)
 @staff_required()
 def newsletter_toggle(request, pk):
     """Toggle newsletter active status"""
@@ -430,6 +485,7 @@ def newsletter_toggle(request, pk):
     return redirect('admin_panel:newsletter_list')
 
 
+@query_budget(5)
 @staff_required()
 def newsletter_delete(request, pk):
     """Delete newsletter subscription"""
@@ -441,6 +497,7 @@ def newsletter_delete(request, pk):
 
 
 # User Management
+@query_budget(6)
 @staff_required()
 def user_list(request):
     """List all users"""
@@ -458,6 +515,7 @@ def user_list(request):
     return render(request, 'admin_panel/user_list.html', context)
 
 
+@query_budget(4)
 @staff_required()
 def user_toggle_staff(request, pk):
     """Toggle user staff status"""
@@ -475,6 +533,7 @@ def user_toggle_staff(request, pk):
 
 
 # API endpoints for dynamic data
+@query_budget(3)
 @staff_required()
 def get_subcategories(request):
     """Get subcategories for a category (AJAX)"""
@@ -483,13 +542,27 @@ def get_subcategories(request):
     return JsonResponse({'subcategories': list(subcategories)})
 
 
+@query_budget(3)
+@async_staff_required()
+async def aget_subcategories(request):
+    """get_subcategories for ASGI (ASYNC_VIEWS)"""
+    category_id = request.GET.get('category_id')
+    subcategories = SubCategory.objects.filter(category_id=category_id).values('id', 'name', 'slug')
+    return JsonResponse({'subcategories': [subcategory async for subcategory in subcategories]})
+
+
+@query_budget(3)
 @staff_required()
 def dashboard_stats(request):
     """Get dashboard statistics (AJAX)"""
-    stats = {
-        'articles': Article.objects.count(),
-        'categories': Category.objects.count(),
-        'newsletters': Newsletter.objects.filter(is_active=True).count(),
-        'users': User.objects.count(),
-    }
-    return JsonResponse(stats)
+    snapshot = stats.get_snapshot()
+    data = {key: snapshot.total(key) for key in ('articles', 'categories', 'newsletters', 'users')}
+    return JsonResponse(data)
+
+
+@query_budget(3)
+@async_staff_required()
+async def adashboard_stats(request):
+    """dashboard_stats for ASGI (ASYNC_VIEWS)"""
+    data = await stats.aget_totals('articles', 'categories', 'newsletters', 'users')
+    return JsonResponse(data)
@@ -15,5 +15,20 @@ python manage.py migrate --noinput
 # Import articles from JSON
 python manage.py import_articles || true
 
+# Derive plain text, read time and rendered HTML for new and changed content
+python manage.py process_article_content
+
+# Resize uploaded images that have no renditions yet
+python manage.py generate_image_renditions
+
+# Build the full-text search index
+python manage.py rebuild_search_index
+
+# Recompute related articles for new and changed articles
+python manage.py update_related_articles
+
+# Rebuild the admin dashboard statistics
+python manage.py refresh_dashboard_stats
+
 # Create superuser using custom command
 python manage.py create_admin
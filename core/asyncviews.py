@@ -0,0 +1,47 @@
+"""
+Helpers for async views
+Under ASGI, async views run on the event loop and the ORM's async
+methods hop to a worker thread per query. Django 4.2's sessions, auth
+and view decorators are sync-only though: touching request.user from a
+coroutine raises SynchronousOnlyOperation. aget_user() loads the session
+and user in a worker thread once per request, and the decorators here
+are the async counterparts of the ones the sync views use.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.middleware import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotAllowed
+from django.utils.log import log_response
+
+
+async def aget_user(request):
+    """request.user, loading it off the event loop if it isn't yet"""
+    if not hasattr(request, '_cached_user'):
+        # Caches it on the request, where request.user reads it from then on
+        await sync_to_async(get_user)(request)
+    return request._cached_user
+
+
+def require_POST(view_func):
+    """Only accept POST"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            response = HttpResponseNotAllowed(['POST'])
+            log_response('Method Not Allowed (%s): %s', request.method, request.path, response=response, request=request)
+            return response
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def login_required(view_func):
+    """Send anonymous users to LOGIN_URL"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,73 @@
+"""
+Cached authentication and page header data
+Logged-in pages used to read the user row on every request and the
+profile row for the header initials. CachedModelBackend keeps users in
+the cache, and header_snapshot() keeps what the page header shows of a
+user; both are keyed by user id and dropped by signals whenever the
+user or their profile is written. With the cached_db session engine, a
+steady-state page makes no queries to authenticate or draw the header.
+
+Both rely on a shared cache for those signals to reach every worker.
+settings only switch the backend on with REDIS_URL, and without a shared
+cache (SHARED_CACHE) snapshots expire after LOCAL_SNAPSHOT_TIMEOUT.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .models import UserProfile, user_initials
+
+
+USER_TIMEOUT = 60 * 60
+SNAPSHOT_TIMEOUT = 60 * 60
+LOCAL_SNAPSHOT_TIMEOUT = 5
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def snapshot_key(user_id):
+    return f'auth:header:{user_id}'
+
+
+def invalidate_user(user_id):
+    """Forget the cached user and their header snapshot"""
+    cache.delete_many([user_key(user_id), snapshot_key(user_id)])
+
+
+def invalidate_snapshot(user_id):
+    cache.delete(snapshot_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend reading the user of a session from the cache"""
+
+    def get_user(self, user_id):
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, USER_TIMEOUT)
+        # The session hash check in get_user() still compares the cached password
+        return user if self.user_can_authenticate(user) else None
+
+
+def header_snapshot(user):
+    """{name, email, initials, avatar_url, avatar_srcset, is_staff} of a signed-in user, from the cache"""
+    key = snapshot_key(user.pk)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        profile = UserProfile.objects.filter(user_id=user.pk).only('avatar', 'profile_photo', 'photo_renditions').first()
+        snapshot = {
+            'name': user.first_name or user.username,
+            'email': user.email,
+            'initials': user_initials(user),
+            'avatar_url': profile.get_avatar_url() if profile else None,
+            'avatar_srcset': profile.get_avatar_srcset() if profile else '',
+            'is_staff': user.is_staff,
+        }
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT if settings.SHARED_CACHE else LOCAL_SNAPSHOT_TIMEOUT)
+    return snapshot
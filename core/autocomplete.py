@@ -0,0 +1,360 @@
+"""
+Search-as-you-type suggestions
+Each process keeps a sorted array of normalized keys over published
+article titles and tags and category names, and answers a prefix by
+bisecting into it, so a suggestion request runs no queries. Every word
+of a name starts a key of its own, so "sleep" also finds "Better Sleep
+Habits". Matches rank by popularity: article views plus likes weighted
+as in core.trending, and a category's published article count.
+
+Ranked results are kept per prefix. Prefixes of up to SHORT_PREFIX
+characters match too many keys to rank on demand, so theirs are worked
+out for every prefix in one pass whenever popularity is reloaded, and
+all kept results are adjusted in place as suggestions change.
+
+Saving or deleting an article or category bumps a version in the cache.
+Processes look at it at most every CHECK_INTERVAL seconds and, when it
+moved, fold in only the articles updated since they last synced. A bump
+only reaches other workers through a shared cache (SHARED_CACHE); with
+per-process caches they fold in changes every LOCAL_REFRESH_INTERVAL
+seconds instead. View counts change without a save, so popularity is
+reloaded every POPULARITY_INTERVAL seconds.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import trending
+from .models import Article, Category
+from .search import TOKEN_RE
+
+
+VERSION_KEY = 'autocomplete:version'
+
+# Seconds between looks at the version, and between popularity reloads
+CHECK_INTERVAL = 1
+POPULARITY_INTERVAL = 5 * 60
+
+# Seconds between syncs when version bumps don't reach this process
+LOCAL_REFRESH_INTERVAL = 5
+
+# Most suggestions one request can ask for
+MAX_SUGGESTIONS = 20
+
+# Keys are cut here; longer prefixes are matched on their first characters
+MAX_KEY_LENGTH = 60
+
+# Prefixes this short have their results worked out in advance
+SHORT_PREFIX = 2
+
+# Ranked results kept for the most recently asked longer prefixes
+RESULT_CACHE_SIZE = 2048
+
+# Articles saved this long before a sync are read again by the next one,
+# in case their transaction committed after the sync read
+SYNC_OVERLAP = timedelta(seconds=5)
+
+ARTICLE_COLUMNS = ('pk', 'title', 'slug', 'tags', 'views', 'likes', 'category_id', 'status')
+CATEGORY_COLUMNS = ('pk', 'name', 'slug', 'published_count')
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so an evicted key never reuses an old version
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Tell every process its suggestions are out of date"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        current_version()
+
+
+def normalize(text):
+    return ' '.join(TOKEN_RE.findall(text.lower()))
+
+
+def name_keys(text):
+    """The name and every tail of it starting at a word"""
+    words = normalize(text).split()
+    return {' '.join(words[start:])[:MAX_KEY_LENGTH] for start in range(len(words))}
+
+
+def prefixes(keys, length=MAX_KEY_LENGTH):
+    """Every prefix of the keys up to length characters"""
+    return {key[:end] for key in keys for end in range(1, min(len(key), length) + 1)}
+
+
+def like_weight():
+    return trending.get_config()['WEIGHTS'].get('like', 0)
+
+
+class Suggestion:
+    __slots__ = ('kind', 'pk', 'label', 'slug', 'category_id', 'popularity')
+
+    def __init__(self, kind, pk, label, slug, popularity, category_id=None):
+        self.kind = kind
+        self.pk = pk
+        self.label = label
+        self.slug = slug
+        self.popularity = popularity
+        self.category_id = category_id
+
+    @property
+    def ref(self):
+        return (self.kind, self.pk)
+
+    def rank_key(self):
+        return (-self.popularity, self.label.lower(), self.ref)
+
+
+def article_item(row, like_weight):
+    """(suggestion, keys) for an ARTICLE_COLUMNS row"""
+    pk, title, slug, tags, views, likes, category_id, status = row
+    keys = name_keys(title)
+    for tag in tags.split(','):
+        keys |= name_keys(tag)
+    return Suggestion('article', pk, title, slug, views + like_weight * likes, category_id), keys
+
+
+def category_item(row):
+    """(suggestion, keys) for a CATEGORY_COLUMNS row"""
+    pk, name, slug, published_count = row
+    return Suggestion('category', pk, name, slug, published_count), name_keys(name)
+
+
+class PrefixIndex:
+    """Sorted (key, ref) pairs over every suggestion, updated in place"""
+
+    def __init__(self, items=()):
+        """Index (suggestion, keys) pairs, sorting the keys once"""
+        self.entries = {}
+        self.keys_of = {}
+        self.kinds = Counter()
+        for entry, keys in items:
+            self.entries[entry.ref] = entry
+            self.keys_of[entry.ref] = keys
+            self.kinds[entry.kind] += 1
+        self.keys = sorted((key, ref) for ref, keys in self.keys_of.items() for key in keys)
+        self.short = {}
+        self.results = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def with_popularity(self, popularity):
+        """Copy sharing the keys, with article popularity replaced from {pk: popularity}"""
+        copy = PrefixIndex()
+        copy.keys = list(self.keys)
+        copy.keys_of = dict(self.keys_of)
+        copy.kinds = Counter(self.kinds)
+        for ref, entry in self.entries.items():
+            if entry.kind == 'article' and entry.pk in popularity:
+                entry = Suggestion(entry.kind, entry.pk, entry.label, entry.slug, popularity[entry.pk], entry.category_id)
+            copy.entries[ref] = entry
+        copy.rank_short_prefixes()
+        return copy
+
+    def rank_short_prefixes(self):
+        """Results for every prefix of up to SHORT_PREFIX characters, in one pass"""
+        short = defaultdict(list)
+        for entry in sorted(self.entries.values(), key=Suggestion.rank_key):
+            for prefix in prefixes(self.keys_of[entry.ref], SHORT_PREFIX):
+                if len(short[prefix]) < MAX_SUGGESTIONS:
+                    short[prefix].append(entry)
+        self.short = dict(short)
+
+    def add(self, entry, keys):
+        """Insert or replace a suggestion"""
+        old = self.entries.get(entry.ref)
+        old_keys = self.detach(entry.ref)
+        self.entries[entry.ref] = entry
+        self.keys_of[entry.ref] = keys
+        self.kinds[entry.kind] += 1
+        for key in keys:
+            insort(self.keys, (key, entry.ref))
+        self.adjust_results(entry.ref, old, prefixes(old_keys), entry, prefixes(keys))
+
+    def remove(self, ref):
+        old = self.entries.get(ref)
+        if old is not None:
+            self.adjust_results(ref, old, prefixes(self.detach(ref)), None, set())
+
+    def detach(self, ref):
+        """Drop a suggestion and its keys, returning the keys"""
+        if self.entries.pop(ref, None) is None:
+            return set()
+        self.kinds[ref[0]] -= 1
+        keys = self.keys_of.pop(ref)
+        for key in keys:
+            del self.keys[bisect_left(self.keys, (key, ref))]
+        return keys
+
+    def adjust_results(self, ref, old, old_prefixes, new, new_prefixes):
+        """Update the kept results of every prefix a change touched"""
+        for results in (self.short, self.results):
+            for prefix in (old_prefixes | new_prefixes) & results.keys():
+                ranked = results[prefix]
+                kept = [entry for entry in ranked if entry.ref != ref]
+                if len(kept) < len(ranked) == MAX_SUGGESTIONS and (
+                        prefix not in new_prefixes or new.rank_key() > old.rank_key()):
+                    # It left or fell down a full list; what takes its place is unknown
+                    del results[prefix]
+                    continue
+                if prefix in new_prefixes:
+                    kept.append(new)
+                    kept.sort(key=Suggestion.rank_key)
+                results[prefix] = kept[:MAX_SUGGESTIONS]
+
+    def rank(self, prefix):
+        refs = set()
+        position = bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and self.keys[position][0].startswith(prefix):
+            refs.add(self.keys[position][1])
+            position += 1
+        return heapq.nsmallest(MAX_SUGGESTIONS, (self.entries[ref] for ref in refs), key=Suggestion.rank_key)
+
+    def lookup(self, prefix, limit):
+        """Most popular suggestions with a key starting with prefix"""
+        if len(prefix) <= SHORT_PREFIX:
+            if prefix not in self.short:
+                self.short[prefix] = self.rank(prefix)
+            return self.short[prefix][:limit]
+        ranked = self.results.get(prefix)
+        if ranked is None:
+            ranked = self.results[prefix] = self.rank(prefix)
+            if len(self.results) > RESULT_CACHE_SIZE:
+                self.results.popitem(last=False)
+        else:
+            self.results.move_to_end(prefix)
+        return ranked[:limit]
+
+
+class Autocomplete:
+    """This process's suggestions, kept in step with the database"""
+
+    def __init__(self):
+        # lock guards the index; sync_lock lets one thread at a time bring it up to date
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.index = None
+        self.version = None
+        self.synced_at = None
+        self.checked = 0
+        self.ranked = 0
+        self.refreshed = 0
+
+    def suggest(self, query, limit=10):
+        """(suggestion, category suggestion) pairs for what the user has typed, most popular first"""
+        prefix = normalize(query)[:MAX_KEY_LENGTH]
+        self.ensure_current()
+        if not prefix:
+            return []
+        with self.lock:
+            entries = self.index.entries
+            return [
+                (entry, entries.get(('category', entry.category_id)))
+                for entry in self.index.lookup(prefix, limit)
+            ]
+
+    def ensure_current(self):
+        if self.index is not None and time.monotonic() - self.checked < CHECK_INTERVAL:
+            return
+        # Other threads keep answering from the current index meanwhile
+        if not self.sync_lock.acquire(blocking=self.index is None):
+            return
+        try:
+            now = time.monotonic()
+            if self.index is not None and now - self.checked < CHECK_INTERVAL:
+                return
+            version = current_version()
+            if self.index is None:
+                self.rebuild()
+            else:
+                if version != self.version or self.refresh_due(now):
+                    self.refresh()
+                if now - self.ranked >= POPULARITY_INTERVAL:
+                    self.reload_popularity()
+            self.version = version
+            self.checked = now
+        finally:
+            self.sync_lock.release()
+
+    def refresh_due(self, now):
+        """Whether to sync without a version bump, which per-process caches never see"""
+        return not settings.SHARED_CACHE and now - self.refreshed >= LOCAL_REFRESH_INTERVAL
+
+    def rebuild(self):
+        self.synced_at = timezone.now()
+        self.refreshed = time.monotonic()
+        weight = like_weight()
+        articles = Article.objects.published().values_list(*ARTICLE_COLUMNS)
+        items = [article_item(row, weight) for row in articles.iterator(chunk_size=2000)]
+        items += [category_item(row) for row in Category.objects.values_list(*CATEGORY_COLUMNS)]
+        index = PrefixIndex(items)
+        index.rank_short_prefixes()
+        with self.lock:
+            self.index = index
+        self.ranked = time.monotonic()
+
+    def refresh(self):
+        """Fold in the articles and categories written since the last sync"""
+        started = timezone.now()
+        self.refreshed = time.monotonic()
+        weight = like_weight()
+        # Adding an article again is harmless, so the overlap costs nothing but rows
+        changed = list(
+            Article.objects.filter(updated_at__gte=self.synced_at - SYNC_OVERLAP).values_list(*ARTICLE_COLUMNS)
+        )
+        categories = list(Category.objects.values_list(*CATEGORY_COLUMNS))
+        index = self.index
+        with self.lock:
+            for row in changed:
+                if row[-1] == 'published':
+                    index.add(*article_item(row, weight))
+                else:
+                    index.remove(('article', row[0]))
+            for row in categories:
+                entry = index.entries.get(('category', row[0]))
+                if entry is None or (entry.label, entry.popularity) != (row[1], row[3]):
+                    index.add(*category_item(row))
+            current = {row[0] for row in categories}
+            for ref in [ref for ref in index.entries if ref[0] == 'category' and ref[1] not in current]:
+                index.remove(ref)
+            missing_deletes = index.kinds['article'] != sum(row[3] for row in categories)
+        if missing_deletes:
+            # Deleted articles leave no row behind to notice
+            current = set(Article.objects.published().values_list('pk', flat=True))
+            with self.lock:
+                for ref in [ref for ref in index.entries if ref[0] == 'article' and ref[1] not in current]:
+                    index.remove(ref)
+        self.synced_at = started
+
+    def reload_popularity(self):
+        weight = like_weight()
+        articles = Article.objects.published().values_list('pk', 'views', 'likes')
+        popularity = {pk: views + weight * likes for pk, views, likes in articles.iterator(chunk_size=5000)}
+        # Only this thread, holding sync_lock, changes the index
+        index = self.index.with_popularity(popularity)
+        with self.lock:
+            self.index = index
+        self.ranked = time.monotonic()
+
+
+autocomplete = Autocomplete()
+
+
+def suggest(query, limit=10):
+    return autocomplete.suggest(query, limit)
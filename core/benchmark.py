@@ -0,0 +1,450 @@
+"""
+HTTP load generation and regression checks
+Concurrent visitors, one thread each, replay a scenario: a stream of
+steps sent through a transport, either Django's test client in this
+process or a keep-alive connection to a server, which can be started
+here under gunicorn. Each step is timed, and the query count comes from
+the X-Query-Count header the query inspector adds.
+
+Results summarize throughput, p50/p95/p99 latency and queries per
+request for each step name. Saved as JSON, they serve as the baseline a
+later run is compared against: compare() lists every step that got
+slower or ran more queries than the configured thresholds allow.
+
+The visitors run in this process, so their own CPU use shows in the
+numbers; only compare runs made on the same machine.
+
+Visitors sign in as accounts made for the run, some of them staff, with
+a random password; benchmark_users() deletes them and their sessions
+when the run ends.
+"""
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from importlib import import_module
+from itertools import cycle
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .models import Article, Category, UserProfile
+
+
+DEFAULTS = {
+    'CONCURRENCY': 8,
+    # Seconds of load, after WARMUP seconds that aren't recorded
+    'DURATION': 20,
+    'WARMUP': 2,
+    # How much worse than the baseline a step may get: latencies and
+    # throughput relative to it, queries per request in queries, and
+    # the share of failed requests in points
+    'THRESHOLDS': {'p50': 0.25, 'p95': 0.25, 'p99': 0.5, 'rps': 0.2, 'queries': 0.5, 'errors': 0.01},
+    # Latency changes smaller than this many ms are noise, never regressions
+    'LATENCY_FLOOR': 2,
+    # Steps recorded fewer times than this in either run aren't compared
+    'MIN_REQUESTS': 30,
+}
+
+# Slowest a server may be to start accepting connections
+STARTUP_TIMEOUT = 30
+
+# Page views between signing in and out
+SESSION_LENGTH = 10
+
+# Every STAFF_EVERY-th visitor is staff and also opens the admin dashboard
+STAFF_EVERY = 4
+
+# Servers --server can start: (app, worker class, environment it's served with)
+SERVERS = {
+    'wsgi': ('healthline.wsgi', 'sync', {}),
+    'asgi': ('healthline.asgi', 'uvicorn_worker.UvicornWorker', {'ASYNC_VIEWS': 'True', 'DATABASE_CONN_MAX_AGE': '0'}),
+}
+
+# Production settings for started servers, but plain HTTP as behind a proxy terminating TLS
+SERVER_ENV = {'DEBUG': 'False', 'SECURE_SSL_REDIRECT': 'False'}
+
+SEARCH_TERMS = ('sleep', 'heart health', 'vitamin d', 'anxiety', 'diabetes diet', 'exercise', 'stress', 'nutrition')
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'BENCHMARK', {})}
+    config['THRESHOLDS'] = {**DEFAULTS['THRESHOLDS'], **config['THRESHOLDS']}
+    return config
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Step:
+    """One request of a scenario"""
+    __slots__ = ('name', 'method', 'path', 'data', 'expect')
+
+    def __init__(self, name, method, path, data=None, expect=(200,)):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.expect = expect
+
+
+# Transports: send(step) returns (status, query count or None)
+
+class ClientTransport:
+    """Requests through Django's test client, in this process"""
+
+    def __init__(self, cookies=None):
+        # Errors come back as 500s, as from a server
+        self.client = Client(raise_request_exception=False)
+        for name, value in (cookies or {}).items():
+            self.client.cookies[name] = value
+
+    def send(self, step):
+        response = getattr(self.client, step.method.lower())(step.path, step.data or {})
+        queries = response.get('X-Query-Count')
+        return response.status_code, int(queries) if queries is not None else None
+
+    def close(self):
+        # Connections this thread opened
+        connections.close_all()
+
+
+class HttpTransport:
+    """Requests over one keep-alive connection, keeping cookies like a browser"""
+
+    def __init__(self, url, cookies=None):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+        self.cookies = dict(cookies or {})
+
+    def send(self, step):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if step.method == 'POST' and settings.CSRF_COOKIE_NAME in self.cookies:
+            headers['X-CSRFToken'] = self.cookies[settings.CSRF_COOKIE_NAME]
+        path, body = self.prefix + step.path, None
+        if step.data is not None and step.method == 'GET':
+            path += '?' + urlencode(step.data)
+        elif step.method != 'GET':
+            body = urlencode(step.data or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connection.request(step.method, path, body, headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # The next request reconnects
+            self.connection.close()
+            raise
+        for header in response.msg.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
+        queries = response.getheader('X-Query-Count')
+        return response.status, int(queries) if queries is not None else None
+
+    def close(self):
+        self.connection.close()
+
+
+class GunicornServer:
+    """Context manager running `gunicorn app` on a free local port until the block exits"""
+
+    def __init__(self, app, worker_class, workers, env=None):
+        self.app = app
+        self.worker_class = worker_class
+        self.workers = workers
+        self.env = {**os.environ, **(env or {})}
+        self.port = None
+        self.process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', self.app, '--bind', f'127.0.0.1:{self.port}',
+                '--workers', str(self.workers), '--worker-class', self.worker_class, '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR, env=self.env,
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn {self.app} exited with status {self.process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError(f'gunicorn {self.app} did not start within {STARTUP_TIMEOUT}s')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+# Scenarios: steps(number) yields visitor number's requests, without end
+
+class MixScenario:
+    """Every visitor cycles through the same steps, each from its own point"""
+
+    def __init__(self, mix):
+        self.mix = mix
+
+    def steps(self, number):
+        start = number % len(self.mix)
+        yield from cycle(self.mix[start:] + self.mix[:start])
+
+
+class SiteScenario:
+    """Visitors sign in, then browse, search, like and save articles
+
+    users is a list of (username, is_staff), all signing in with
+    password; staff visitors also open the admin dashboard. Each visitor signs out and back in every
+    SESSION_LENGTH rounds, so sign-in keeps its share of the mix.
+    """
+
+    def __init__(self, users, password, articles, categories, search_terms=SEARCH_TERMS):
+        self.users = users
+        self.password = password
+        self.articles = articles
+        self.categories = categories
+        self.search_terms = search_terms
+
+    def steps(self, number):
+        username, is_staff = self.users[number % len(self.users)]
+        rng = random.Random(number)
+        signin = reverse('core:signin')
+        while True:
+            yield Step('signin_page', 'GET', signin)
+            yield Step('sign_in', 'POST', signin, {'username': username, 'password': self.password}, expect=(302,))
+            for _ in range(SESSION_LENGTH):
+                article_id, slug = rng.choice(self.articles)
+                yield Step('home', 'GET', reverse('core:home'))
+                yield Step('category', 'GET', reverse('core:category', args=[rng.choice(self.categories)]))
+                yield Step('article_detail', 'GET', reverse('core:article_detail', args=[slug]))
+                yield Step('search', 'GET', reverse('core:search'), {'q': rng.choice(self.search_terms)})
+                yield Step('like_article', 'POST', reverse('core:like_article', args=[article_id]))
+                yield Step('save_article', 'POST', reverse('core:save_article', args=[article_id]))
+                if is_staff:
+                    yield Step('admin_dashboard', 'GET', reverse('admin_panel:dashboard'))
+            yield Step('sign_out', 'GET', reverse('core:signout'), expect=(302,))
+
+
+def delete_sessions(user_ids, since):
+    """Delete the stored sessions of the given users opened since a moment"""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        # Cache or cookie sessions can't be listed; they fail to load once the user is gone
+        return
+    user_ids = {str(pk) for pk in user_ids}
+    # Sessions expire SESSION_COOKIE_AGE after their last save, so this covers every one the run opened
+    rows = store.get_model_class().objects.filter(expire_date__gte=since).values_list('session_key', 'session_data')
+    for session_key, session_data in rows.iterator():
+        session = store(session_key)
+        if str(session.decode(session_data).get(SESSION_KEY)) in user_ids:
+            session.delete()
+
+
+@contextmanager
+def benchmark_users(count, staff_every=STAFF_EVERY):
+    """Yield ([(username, is_staff)], password) of count visitors made for this run
+
+    Every staff_every-th visitor is staff. The accounts get a random name
+    and password, and are deleted with their sessions afterwards.
+    """
+    run = get_random_string(8, allowed_chars='abcdefghijklmnopqrstuvwxyz0123456789')
+    password = get_random_string(32)
+    hashed = make_password(password)
+    started = timezone.now()
+    users, user_ids = [], []
+    try:
+        for number in range(count):
+            username = f'benchmark-{run}-{number}'
+            is_staff = number % staff_every == staff_every - 1
+            # Saved one by one so the dashboard's user count follows
+            user = User.objects.create(username=username, email=f'{username}@example.com', password=hashed, is_staff=is_staff)
+            UserProfile.objects.create(user=user)
+            users.append((username, is_staff))
+            user_ids.append(user.pk)
+        yield users, password
+    finally:
+        delete_sessions(user_ids, started)
+        for user in User.objects.filter(pk__in=user_ids):
+            user.delete()
+
+
+def site_scenario(users, password, sample=500):
+    """SiteScenario over the sample most viewed published articles and every category"""
+    articles = list(Article.objects.published().order_by('-views', '-pk').values_list('pk', 'slug')[:sample])
+    categories = list(Category.objects.values_list('slug', flat=True))
+    if not articles or not categories:
+        raise ValueError('No published articles to visit; run import_articles first')
+    return SiteScenario(users, password, articles, categories)
+
+
+class LoadRun:
+    """Visitors replaying a scenario concurrently, timing every step"""
+
+    def __init__(self, scenario, transport, concurrency, duration, warmup=None):
+        """transport() makes a fresh transport for each visitor"""
+        self.scenario = scenario
+        self.transport = transport
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = get_config()['WARMUP'] if warmup is None else warmup
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def run(self):
+        """Run the load, returning its summary"""
+        self.recording_from = time.monotonic() + self.warmup
+        self.deadline = self.recording_from + self.duration
+        visitors = [threading.Thread(target=self.visit, args=(number,)) for number in range(self.concurrency)]
+        for visitor in visitors:
+            visitor.start()
+        for visitor in visitors:
+            visitor.join()
+        return self.summary()
+
+    def visit(self, number):
+        latencies, queries, errors = defaultdict(list), defaultdict(list), defaultdict(int)
+        transport = self.transport()
+        try:
+            for step in self.scenario.steps(number):
+                started = time.monotonic()
+                if started >= self.deadline:
+                    break
+                try:
+                    status, count = transport.send(step)
+                    ok = status in step.expect
+                except (OSError, http.client.HTTPException):
+                    ok, count = False, None
+                if started < self.recording_from:
+                    continue
+                if not ok:
+                    errors[step.name] += 1
+                    continue
+                latencies[step.name].append(time.monotonic() - started)
+                if count is not None:
+                    queries[step.name].append(count)
+        finally:
+            transport.close()
+        with self.lock:
+            for name, values in latencies.items():
+                self.latencies[name] += values
+            for name, values in queries.items():
+                self.queries[name] += values
+            for name, count in errors.items():
+                self.errors[name] += count
+
+    def summary(self):
+        """{step name or 'total': {requests, errors, rps, mean, p50, p95, p99, queries}}, times in ms"""
+        names = sorted(set(self.latencies) | set(self.errors))
+        rows = {name: self.stats(self.latencies[name], self.errors[name], self.queries[name]) for name in names}
+        rows['total'] = self.stats(
+            [value for values in self.latencies.values() for value in values],
+            sum(self.errors.values()),
+            [value for values in self.queries.values() for value in values],
+        )
+        return rows
+
+    def stats(self, latencies, errors, queries):
+        ordered = sorted(latencies)
+        return {
+            'requests': len(ordered),
+            'errors': errors,
+            'rps': round(len(ordered) / self.duration, 1),
+            'mean': round(1000 * sum(ordered) / len(ordered), 2) if ordered else 0.0,
+            'p50': round(1000 * percentile(ordered, 0.50), 2),
+            'p95': round(1000 * percentile(ordered, 0.95), 2),
+            'p99': round(1000 * percentile(ordered, 0.99), 2),
+            # Mean per request, None when the server doesn't report them
+            'queries': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+
+
+def compare(baseline, results, config=None):
+    """Messages for every step that regressed from baseline past the thresholds"""
+    config = config or get_config()
+    thresholds, floor = config['THRESHOLDS'], config['LATENCY_FLOOR']
+    regressions = []
+    for name, row in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        rate, before_rate = error_rate(row), error_rate(before)
+        if rate > before_rate + thresholds['errors']:
+            regressions.append(f'{name}: {rate:.1%} of requests failed, baseline {before_rate:.1%}')
+        if min(row['requests'], before['requests']) < config['MIN_REQUESTS']:
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            limit = before[key] * (1 + thresholds[key])
+            if row[key] > limit and row[key] - before[key] >= floor:
+                regressions.append(f'{name}: {key} {row[key]:.1f}ms, baseline {before[key]:.1f}ms (limit {limit:.1f}ms)')
+        limit = before['rps'] * (1 - thresholds['rps'])
+        if row['rps'] < limit:
+            regressions.append(f'{name}: {row["rps"]:.1f} req/s, baseline {before["rps"]:.1f} (limit {limit:.1f})')
+        if row['queries'] is not None and before.get('queries') is not None:
+            limit = before['queries'] + thresholds['queries']
+            if row['queries'] > limit:
+                regressions.append(f'{name}: {row["queries"]:.2f} queries/request, baseline {before["queries"]:.2f}')
+    return regressions
+
+
+def error_rate(row):
+    sent = row['requests'] + row['errors']
+    return row['errors'] / sent if sent else 0.0
+
+
+def format_table(rows):
+    """Lines of a fixed-width table of summary rows"""
+    lines = [f'  {"step":<22}{"requests":>10}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}']
+    for name, row in rows.items():
+        queries = f'{row["queries"]:.1f}' if row['queries'] is not None else '-'
+        lines.append(
+            f'  {name:<22}{row["requests"]:>10}{row["errors"]:>8}{row["rps"]:>9.1f}'
+            f'{row["p50"]:>9.1f}{row["p95"]:>9.1f}{row["p99"]:>9.1f}{queries:>9}'
+        )
+    return lines
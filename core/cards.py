@@ -0,0 +1,150 @@
+"""
+Article card read model
+List pages only show a handful of columns per article, so they read
+them with one joined values query instead of full Article rows (whose
+content HTML can run to many kilobytes) and hand templates small
+slotted objects with the same attribute names.
+"""
+import os
+
+from django.core.files.storage import default_storage
+from django.db.models.query import ValuesListIterable
+from django.urls import reverse
+
+
+PLACEHOLDER_IMAGE = '/static/images/placeholder.svg'
+
+CATEGORY_FIELDS = ('category_id', 'category__name', 'category__slug')
+
+ARTICLE_FIELDS = (
+    'id', 'slug', 'title', 'excerpt', 'image', 'image_url', 'image_renditions', 'author', 'read_time',
+    'views', 'likes', 'status', 'is_featured', 'is_trending', 'created_at',
+)
+
+CARD_FIELDS = ARTICLE_FIELDS + CATEGORY_FIELDS
+
+
+def rendition_name(name, width, extension):
+    """Storage name of a resized copy, next to the original"""
+    stem, _ = os.path.splitext(name)
+    return f'{stem}-{width}w.{extension}'
+
+
+def current_renditions(image, renditions):
+    """(storage, name, widths) if the renditions were made from this upload, else None"""
+    if not image or not renditions:
+        return None
+    name = getattr(image, 'name', image)
+    if renditions.get('name') != name or not renditions.get('widths'):
+        return None
+    return getattr(image, 'storage', default_storage), name, renditions['widths']
+
+
+def resolve_image_url(image_url, image=None, renditions=None):
+    """Return the URL to show for an image path and/or uploaded image
+
+    image may be a FieldFile or the stored file name. Uploads with
+    renditions (see core.renditions) are shown as the largest JPEG copy.
+    """
+    # Prioritize image_url over image field for imported articles
+    if image_url:
+        # If it's an external URL (http/https), use it directly
+        if image_url.startswith('http://') or image_url.startswith('https://'):
+            return image_url
+        # If it's already a full path, use it directly
+        if image_url.startswith('/'):
+            return image_url
+        # If it looks like a static path, prefix with /static/
+        elif image_url.startswith('images/'):
+            return f'/static/{image_url}'
+        # Otherwise assume it's in the articles folder
+        return f'/static/images/articles/{image_url}'
+    elif image:
+        current = current_renditions(image, renditions)
+        if current:
+            storage, name, widths = current
+            return storage.url(rendition_name(name, widths[-1], 'jpg'))
+        # Only use the uploaded file if there is one
+        return image.url if hasattr(image, 'url') else default_storage.url(image)
+    return PLACEHOLDER_IMAGE
+
+
+def resolve_image_srcset(image_url, image=None, renditions=None):
+    """srcset of the WebP renditions of an upload, or '' when there are none"""
+    if image_url:
+        return ''
+    current = current_renditions(image, renditions)
+    if not current:
+        return ''
+    storage, name, widths = current
+    return ', '.join(f'{storage.url(rendition_name(name, width, "webp"))} {width}w' for width in widths)
+
+
+class CategoryRef:
+    """The category columns a card shows"""
+    __slots__ = ('id', 'name', 'slug')
+
+    def __init__(self, id, name, slug):
+        self.id = id
+        self.name = name
+        self.slug = slug
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_absolute_url(self):
+        return reverse('core:category', args=[self.slug])
+
+
+class ArticleCard:
+    """An article as shown on list pages"""
+    __slots__ = ARTICLE_FIELDS + ('category', 'is_saved', 'is_liked')
+
+    def __init__(self, row):
+        for name, value in zip(ARTICLE_FIELDS, row):
+            setattr(self, name, value)
+        self.category = CategoryRef(*row[len(ARTICLE_FIELDS):])
+        # Filled in per user by core.membership
+        self.is_saved = False
+        self.is_liked = False
+
+    def __str__(self):
+        return self.title
+
+    def __repr__(self):
+        return f'<ArticleCard: {self.title}>'
+
+    def __eq__(self, other):
+        return isinstance(other, ArticleCard) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def category_id(self):
+        return self.category.id
+
+    def get_absolute_url(self):
+        return reverse('core:article_detail', args=[self.slug])
+
+    def get_image_url(self):
+        return resolve_image_url(self.image_url, self.image, self.image_renditions)
+
+    def get_image_srcset(self):
+        return resolve_image_srcset(self.image_url, self.image, self.image_renditions)
+
+
+class ArticleCardIterable(ValuesListIterable):
+    """Yields an ArticleCard for each row of a values_list(*CARD_FIELDS) query"""
+
+    def __iter__(self):
+        for row in super().__iter__():
+            yield ArticleCard(row)
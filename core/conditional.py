@@ -0,0 +1,77 @@
+"""
+Conditional GET for frontend pages
+Views compute an ETag and Last-Modified from cheap queries and hand
+them to respond(), which answers 304 Not Modified without rendering when
+the client's copy still matches. The ETag covers everything on the page
+that can differ per user: the header name and photo, the saved/liked
+state and the CSRF secret behind the forms.
+
+Some content changes without touching any timestamp (view counts,
+trending order), so pages showing it fold a time bucket into the ETag
+and are re-rendered at least every FRESHNESS seconds.
+"""
+import hashlib
+import time
+
+from django.contrib.messages import get_messages
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .auth import header_snapshot
+
+
+# Longest a page showing view counts or trending order is served as unchanged
+FRESHNESS = 5 * 60
+
+
+def freshness_bucket():
+    return int(time.time() // FRESHNESS)
+
+
+def user_fingerprint(request):
+    """What the page header and forms show of the current user"""
+    # Forms carry tokens masking this secret; get_token() creates it on a first visit
+    get_token(request)
+    csrf_secret = request.META['CSRF_COOKIE']
+    user = request.user
+    if not user.is_authenticated:
+        return ('anonymous', csrf_secret)
+    return (user.pk, user.username, user.first_name, user.last_name, user.email, header_snapshot(user), csrf_secret)
+
+
+def make_etag(*parts):
+    """Weak ETag over the parts; pages are equivalent, not byte-identical"""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user pages: browsers may keep them but must revalidate, shared caches may not
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def respond(request, etag, last_modified, render):
+    """304 if the client's copy matches the ETag, else render() with the validators set
+
+    Last-Modified is sent but never decides on its own, since per-user
+    state has no timestamp; clients sending only If-Modified-Since get a
+    full page. Pending flash messages also always get a full render so
+    they are shown and consumed.
+    """
+    if request.method in ('GET', 'HEAD') and not len(get_messages(request)):
+        headers = set_validators(HttpResponse(), etag, last_modified)
+        conditional = get_conditional_response(
+            request,
+            etag=etag,
+            response=headers,
+        )
+        # The headers-only response comes back when no precondition applied
+        if conditional is not headers:
+            return conditional
+    return set_validators(render(), etag, last_modified)
@@ -0,0 +1,239 @@
+"""
+Article content pipeline
+Derives everything the site needs from Article.content once, when the
+content changes, instead of on every request: plain text for search and
+similarity, word count and read time, a heading outline for the table of
+contents, and sanitized HTML with lazy-loaded images for the page.
+
+Results are keyed by content_hash, a hash of the content and
+PIPELINE_VERSION, so unchanged articles are never processed again and
+bumping the version reprocesses everything.
+"""
+import hashlib
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import linebreaks
+from django.utils.text import slugify
+
+from . import search
+from .fragments import bump_home_version
+from .models import Article
+
+
+# Bump when the output of derive() changes
+PIPELINE_VERSION = 1
+
+WORDS_PER_MINUTE = 200
+
+# Fields derive() fills in
+DERIVED_FIELDS = ['plain_text', 'word_count', 'read_time', 'toc', 'content_html', 'content_hash']
+
+ALLOWED_TAGS = frozenset("""
+a abbr b blockquote br code div em figcaption figure h1 h2 h3 h4 h5 h6 hr i
+img li ol p pre small span strong sub sup table tbody td th thead tr u ul
+""".split())
+
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+}
+
+URL_ATTRIBUTES = {'href', 'src'}
+SAFE_SCHEMES = {'', 'http', 'https', 'mailto'}
+
+# Dropped together with everything inside them
+DROPPED_TAGS = frozenset(['script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template', 'head', 'title'])
+
+VOID_TAGS = frozenset(['br', 'hr', 'img'])
+
+# Headings listed in the table of contents
+TOC_LEVELS = {'h2': 2, 'h3': 3}
+
+# Tags that separate words in the plain text
+BLOCK_TAGS = frozenset(['p', 'div', 'br', 'li', 'blockquote', 'pre', 'tr', 'td', 'th', 'figcaption', 'hr'] + [f'h{n}' for n in range(1, 7)])
+
+BLOCK_HTML_RE = re.compile(r'<(p|div|h[1-6]|ul|ol|table|blockquote|pre|figure)[\s>]', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'[ \t\r\f\v]+')
+WORD_RE = re.compile(r'\w+')
+
+
+def content_hash(content):
+    return hashlib.sha256(f'{PIPELINE_VERSION}:{content}'.encode()).hexdigest()
+
+
+def safe_url(url):
+    try:
+        return urlsplit(url.strip()).scheme.lower() in SAFE_SCHEMES
+    except ValueError:
+        return False
+
+
+class ContentParser(HTMLParser):
+    """One pass over the content producing sanitized HTML, plain text and the outline"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.toc = []
+        self.open_tags = []
+        self.dropping = 0
+        self.heading = None
+        self.anchors = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+        if tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        kept = [
+            (name, value) for name, value in attrs
+            if name in allowed and value is not None and (name not in URL_ATTRIBUTES or safe_url(value))
+        ]
+        if tag == 'img':
+            if not any(name == 'src' for name, value in kept):
+                return
+            kept += [('loading', 'lazy'), ('decoding', 'async')]
+        rendered = ''.join(f' {name}="{escape(value)}"' for name, value in kept)
+        if tag in TOC_LEVELS and self.heading is None:
+            # The anchor id is added once the heading text is known
+            self.heading = {'tag': tag, 'index': len(self.html), 'attrs': rendered, 'text': []}
+        self.html.append(f'<{tag}{rendered}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+        if tag not in self.open_tags:
+            return
+        # Close anything left open inside this element
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+        if self.heading is not None and self.heading['tag'] == tag:
+            self.close_heading()
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+        if self.heading is not None:
+            self.heading['text'].append(data)
+
+    def close_heading(self):
+        heading, self.heading = self.heading, None
+        title = ' '.join(''.join(heading['text']).split())
+        if not title:
+            return
+        anchor = base = slugify(title) or 'section'
+        suffix = 1
+        while anchor in self.anchors:
+            suffix += 1
+            anchor = f'{base}-{suffix}'
+        self.anchors.add(anchor)
+        self.html[heading['index']] = f'<{heading["tag"]} id="{anchor}"{heading["attrs"]}>'
+        self.toc.append({'level': TOC_LEVELS[heading['tag']], 'id': anchor, 'title': title})
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+
+def plain_text(text_parts):
+    lines = (WHITESPACE_RE.sub(' ', line).strip() for line in ''.join(text_parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def derive(content):
+    """{field: value} for every field in DERIVED_FIELDS"""
+    # Plain-text content is shown with line breaks, as the template used to do
+    source = content if BLOCK_HTML_RE.search(content) else linebreaks(content)
+    parser = ContentParser()
+    parser.feed(source)
+    parser.close()
+    text = plain_text(parser.text)
+    words = len(WORD_RE.findall(text))
+    return {
+        'plain_text': text,
+        'word_count': words,
+        'read_time': max(1, math.ceil(words / WORDS_PER_MINUTE)),
+        'toc': parser.toc,
+        'content_html': ''.join(parser.html),
+        'content_hash': content_hash(content),
+    }
+
+
+def process(article, force=False):
+    """Fill in the article's derived fields, returning False if they were current"""
+    if not force and article.content_hash == content_hash(article.content):
+        return False
+    for field, value in derive(article.content).items():
+        setattr(article, field, value)
+    return True
+
+
+def process_articles(queryset=None, force=False, batch_size=200):
+    """Process every article whose content changed, returning (checked, processed)
+
+    Writes in bulk, so it does what the save signals would: re-indexes
+    the processed articles for search and marks them for core.related.
+    """
+    if queryset is None:
+        queryset = Article.objects.all()
+    queryset = queryset.only('pk', 'content', 'content_hash').order_by('pk')
+    checked = processed = 0
+    batch = []
+    for article in queryset.iterator(chunk_size=batch_size):
+        checked += 1
+        if process(article, force):
+            batch.append(article)
+        if len(batch) >= batch_size:
+            processed += write(batch)
+            batch = []
+    processed += write(batch)
+    if processed:
+        bump_home_version()
+    return checked, processed
+
+
+def write(articles):
+    if not articles:
+        return 0
+    now = timezone.now()
+    for article in articles:
+        article.updated_at = now
+        article.related_stale = True
+    with transaction.atomic():
+        Article.objects.bulk_update(articles, DERIVED_FIELDS + ['related_stale', 'updated_at'])
+    search.rebuild_index(Article.objects.filter(pk__in=[article.pk for article in articles]))
+    return len(articles)
@@ -0,0 +1,16 @@
+"""
+Template context shared by frontend pages
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .auth import header_snapshot
+
+
+def header(request):
+    """header_user: what the page header shows of the signed-in user, or None"""
+    user = getattr(request, 'user', None)
+
+    def snapshot():
+        return header_snapshot(user) if user is not None and user.is_authenticated else {}
+
+    return {'header_user': SimpleLazyObject(snapshot)}
@@ -0,0 +1,213 @@
+"""
+Write-behind article view counter
+Page views are buffered and applied to Article.views in batches of
+atomic per-article deltas instead of one UPDATE per request. Servers
+start a timer thread (see healthline/wsgi.py) so a buffer flushes on
+time even when no further views arrive.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Article
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 'memory' buffers per process, 'cache' buffers in a shared cache
+    'BACKEND': 'memory',
+    'CACHE_ALIAS': 'default',
+    # Flush after this many seconds or buffered views, whichever comes first
+    'FLUSH_INTERVAL': 10,
+    'FLUSH_THRESHOLD': 100,
+}
+
+CACHE_KEY_PREFIX = 'viewcount:'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'VIEW_COUNTER', {})}
+
+
+def apply_deltas(deltas):
+    """Add buffered view deltas to Article.views atomically"""
+    by_delta = defaultdict(list)
+    for article_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(article_id)
+    with transaction.atomic():
+        for delta, article_ids in by_delta.items():
+            Article.objects.filter(pk__in=article_ids).update(views=F('views') + delta)
+
+
+class MemoryBuffer:
+    """Pending views held in this process only"""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, article_id, count=1):
+        self.counts[article_id] += count
+
+    def size(self):
+        return sum(self.counts.values())
+
+    def drain(self):
+        counts, self.counts = self.counts, Counter()
+        return dict(counts)
+
+
+class CacheBuffer:
+    """Pending views held in a shared cache so any process can flush them"""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        self.pending = set()
+        self.buffered = 0
+
+    def key(self, article_id):
+        return f'{CACHE_KEY_PREFIX}{article_id}'
+
+    def add(self, article_id, count=1):
+        key = self.key(article_id)
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key, count)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(key, count, timeout=None)
+        self.pending.add(article_id)
+        self.buffered += count
+
+    def size(self):
+        return self.buffered
+
+    def drain(self, article_ids=None):
+        if article_ids is None:
+            article_ids, self.pending, self.buffered = self.pending, set(), 0
+        keys = {self.key(article_id): article_id for article_id in article_ids}
+        deltas = {}
+        for key, value in self.cache.get_many(keys).items():
+            if value:
+                # Subtract what we read so concurrent increments are kept
+                try:
+                    self.cache.decr(key, value)
+                except ValueError:
+                    # Evicted since get_many(); what we read is ours to write
+                    pass
+                deltas[keys[key]] = value
+        return deltas
+
+
+class ViewCounter:
+    """Buffers article views and flushes them on a timer or size threshold"""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        if self.config['BACKEND'] == 'cache':
+            self.buffer = CacheBuffer(self.config['CACHE_ALIAS'])
+        else:
+            self.buffer = MemoryBuffer()
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        # Process the timer thread runs in, None until started
+        self.timer_pid = None
+
+    def start_timer(self):
+        """Flush every FLUSH_INTERVAL seconds from a background thread"""
+        self.timer_pid = os.getpid()
+        threading.Thread(target=self.run_timer, name='view-counter-flush', daemon=True).start()
+
+    def run_timer(self):
+        interval = self.config['FLUSH_INTERVAL']
+        wait = interval
+        while True:
+            time.sleep(wait)
+            # A request may have flushed in the meantime
+            wait = self.last_flush + interval - time.monotonic()
+            if wait > 0:
+                continue
+            wait = interval
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush article view counts')
+            finally:
+                # Don't hold a connection open between flushes
+                connection.close()
+
+    def record(self, article_id, count=1):
+        """Count a view, flushing if the buffer is due"""
+        if self.timer_pid not in (None, os.getpid()):
+            # Forked from the process that started the timer; threads don't survive a fork
+            self.start_timer()
+        with self.lock:
+            self.buffer.add(article_id, count)
+            due = (
+                self.buffer.size() >= self.config['FLUSH_THRESHOLD']
+                or time.monotonic() - self.last_flush >= self.config['FLUSH_INTERVAL']
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered views to the database, returning the number flushed"""
+        with self.lock:
+            deltas = self.buffer.drain()
+            self.last_flush = time.monotonic()
+        return self.write(deltas)
+
+    def flush_all(self, batch_size=1000):
+        """Flush views buffered by every process (shared cache backend only)"""
+        flushed = self.flush()
+        if isinstance(self.buffer, CacheBuffer):
+            article_ids = Article.objects.order_by('pk').values_list('pk', flat=True)
+            batch = []
+            for article_id in article_ids.iterator(chunk_size=batch_size):
+                batch.append(article_id)
+                if len(batch) >= batch_size:
+                    flushed += self.write(self.buffer.drain(batch))
+                    batch = []
+            if batch:
+                flushed += self.write(self.buffer.drain(batch))
+        return flushed
+
+    def write(self, deltas):
+        if not deltas:
+            return 0
+        try:
+            apply_deltas(deltas)
+        except Exception:
+            # Put the views back so the next flush retries them
+            logger.exception('Failed to flush %d article view counts', len(deltas))
+            with self.lock:
+                for article_id, delta in deltas.items():
+                    self.buffer.add(article_id, delta)
+            return 0
+        return sum(deltas.values())
+
+
+view_counter = ViewCounter()
+
+
+def record_view(article_id):
+    """Count one view of an article"""
+    view_counter.record(article_id)
+
+
+@atexit.register
+def flush_on_exit():
+    """Don't lose buffered views when a worker shuts down"""
+    try:
+        view_counter.flush()
+    except Exception:
+        logger.exception('Failed to flush article view counts at exit')
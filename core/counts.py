@@ -0,0 +1,77 @@
+"""
+Denormalized article counts per category and subcategory
+Category/SubCategory.article_count and published_count are adjusted
+with F() deltas whenever an article is created, deleted, changes status
+or moves between categories, so listing pages never count articles.
+Decrements stop at 0, so a counter that has drifted low can't break the
+column's CHECK constraint; verify_counts() repairs the drift.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Article, Category, SubCategory
+
+
+def counted_state(article):
+    """The parts of an article that decide which counters include it"""
+    return (article.category_id, article.subcategory_id, article.status == 'published')
+
+
+def loaded_state(article):
+    """State of the article as it was last read from or written to the database"""
+    loaded = getattr(article, '_loaded_values', None)
+    if loaded is not None and {'category_id', 'subcategory_id', 'status'} <= loaded.keys():
+        return (loaded['category_id'], loaded['subcategory_id'], loaded['status'] == 'published')
+    if article.pk is None:
+        return None
+    row = Article.objects.filter(pk=article.pk).values_list('category_id', 'subcategory_id', 'status').first()
+    if row is None:
+        return None
+    return (row[0], row[1], row[2] == 'published')
+
+
+def apply_change(old, new):
+    """Move an article's contribution from the old state to the new one"""
+    deltas = defaultdict(lambda: [0, 0])
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        category_id, subcategory_id, published = state
+        for key in ((Category, category_id), (SubCategory, subcategory_id)):
+            if key[1] is None:
+                continue
+            deltas[key][0] += sign
+            deltas[key][1] += sign if published else 0
+    for (model, pk), (total, published) in deltas.items():
+        if total or published:
+            model.objects.filter(pk=pk).update(
+                article_count=Greatest(F('article_count') + total, 0),
+                published_count=Greatest(F('published_count') + published, 0),
+            )
+
+
+def verify_counts(fix=False):
+    """Compare stored counters with real counts, yielding (object, stored, actual)
+
+    stored and actual are (article_count, published_count) tuples. Drifted
+    counters are rewritten when fix is True.
+    """
+    published = Q(articles__status='published')
+    for model in (Category, SubCategory):
+        rows = model.objects.annotate(
+            total=Count('articles'),
+            total_published=Count('articles', filter=published),
+        )
+        drifted = []
+        for obj in rows:
+            stored = (obj.article_count, obj.published_count)
+            actual = (obj.total, obj.total_published)
+            if stored != actual:
+                drifted.append((obj, stored, actual))
+        if fix:
+            for obj, stored, actual in drifted:
+                obj.article_count, obj.published_count = actual
+            model.objects.bulk_update([obj for obj, _, _ in drifted], ['article_count', 'published_count'])
+        yield from drifted
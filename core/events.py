@@ -0,0 +1,300 @@
+"""
+Article event log with daily rollups
+Views, likes and saves are appended to ArticleEvent in batches, the
+same way core.counters buffers view counts. rollup() folds new events
+into per-article, per-day ArticleDailyStat rows, tracked by a checkpoint
+so every event is counted once; settled_events() keeps the checkpoint
+from passing events still being committed. purge() then drops raw events
+past the retention window. Analytics read the rollups, never the raw log.
+Servers start a timer thread (see healthline/wsgi.py) so buffered events
+are written on time on a quiet site too.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Article, ArticleDailyStat, ArticleEvent, RollupCheckpoint
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Flush after this many seconds or buffered events, whichever comes first
+    'FLUSH_INTERVAL': 10,
+    'FLUSH_THRESHOLD': 200,
+    # Events kept for retry while writes fail; the oldest are dropped past this
+    'MAX_PENDING': 10000,
+    # Seconds an inserted event waits before it is read, so lower ids have committed
+    'SETTLE_SECONDS': 5,
+    # Raw events older than this are deleted once rolled up
+    'RETENTION_DAYS': 30,
+}
+
+CHECKPOINT = 'article_events'
+
+# Checkpoints of every reader of the log: the rollups and core.trending
+CONSUMERS = (CHECKPOINT, 'trending')
+
+# Rollup column and delta for each event kind
+KIND_EFFECTS = {
+    'view': ('views', 1),
+    'like': ('likes', 1),
+    'unlike': ('likes', -1),
+    'save': ('saves', 1),
+    'unsave': ('saves', -1),
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_LOG', {})}
+
+
+class EventLog:
+    """Buffers events in this process and appends them in bulk"""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.pending = []
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        # Process the timer thread runs in, None until started
+        self.timer_pid = None
+
+    def start_timer(self):
+        """Flush every FLUSH_INTERVAL seconds from a background thread"""
+        self.timer_pid = os.getpid()
+        threading.Thread(target=self.run_timer, name='event-log-flush', daemon=True).start()
+
+    def run_timer(self):
+        interval = self.config['FLUSH_INTERVAL']
+        wait = interval
+        while True:
+            time.sleep(wait)
+            # A request may have flushed in the meantime
+            wait = self.last_flush + interval - time.monotonic()
+            if wait > 0:
+                continue
+            wait = interval
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write article events')
+            finally:
+                # Don't hold a connection open between flushes
+                connection.close()
+
+    def record(self, article_id, kind):
+        """Log an event, flushing if the buffer is due"""
+        if self.add(article_id, kind):
+            self.flush()
+
+    def add(self, article_id, kind):
+        """Buffer an event, returning whether a flush is due"""
+        if self.timer_pid not in (None, os.getpid()):
+            # Forked from the process that started the timer; threads don't survive a fork
+            self.start_timer()
+        with self.lock:
+            self.pending.append((article_id, kind, timezone.now()))
+            return (
+                len(self.pending) >= self.config['FLUSH_THRESHOLD']
+                or time.monotonic() - self.last_flush >= self.config['FLUSH_INTERVAL']
+            )
+
+    def flush(self):
+        """Write buffered events, returning the number written"""
+        with self.lock:
+            events, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+        if not events:
+            return 0
+        try:
+            return self.write(events)
+        except Exception:
+            logger.exception('Failed to write %d article events', len(events))
+            self.requeue(events)
+            return 0
+
+    def write(self, events):
+        """Append (article_id, kind, created_at) events, skipping deleted articles"""
+        try:
+            self.insert(events)
+        except IntegrityError:
+            # An article was deleted since its events were buffered; retrying would fail the same way
+            existing = set(
+                Article.objects.filter(pk__in={article_id for article_id, _, _ in events}).values_list('pk', flat=True)
+            )
+            kept = [event for event in events if event[0] in existing]
+            if len(kept) == len(events):
+                raise
+            logger.warning('Dropped %d events of deleted articles', len(events) - len(kept))
+            self.insert(kept)
+            events = kept
+        return len(events)
+
+    def insert(self, events):
+        # Foreign keys are checked at commit, which raises here rather than in the caller's next query
+        with transaction.atomic():
+            ArticleEvent.objects.bulk_create([
+                ArticleEvent(article_id=article_id, kind=kind, created_at=created_at)
+                for article_id, kind, created_at in events
+            ], batch_size=500)
+
+    def requeue(self, events):
+        """Put unwritten events back for the next flush, keeping at most MAX_PENDING"""
+        with self.lock:
+            self.pending[:0] = events
+            overflow = len(self.pending) - self.config['MAX_PENDING']
+            if overflow > 0:
+                del self.pending[:overflow]
+        if overflow > 0:
+            logger.warning('Article event buffer full; dropped the %d oldest events', overflow)
+
+
+event_log = EventLog()
+
+
+def record_event(article_id, kind):
+    """Log one reader interaction with an article"""
+    event_log.record(article_id, kind)
+
+
+async def arecord_event(article_id, kind):
+    """record_event for async views; a due flush runs in a worker thread"""
+    if event_log.add(article_id, kind):
+        await sync_to_async(event_log.flush)()
+
+
+@atexit.register
+def flush_on_exit():
+    """Don't lose buffered events when a worker shuts down"""
+    try:
+        event_log.flush()
+    except Exception:
+        logger.exception('Failed to write article events at exit')
+
+
+def settled_events(last_event_id, batch_size, settle=None):
+    """[(pk, article_id, kind, created_at)] of the next events past a checkpoint
+
+    Ids are handed out on insert but rows appear on commit, so a slow
+    transaction can land below an id a reader has already passed. The batch
+    ends at the first event logged in the last SETTLE_SECONDS, by when
+    every lower id has committed.
+    """
+    if settle is None:
+        settle = get_config()['SETTLE_SECONDS']
+    cutoff = timezone.now() - timedelta(seconds=settle)
+    rows = (
+        ArticleEvent.objects.filter(pk__gt=last_event_id).order_by('pk')
+        .values_list('pk', 'article_id', 'kind', 'created_at', 'logged_at')[:batch_size]
+    )
+    events = []
+    for pk, article_id, kind, created_at, logged_at in rows:
+        if logged_at > cutoff:
+            break
+        events.append((pk, article_id, kind, created_at))
+    return events
+
+
+def rollup_batch(batch_size=5000):
+    """Fold the next batch of events into the daily rollups
+
+    Runs in one transaction with the checkpoint row locked, so concurrent
+    runs queue up instead of counting the same events twice. Returns the
+    number of events rolled up.
+    """
+    with transaction.atomic():
+        RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+        checkpoint = RollupCheckpoint.objects.select_for_update().get(name=CHECKPOINT)
+        events = settled_events(checkpoint.last_event_id, batch_size)
+        if not events:
+            return 0
+
+        totals = defaultdict(Counter)
+        for pk, article_id, kind, created_at in events:
+            column, delta = KIND_EFFECTS[kind]
+            totals[article_id, timezone.localdate(created_at)][column] += delta
+
+        existing = set(
+            ArticleDailyStat.objects.filter(
+                article_id__in={article_id for article_id, day in totals},
+                date__in={day for article_id, day in totals},
+            ).values_list('article_id', 'date')
+        )
+        ArticleDailyStat.objects.bulk_create([
+            ArticleDailyStat(article_id=article_id, date=day, **deltas)
+            for (article_id, day), deltas in totals.items()
+            if (article_id, day) not in existing
+        ], batch_size=500)
+        for (article_id, day), deltas in totals.items():
+            if (article_id, day) in existing:
+                ArticleDailyStat.objects.filter(article_id=article_id, date=day).update(
+                    **{column: F(column) + delta for column, delta in deltas.items()}
+                )
+
+        checkpoint.last_event_id = events[-1][0]
+        checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+    return len(events)
+
+
+def rollup(batch_size=5000):
+    """Roll up every pending event, returning how many were processed"""
+    rolled = 0
+    while True:
+        count = rollup_batch(batch_size)
+        rolled += count
+        if count < batch_size:
+            return rolled
+
+
+def purge(retention_days=None, batch_size=5000):
+    """Delete processed raw events older than the retention window"""
+    if retention_days is None:
+        retention_days = get_config()['RETENTION_DAYS']
+    # Keep events any consumer has yet to read; one that never ran has read none
+    positions = dict(RollupCheckpoint.objects.filter(name__in=CONSUMERS).values_list('name', 'last_event_id'))
+    last_event_id = min(positions.get(name, 0) for name in CONSUMERS)
+    if not last_event_id:
+        return 0
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = ArticleEvent.objects.filter(pk__lte=last_event_id, created_at__lt=cutoff)
+    purged = 0
+    while True:
+        batch = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return purged
+        purged += ArticleEvent.objects.filter(pk__in=batch).delete()[0]
+
+
+def daily_series(days, article_id=None, today=None):
+    """[(date, views, likes, saves)] for the last days days, oldest first
+
+    Read from the rollups, for one article or the whole site.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = ArticleDailyStat.objects.filter(date__gte=start, date__lte=today)
+    if article_id is not None:
+        rows = rows.filter(article_id=article_id)
+    by_day = {
+        row['date']: row
+        for row in rows.values('date').annotate(
+            total_views=Sum('views'), total_likes=Sum('likes'), total_saves=Sum('saves'),
+        )
+    }
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day, {})
+        series.append((day, row.get('total_views', 0), row.get('total_likes', 0), row.get('total_saves', 0)))
+    return series
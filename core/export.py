@@ -0,0 +1,325 @@
+"""
+Static export of the public site
+Renders the home page, every category and every published article from
+the Django templates into a tree laid out like the site's URLs
+(site/article/<slug>/index.html and so on), which WhiteNoise
+(WHITENOISE_ROOT) or any file server can serve next to STATIC_ROOT.
+
+Exports are incremental. A manifest keeps a signature of each page's
+inputs, and a page is only re-rendered when its signature changes.
+Pages render in parallel across worker processes.
+
+The search page runs in the browser off a compact index written
+alongside: per-term postings split into shards by two-letter prefix and
+article metadata split into id ranges, each also gzipped, so a query
+downloads only the shards for its terms and results.
+"""
+import gzip
+import hashlib
+import json
+import math
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.db.models import Max
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+
+from . import related, search
+from .fragments import fragment_timeout, home_version
+from .models import Article, Category, SearchPosting
+from .pagination import ARTICLE_ORDERINGS, KeysetPaginator
+from .views import (
+    CATEGORY_ARTICLES_PER_PAGE, _home_categories, _home_featured_article, _home_featured_articles,
+    _home_trending_articles,
+)
+
+
+# Bump to re-render every page after changing how pages are exported
+EXPORT_VERSION = 1
+
+MANIFEST_NAME = '.export-manifest.json'
+
+# URL path of the search index under the export root
+SEARCH_INDEX_PATH = 'search-index'
+
+# Articles per metadata shard of the search index
+DOC_SHARD_SIZE = 500
+
+TERM_PREFIX_LENGTH = 2
+
+
+def page_path(url):
+    """File serving a URL path, relative to the export root"""
+    return os.path.join(url.strip('/'), 'index.html')
+
+
+def signature(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def site_fingerprint():
+    """Signature of everything every page depends on: templates and static file names"""
+    digest = hashlib.sha1(str(EXPORT_VERSION).encode())
+    for directory in [os.path.join(settings.BASE_DIR, 'templates')]:
+        for base, dirs, files in sorted(os.walk(directory)):
+            dirs[:] = sorted(name for name in dirs if name != 'admin_panel')
+            for name in sorted(files):
+                with open(os.path.join(base, name), 'rb') as fp:
+                    digest.update(name.encode() + fp.read())
+    # Hashed static names change with the assets
+    manifest = os.path.join(settings.STATIC_ROOT, 'staticfiles.json')
+    if os.path.exists(manifest):
+        with open(manifest, 'rb') as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+def write_file(root, path, data):
+    """Write data and a gzipped copy atomically"""
+    target = os.path.join(root, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    for name, payload in ((target, data), (target + '.gz', gzip.compress(data, mtime=0))):
+        with open(name + '.tmp', 'wb') as fp:
+            fp.write(payload)
+        os.replace(name + '.tmp', name)
+
+
+def remove_file(root, path):
+    for name in (path, path + '.gz'):
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+
+
+def render_page(template, context):
+    """Render as an anonymous visitor, without request-specific tokens"""
+    # NOTPROVIDED makes {% csrf_token %} render nothing; static forms can't post anyway
+    context = {'user': AnonymousUser(), 'csrf_token': 'NOTPROVIDED', 'static_export': True, **context}
+    return force_bytes(render_to_string(template, context))
+
+
+# Pages: each builder returns (signature, render) where render() produces the page
+
+def home_page(fingerprint):
+    context = {
+        'featured_article': _home_featured_article(),
+        'trending_articles': _home_trending_articles(),
+        'featured_articles': _home_featured_articles(),
+        'categories': _home_categories(),
+        'fragment_version': home_version(),
+        'fragment_timeout': fragment_timeout(),
+    }
+    content = render_page('home.html', context)
+    return hashlib.sha1(content + fingerprint.encode()).hexdigest(), lambda: content
+
+
+def category_page(fingerprint, slug):
+    category = Category.objects.get(slug=slug)
+    # First page only; later pages need the live site's cursors
+    articles = Article.objects.in_category(category).cards()
+    page = KeysetPaginator(articles, ARTICLE_ORDERINGS['newest'], CATEGORY_ARTICLES_PER_PAGE).get_page(None)
+    subcategories = list(category.subcategories.all())
+    inputs = signature(
+        fingerprint, category.name, category.description, category.get_image_url(), category.published_count,
+        [(card.id, card.views) for card in page], [(sub.slug, sub.name) for sub in subcategories],
+        Article.objects.in_category(category).aggregate(last=Max('updated_at'))['last'],
+    )
+    context = {'category': category, 'articles': page, 'sort': 'newest', 'subcategories': subcategories}
+    return inputs, lambda: render_page('category.html', context)
+
+
+def article_page(fingerprint, slug):
+    article = Article.objects.published().select_related('category').defer('plain_text').get(slug=slug)
+    related_articles = list(related.related_articles(article))
+    if not related_articles:
+        related_articles = list(
+            Article.objects.in_category(article.category_id).exclude(id=article.id).order_by('-created_at', '-id').cards()[:4]
+        )
+    inputs = signature(
+        fingerprint, article.updated_at, article.likes, article.category.name,
+        [(card.slug, card.title, card.get_image_url(), card.read_time) for card in related_articles],
+    )
+    context = {'article': article, 'related_articles': related_articles, 'is_saved': False, 'is_liked': False}
+    return inputs, lambda: render_page('article_detail.html', context)
+
+
+def search_page(fingerprint):
+    context = {
+        'query': '',
+        'articles': [],
+        'total_results': 0,
+        'categories': _home_categories(),
+        'search_index_url': f'/{SEARCH_INDEX_PATH}/',
+    }
+    inputs = signature(fingerprint, [(cat.slug, cat.name, cat.published_count) for cat in context['categories']])
+    return inputs, lambda: render_page('search_results.html', context)
+
+
+PAGES = {
+    'home': home_page,
+    'category': category_page,
+    'article': article_page,
+    'search': search_page,
+}
+
+
+def init_worker():
+    django.setup()
+    connections.close_all()
+
+
+def export_page(task):
+    """Render one page if its inputs changed; returns (path, signature, written)"""
+    root, fingerprint, kind, key, url, previous = task
+    path = page_path(url)
+    args = (fingerprint, key) if key is not None else (fingerprint,)
+    inputs, render = PAGES[kind](*args)
+    if inputs == previous and os.path.exists(os.path.join(root, path)):
+        return path, inputs, False
+    write_file(root, path, render())
+    return path, inputs, True
+
+
+def page_tasks():
+    """(kind, key, url) for every page of the public site"""
+    yield 'home', None, reverse('core:home')
+    yield 'search', None, reverse('core:search')
+    for slug in Category.objects.order_by('pk').values_list('slug', flat=True):
+        yield 'category', slug, reverse('core:category', args=[slug])
+    for slug in Article.objects.published().order_by('pk').values_list('slug', flat=True).iterator():
+        yield 'article', slug, reverse('core:article_detail', args=[slug])
+
+
+# Search index
+
+def term_shards():
+    """Yield (prefix, {term: [[article_id, weight], ...]}) for published articles
+
+    The weight is the saturated BM25F term frequency used by
+    core.search.rank(); the browser multiplies it by the term's idf.
+    """
+    stats = search.index_stats()
+    avg_lengths = stats['avg_lengths']
+    postings = (
+        SearchPosting.objects.filter(article__status='published').order_by('term', 'article_id')
+        .values_list('term', 'article_id', 'field', 'frequency', 'field_length').iterator(chunk_size=5000)
+    )
+    prefix, shard, term, weighted = None, {}, None, defaultdict(float)
+
+    def close_term():
+        if term is not None:
+            shard[term] = [
+                [article_id, round(tf * (search.K1 + 1) / (tf + search.K1), 3)]
+                for article_id, tf in sorted(weighted.items())
+            ]
+
+    for posting_term, article_id, field, frequency, field_length in postings:
+        if posting_term != term:
+            close_term()
+            term, weighted = posting_term, defaultdict(float)
+            if term[:TERM_PREFIX_LENGTH] != prefix:
+                if shard:
+                    yield prefix, shard
+                prefix, shard = term[:TERM_PREFIX_LENGTH], {}
+        norm = 1 - search.B + search.B * field_length / avg_lengths[field]
+        weighted[article_id] += search.FIELD_BOOSTS[field] * frequency / norm
+    close_term()
+    if shard:
+        yield prefix, shard
+
+
+def doc_shards():
+    """Yield (shard number, {article_id: [url, title, excerpt, category, image, read time]})"""
+    number, shard = None, {}
+    for card in Article.objects.published().order_by('pk').cards().iterator(chunk_size=2000):
+        if card.id // DOC_SHARD_SIZE != number:
+            if shard:
+                yield number, shard
+            number, shard = card.id // DOC_SHARD_SIZE, {}
+        shard[card.id] = [
+            card.get_absolute_url(), card.title, card.excerpt, card.category.name, card.get_image_url(), card.read_time,
+        ]
+    if shard:
+        yield number, shard
+
+
+def search_index_files():
+    """(path, bytes) of every file of the search index"""
+    prefixes = []
+    for prefix, shard in term_shards():
+        prefixes.append(prefix)
+        yield f'{SEARCH_INDEX_PATH}/terms/{prefix}.json', json.dumps(shard, separators=(',', ':')).encode()
+    for number, shard in doc_shards():
+        yield f'{SEARCH_INDEX_PATH}/docs/{number}.json', json.dumps(shard, separators=(',', ':')).encode()
+    meta = {
+        'documents': Article.objects.published().count(),
+        'prefixes': prefixes,
+        'prefix_length': TERM_PREFIX_LENGTH,
+        'doc_shard_size': DOC_SHARD_SIZE,
+        'max_term_length': search.MAX_TERM_LENGTH,
+        'stop_words': sorted(search.STOP_WORDS),
+    }
+    yield f'{SEARCH_INDEX_PATH}/meta.json', json.dumps(meta, separators=(',', ':')).encode()
+
+
+class StaticExporter:
+    """Brings an export directory up to date with the database"""
+
+    def __init__(self, root, workers=0, force=False):
+        self.root = root
+        self.workers = workers
+        self.force = force
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self.manifest = {}
+        if not force and os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as fp:
+                self.manifest = json.load(fp)
+        self.stats = defaultdict(int)
+
+    def run(self):
+        fingerprint = site_fingerprint()
+        current = {}
+        tasks = [
+            (self.root, fingerprint, kind, key, url, self.manifest.get(page_path(url)))
+            for kind, key, url in page_tasks()
+        ]
+        if self.workers > 1:
+            # Workers open their own connections
+            connections.close_all()
+            with Pool(self.workers, initializer=init_worker) as pool:
+                results = pool.imap_unordered(export_page, tasks, chunksize=max(1, math.ceil(len(tasks) / (self.workers * 8))))
+                current.update(self.collect(results))
+        else:
+            current.update(self.collect(map(export_page, tasks)))
+
+        for path, data in search_index_files():
+            digest = hashlib.sha1(data).hexdigest()
+            if self.manifest.get(path) != digest or not os.path.exists(os.path.join(self.root, path)):
+                write_file(self.root, path, data)
+                self.stats['index_written'] += 1
+            current[path] = digest
+
+        # Unpublished or deleted articles, vanished shards
+        for path in set(self.manifest) - set(current):
+            remove_file(self.root, path)
+            self.stats['removed'] += 1
+
+        self.manifest = current
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.manifest_path, 'w') as fp:
+            json.dump(current, fp, indent=0, sort_keys=True)
+        return self.stats
+
+    def collect(self, results):
+        for path, inputs, written in results:
+            self.stats['pages'] += 1
+            self.stats['rendered'] += written
+            yield path, inputs
@@ -0,0 +1,42 @@
+"""
+Versioned template fragment caching
+Fragments are cached under a version number that is bumped whenever the
+content they are rendered from changes, so stale fragments are simply
+never looked up again and expire on their own. A bump only reaches other
+workers through a shared cache (SHARED_CACHE); with per-process caches
+fragments expire after LOCAL_FRAGMENT_TIMEOUT instead.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+HOME_VERSION_KEY = 'fragments:home:version'
+
+# Upper bound on how long a fragment lives; also limits how stale view-based
+# sections (trending fallback) can get, since view counts don't bump the version
+FRAGMENT_TIMEOUT = 60 * 60
+LOCAL_FRAGMENT_TIMEOUT = 5
+
+
+def fragment_timeout():
+    return FRAGMENT_TIMEOUT if settings.SHARED_CACHE else LOCAL_FRAGMENT_TIMEOUT
+
+
+def home_version():
+    """Current version of the home page fragments"""
+    version = cache.get(HOME_VERSION_KEY)
+    if version is None:
+        # Start from the clock so an evicted key never reuses an old version
+        cache.add(HOME_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(HOME_VERSION_KEY)
+    return version
+
+
+def bump_home_version():
+    """Invalidate every cached home page fragment"""
+    try:
+        cache.incr(HOME_VERSION_KEY)
+    except ValueError:
+        home_version()
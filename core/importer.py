@@ -0,0 +1,275 @@
+"""
+Streaming bulk article importer
+Reads an article feed incrementally, resolves categories and
+subcategories through an in-memory map, and upserts articles in chunked
+transactions with bulk_create/bulk_update. Rows whose content hash
+matches the stored source_hash are skipped.
+
+Bulk writes bypass model signals, so finish() brings the search index,
+category counters, home fragments and search suggestions up to date
+afterwards.
+"""
+import hashlib
+import json
+import time
+from collections import Counter, namedtuple
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import autocomplete, content, counts, search
+from .fragments import bump_home_version
+from .models import Article, Category, SubCategory
+
+
+READ_SIZE = 1 << 16
+
+ImportRow = namedtuple('ImportRow', 'slug category subcategory fields source_hash')
+
+# Article columns written from the feed
+FEED_FIELDS = ['title', 'excerpt', 'content', 'tags', 'author', 'image_url', 'is_featured', 'is_trending'] + content.DERIVED_FIELDS
+
+
+class JSONStream:
+    """Incremental JSON reader that decodes one value at a time from a text file"""
+
+    def __init__(self, fp, read_size=READ_SIZE):
+        self.fp = fp
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read more text into the buffer, returning False at end of file"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character without consuming it, '' at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} at offset {self.pos} of the buffered feed')
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number or literal ending the buffer may continue in the next read
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """Yield the elements of the array starting at the current position"""
+        self.expect('[')
+        while True:
+            char = self.peek()
+            if char == ']':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+            yield self.value()
+
+
+def iter_articles(fp, read_size=READ_SIZE):
+    """Yield article dicts from a feed without loading it all
+
+    Accepts either a top-level array or an object with an "articles"
+    array; other top-level keys are skipped.
+    """
+    stream = JSONStream(fp, read_size)
+    if stream.peek() == '[':
+        yield from stream.items()
+        return
+    stream.expect('{')
+    while True:
+        char = stream.peek()
+        if char in ('}', ''):
+            return
+        if char == ',':
+            stream.pos += 1
+            continue
+        key = stream.value()
+        stream.expect(':')
+        if key == 'articles':
+            yield from stream.items()
+        else:
+            stream.value()
+
+
+def prepare(data):
+    """Normalize one feed row into an ImportRow with its hash and derived content"""
+    fields = {
+        'title': data.get('title', 'Untitled'),
+        'excerpt': data.get('excerpt', ''),
+        'content': data.get('content', ''),
+        'tags': ', '.join(data.get('tags') or [])[:255],
+        'author': data.get('author', 'Healthline Team'),
+        'image_url': data.get('image', ''),
+        'is_featured': bool(data.get('featured', False)),
+        'is_trending': False,
+    }
+    slug = data.get('slug') or slugify(fields['title'])
+    category = data.get('category') or 'uncategorized'
+    subcategory = data.get('subcategory') or ''
+    digest = hashlib.sha256(
+        json.dumps([slug, category, subcategory, fields], sort_keys=True).encode()
+    ).hexdigest()
+    # Read time is computed from the text like any saved article's
+    fields.update(content.derive(fields['content']))
+    return ImportRow(slug, category, subcategory, fields, digest)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Taxonomy:
+    """Category and subcategory ids by slug, creating missing ones on first use"""
+
+    def __init__(self):
+        self.categories = dict(Category.objects.values_list('slug', 'pk'))
+        self.subcategories = {
+            (category_id, slug): pk
+            for pk, category_id, slug in SubCategory.objects.values_list('pk', 'category_id', 'slug')
+        }
+        self.created = Counter()
+
+    def category_id(self, slug):
+        if slug not in self.categories:
+            category = Category.objects.create(slug=slug, name=slug.replace('-', ' ').title())
+            self.categories[slug] = category.pk
+            self.created['categories'] += 1
+        return self.categories[slug]
+
+    def subcategory_id(self, category_id, slug):
+        if not slug:
+            return None
+        key = (category_id, slug)
+        if key not in self.subcategories:
+            subcategory = SubCategory.objects.create(
+                slug=slug, category_id=category_id, name=slug.replace('-', ' ').title()
+            )
+            self.subcategories[key] = subcategory.pk
+            self.created['subcategories'] += 1
+        return self.subcategories[key]
+
+
+class ArticleImporter:
+    """Upserts prepared rows in chunked transactions"""
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.taxonomy = Taxonomy()
+        self.stats = Counter()
+        self.touched = []
+        self.started = time.monotonic()
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.batch_size):
+            self.write(chunk)
+        return self.stats
+
+    def write(self, chunk):
+        """Upsert one chunk of rows in a single transaction"""
+        # The last occurrence of a slug wins, as it would row by row
+        rows = {row.slug: row for row in chunk}
+        self.stats['rows'] += len(chunk)
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {
+                slug: (pk, source_hash)
+                for slug, pk, source_hash in Article.objects.filter(slug__in=rows).values_list('slug', 'pk', 'source_hash')
+            }
+            to_create = []
+            to_update = []
+            for slug, row in rows.items():
+                pk, source_hash = existing.get(slug, (None, None))
+                if source_hash == row.source_hash:
+                    self.stats['unchanged'] += 1
+                    continue
+                category_id = self.taxonomy.category_id(row.category)
+                article = Article(
+                    pk=pk,
+                    slug=slug,
+                    category_id=category_id,
+                    subcategory_id=self.taxonomy.subcategory_id(category_id, row.subcategory),
+                    source_hash=row.source_hash,
+                    **row.fields,
+                )
+                if pk is None:
+                    to_create.append(article)
+                else:
+                    article.updated_at = now
+                    article.related_stale = True
+                    to_update.append(article)
+            if to_create:
+                Article.objects.bulk_create(to_create, batch_size=self.batch_size)
+            if to_update:
+                Article.objects.bulk_update(
+                    to_update,
+                    FEED_FIELDS + ['category', 'subcategory', 'source_hash', 'related_stale', 'updated_at'],
+                    batch_size=self.batch_size,
+                )
+        self.stats['created'] += len(to_create)
+        self.stats['updated'] += len(to_update)
+        self.touched.extend(article.pk for article in to_update)
+        if to_create:
+            if all(article.pk for article in to_create):
+                self.touched.extend(article.pk for article in to_create)
+            else:
+                # Backends that can't return ids from a bulk insert
+                self.touched.extend(
+                    Article.objects.filter(slug__in=[article.slug for article in to_create]).values_list('pk', flat=True)
+                )
+
+    def finish(self, reindex=True):
+        """Refresh everything the model signals would have maintained"""
+        for _ in counts.verify_counts(fix=True):
+            pass
+        if reindex:
+            for batch in chunked(self.touched, self.batch_size):
+                search.rebuild_index(Article.objects.filter(pk__in=batch))
+        if self.touched:
+            bump_home_version()
+            autocomplete.bump_version()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.stats['rows'] / self.elapsed if self.elapsed else 0.0
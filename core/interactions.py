@@ -0,0 +1,131 @@
+"""
+Like and save toggles
+Each toggle touches the M2M through-tables directly, so it costs a fixed
+number of queries no matter how many articles the user has saved or
+liked, and keeps Article.likes in step with atomic F() updates.
+Cached membership sets (core.membership) are dropped on every change.
+"""
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from . import membership
+from .models import Article, UserProfile
+
+
+LikedArticle = UserProfile.liked_articles.through
+SavedArticle = UserProfile.saved_articles.through
+
+
+def get_profile_id(user):
+    """Return the user's profile id, creating the profile if needed"""
+    profile_id = UserProfile.objects.filter(user=user).values_list('pk', flat=True).first()
+    if profile_id is None:
+        profile_id = UserProfile.objects.get_or_create(user=user)[0].pk
+    return profile_id
+
+
+async def aget_profile_id(user):
+    """get_profile_id for async views"""
+    profile_id = await UserProfile.objects.filter(user=user).values_list('pk', flat=True).afirst()
+    if profile_id is None:
+        profile_id = (await UserProfile.objects.aget_or_create(user=user))[0].pk
+    return profile_id
+
+
+def _lock_article(article_id):
+    """Lock the article row and return its like count
+
+    Holding the row lock for the whole toggle serializes it with
+    reconcile_likes, so a recount can never interleave with a toggle.
+    """
+    likes = Article.objects.published().select_for_update().filter(pk=article_id).values_list('likes', flat=True).first()
+    if likes is None:
+        raise Article.DoesNotExist(f'Article {article_id} does not exist')
+    return likes
+
+
+def _toggle(through, profile_id, article_id):
+    """Remove the membership row if present, otherwise add it
+
+    Returns (member, changed). A concurrent toggle that already inserted
+    the same row is treated as a no-op rather than a second change.
+    """
+    removed, _ = through.objects.filter(userprofile_id=profile_id, article_id=article_id).delete()
+    if removed:
+        return False, True
+    try:
+        with transaction.atomic():
+            through.objects.create(userprofile_id=profile_id, article_id=article_id)
+    except IntegrityError:
+        return True, False
+    return True, True
+
+
+def toggle_like(profile_id, article_id):
+    """Like or unlike an article, returning (liked, likes_count)"""
+    with transaction.atomic():
+        likes = _lock_article(article_id)
+        liked, changed = _toggle(LikedArticle, profile_id, article_id)
+        if changed:
+            delta = 1 if liked else -1
+            Article.objects.filter(pk=article_id).update(likes=F('likes') + delta)
+            likes += delta
+    if changed:
+        membership.invalidate(profile_id, 'liked')
+    return liked, likes
+
+
+def toggle_save(profile_id, article_id):
+    """Save or unsave an article, returning whether it is now saved"""
+    with transaction.atomic():
+        if not Article.objects.published().filter(pk=article_id).exists():
+            raise Article.DoesNotExist(f'Article {article_id} does not exist')
+        saved, changed = _toggle(SavedArticle, profile_id, article_id)
+    if changed:
+        membership.invalidate(profile_id, 'saved')
+    return saved
+
+
+# Transactions can't span awaits, so async views run whole toggles in a worker thread
+atoggle_like = sync_to_async(toggle_like)
+atoggle_save = sync_to_async(toggle_save)
+
+
+def remove_saved(profile_id, article_id):
+    """Remove an article from the saved list, returning whether it was saved"""
+    removed, _ = SavedArticle.objects.filter(userprofile_id=profile_id, article_id=article_id).delete()
+    if removed:
+        membership.invalidate(profile_id, 'saved')
+    return bool(removed)
+
+
+def reconcile_likes(batch_size=1000, fix=False):
+    """Recount Article.likes from the liked_by through-table in batches
+
+    Yields (article_id, stored, actual) for every article whose counter
+    has drifted, repairing it when fix is True.
+    """
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = Article.objects.filter(pk__gt=last_id).order_by('pk')
+            if fix:
+                batch = batch.select_for_update()
+            stored = dict(batch.values_list('pk', 'likes')[:batch_size])
+            if not stored:
+                return
+            actual = dict(
+                LikedArticle.objects.filter(article_id__in=stored)
+                .values('article_id').annotate(total=Count('pk'))
+                .values_list('article_id', 'total')
+            )
+            drifted = []
+            for article_id, likes in stored.items():
+                if likes != actual.get(article_id, 0):
+                    drifted.append(Article(pk=article_id, likes=actual.get(article_id, 0)))
+            if fix and drifted:
+                Article.objects.bulk_update(drifted, ['likes'])
+        for article in drifted:
+            yield article.pk, stored[article.pk], article.likes
+        last_id = max(stored)
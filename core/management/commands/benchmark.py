@@ -0,0 +1,102 @@
+"""
+Management command to load-test the site and check it against a baseline
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from core.benchmark import (
+    SERVER_ENV, SERVERS, ClientTransport, GunicornServer, HttpTransport, LoadRun, benchmark_users, compare, format_table,
+    get_config, site_scenario,
+)
+
+
+class Command(BaseCommand):
+    help = 'Run signed-in visitors against the site and report throughput, latency and queries per request'
+
+    def add_arguments(self, parser):
+        config = get_config()
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--url', help='Load a running server at this URL instead of this process')
+        target.add_argument('--server', choices=sorted(SERVERS), help='Start the site under gunicorn and load it')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Gunicorn workers for --server')
+        parser.add_argument('--concurrency', type=int, default=config['CONCURRENCY'], help='Concurrent visitors')
+        parser.add_argument('--duration', type=float, default=config['DURATION'], help='Seconds of load, after warm-up')
+        parser.add_argument('--warmup', type=float, default=config['WARMUP'], help='Seconds of load before recording')
+        parser.add_argument('--output', help='Save the results to this JSON file, for use as a baseline')
+        parser.add_argument(
+            '--allow-create-users', action='store_true',
+            help='Sign in as temporary users, some of them staff, even though DEBUG is off',
+        )
+        parser.add_argument('--baseline', help='Fail if the results regressed from this saved run')
+        parser.add_argument(
+            '--threshold', action='append', default=[], metavar='KEY=VALUE',
+            help='Override an allowed regression, e.g. p95=0.1 (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if not (settings.DEBUG or options['allow_create_users']):
+            raise CommandError(
+                'The benchmark creates users, some of them staff; run it against a throwaway database '
+                'with DEBUG on, or pass --allow-create-users'
+            )
+        config = get_config()
+        for override in options['threshold']:
+            key, _, value = override.partition('=')
+            if key not in config['THRESHOLDS']:
+                raise CommandError(f'Unknown threshold {key!r}; choose from {", ".join(config["THRESHOLDS"])}')
+            config['THRESHOLDS'][key] = float(value)
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as fp:
+                baseline = json.load(fp)
+
+        with benchmark_users(options['concurrency']) as (users, password):
+            try:
+                scenario = site_scenario(users, password)
+            except ValueError as error:
+                raise CommandError(str(error))
+            mode, results = self.load(scenario, options)
+
+        self.stdout.write(f'{mode}: {options["concurrency"]} visitors for {options["duration"]:g}s')
+        for line in format_table(results):
+            self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                json.dump({
+                    'mode': mode,
+                    'created': timezone.now().isoformat(),
+                    'options': {key: options[key] for key in ('concurrency', 'duration', 'warmup', 'workers')},
+                    'results': results,
+                }, fp, indent=2)
+
+        if baseline is not None:
+            regressions = compare(baseline['results'], results, config)
+            if regressions:
+                raise CommandError('Regressed from {}:\n  {}'.format(options['baseline'], '\n  '.join(regressions)))
+            self.stdout.write(f'No regressions from {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS(f'Benchmark complete in {time.monotonic() - started:.1f}s'))
+
+    def load(self, scenario, options):
+        """(mode, results) of running the scenario against the chosen target"""
+        def run(transport):
+            return LoadRun(scenario, transport, options['concurrency'], options['duration'], options['warmup']).run()
+
+        if options['url']:
+            return options['url'], run(lambda: HttpTransport(options['url']))
+        if options['server']:
+            app, worker_class, env = SERVERS[options['server']]
+            mode = f'gunicorn {app} --worker-class {worker_class} --workers {options["workers"]}'
+            env = {**SERVER_ENV, **env, 'QUERY_INSPECTOR': 'True'}
+            with GunicornServer(app, worker_class, options['workers'], env) as server:
+                return mode, run(lambda: HttpTransport(server.url))
+        with override_settings(
+            QUERY_INSPECTOR=True, SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ):
+            return 'in-process', run(ClientTransport)
@@ -0,0 +1,98 @@
+"""
+Management command to compare the WSGI and ASGI deployments under load
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from core.benchmark import (
+    SERVER_ENV, SERVERS, GunicornServer, HttpTransport, LoadRun, MixScenario, Step, benchmark_users, format_table,
+)
+from core.models import Article, Category
+
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+
+# Articles the like and save toggles spread over, so clients rarely wait on one row's lock
+TOGGLED_ARTICLES = 20
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the JSON endpoints under gunicorn sync workers (WSGI) and uvicorn workers (ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Gunicorn worker processes per server')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds of load per server, after warm-up')
+        parser.add_argument('--server', choices=sorted(SERVERS), action='append', help='Only run this server (repeatable)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument(
+            '--allow-create-users', action='store_true',
+            help='Sign in as a temporary staff user even though DEBUG is off',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if not (settings.DEBUG or options['allow_create_users']):
+            raise CommandError(
+                'The benchmark signs in as a temporary staff user; run it against a throwaway database '
+                'with DEBUG on, or pass --allow-create-users'
+            )
+        results = {}
+
+        with benchmark_users(1, staff_every=1) as (users, _):
+            scenario, cookies = self.scenario(users[0][0])
+            for label in options['server'] or list(SERVERS):
+                app, worker_class, env = SERVERS[label]
+                self.stdout.write(f'{label}: gunicorn {app} --worker-class {worker_class} --workers {options["workers"]}')
+                with GunicornServer(app, worker_class, options['workers'], env={**SERVER_ENV, **env}) as server:
+                    run = LoadRun(scenario, lambda: HttpTransport(server.url, cookies), options['concurrency'], options['duration'])
+                    results[label] = run.run()
+                for line in format_table(results[label]):
+                    self.stdout.write(line)
+
+        if {'wsgi', 'asgi'} <= results.keys():
+            wsgi, asgi = results['wsgi']['total'], results['asgi']['total']
+            self.stdout.write(
+                f'ASGI vs WSGI: {asgi["rps"] / wsgi["rps"] if wsgi["rps"] else 0:.2f}x requests/s, '
+                f'p99 {asgi["p99"]:.1f}ms vs {wsgi["p99"]:.1f}ms'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                json.dump({'options': {key: options[key] for key in ('workers', 'concurrency', 'duration')}, 'results': results}, fp, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f'Benchmark complete in {time.monotonic() - started:.1f}s'))
+
+    def scenario(self, username):
+        """The request mix, and the cookies signing it in as the given staff user"""
+        articles = list(Article.objects.filter(status='published').order_by('pk').values_list('pk', flat=True)[:TOGGLED_ARTICLES])
+        category_id = Category.objects.order_by('pk').values_list('pk', flat=True).first()
+        if not articles or category_id is None:
+            raise CommandError('No published articles to benchmark against; run import_articles first.')
+
+        client = Client()
+        client.force_login(User.objects.get(username=username))
+        # The CSRF check compares the cookie with the header, so any secret will do
+        cookies = {
+            settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME: get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS),
+        }
+
+        mix = []
+        for article_id in articles:
+            mix += [
+                Step('like_article', 'POST', reverse('core:like_article', args=[article_id])),
+                Step('save_article', 'POST', reverse('core:save_article', args=[article_id])),
+                Step('newsletter_subscribe', 'POST', reverse('core:newsletter_subscribe'), {'email': BENCHMARK_EMAIL}),
+                Step('get_subcategories', 'GET', reverse('admin_panel:get_subcategories'), {'category_id': category_id}),
+                Step('dashboard_stats', 'GET', reverse('admin_panel:stats')),
+            ]
+        return MixScenario(mix), cookies
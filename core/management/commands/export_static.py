@@ -0,0 +1,33 @@
+"""
+Management command to pre-render the public site into static files
+"""
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.export import StaticExporter
+
+
+class Command(BaseCommand):
+    help = 'Render the home page, categories, published articles and search index to static files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.STATIC_EXPORT_ROOT, help='Directory to export into (defaults to STATIC_EXPORT_ROOT)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes rendering pages')
+        parser.add_argument('--force', action='store_true', help='Re-render every page, ignoring the manifest')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        exporter = StaticExporter(options['output'], workers=options['workers'], force=options['force'])
+        stats = exporter.run()
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Static export complete!\n'
+            f'  Pages: {stats["pages"]}\n'
+            f'  Pages rendered: {stats["rendered"]}\n'
+            f'  Search index files written: {stats["index_written"]}\n'
+            f'  Files removed: {stats["removed"]}\n'
+            f'  Output: {options["output"]}\n'
+            f'  Elapsed: {time.monotonic() - started:.1f}s'
+        ))
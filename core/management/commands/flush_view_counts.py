@@ -0,0 +1,23 @@
+"""
+Management command to write buffered article views to the database
+"""
+from django.core.management.base import BaseCommand
+from core.counters import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered article view counts to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Articles drained from the cache per batch')
+
+    def handle(self, *args, **options):
+        if view_counter.config['BACKEND'] != 'cache':
+            self.stdout.write(self.style.WARNING(
+                'VIEW_COUNTER backend is "memory": each worker flushes its own buffer '
+                'on a timer and at shutdown, so only this process can be flushed here.'
+            ))
+        
+        flushed = view_counter.flush_all(batch_size=options['batch_size'])
+        
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} article views.'))
@@ -0,0 +1,95 @@
+"""
+Management command to generate synthetic data for capacity testing
+"""
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from admin_panel import stats
+from core.synthetic import PHASES, DataGenerator
+
+_generator = None
+
+
+def init_worker(generator):
+    global _generator
+    _generator = generator
+
+
+def run_chunk(task):
+    return _generator.run(*task)
+
+
+class Command(BaseCommand):
+    help = 'Generate articles, users, likes, saves and newsletter subscribers in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=10000, help='Articles to generate')
+        parser.add_argument('--users', type=int, default=5000, help='Users to generate, each with a profile')
+        parser.add_argument('--subscribers', type=int, default=10000, help='Newsletter subscribers to generate')
+        parser.add_argument('--likes', type=float, default=20, help='Mean articles liked per user')
+        parser.add_argument('--saves', type=float, default=10, help='Mean articles saved per user')
+        parser.add_argument('--seed', type=int, default=0, help='Seed the rows are drawn from')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Processes writing chunks in parallel')
+        parser.add_argument('--phase', choices=PHASES, action='append', help='Only generate this kind of row (repeatable)')
+        parser.add_argument('--no-index', action='store_true', help='Skip search postings of generated articles')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        generator = DataGenerator(
+            seed=options['seed'],
+            articles=options['articles'],
+            users=options['users'],
+            subscribers=options['subscribers'],
+            likes=options['likes'],
+            saves=options['saves'],
+            batch_size=options['batch_size'],
+            index=not options['no_index'],
+        )
+        created = generator.prepare()
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows one writer at a time; generating in this process.'))
+            workers = 1
+
+        totals = Counter()
+        for phase in PHASES:
+            if options['phase'] and phase not in options['phase']:
+                continue
+            phase_started = time.monotonic()
+            tasks = generator.tasks(phase)
+            if workers > 1:
+                # Each process opens its own connections
+                connections.close_all()
+                with Pool(workers, initializer=init_worker, initargs=(generator,)) as pool:
+                    results = list(pool.imap_unordered(run_chunk, tasks))
+            else:
+                results = [generator.run(*task) for task in tasks]
+            written = sum(results, Counter())
+            totals += written
+            rows = sum(count for key, count in written.items() if key != 'skipped')
+            elapsed = time.monotonic() - phase_started
+            self.stdout.write(
+                f'  {phase}: {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f}/s), '
+                f'{written["skipped"]} already there'
+            )
+
+        generated = time.monotonic() - started
+        generator.finish()
+        stats.refresh_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generation complete!\n'
+            f'  Categories created: {created["categories"]}\n'
+            f'  Subcategories created: {created["subcategories"]}\n'
+            f'  Articles: {totals["articles"]}\n'
+            f'  Users: {totals["users"]}\n'
+            f'  Likes: {totals["likes"]}\n'
+            f'  Saves: {totals["saves"]}\n'
+            f'  Subscribers: {totals["subscribers"]}\n'
+            f'  Generated in {generated:.1f}s, {time.monotonic() - started:.1f}s with counters refreshed'
+        ))
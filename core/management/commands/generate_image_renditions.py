@@ -0,0 +1,29 @@
+"""
+Management command to backfill resized copies of uploaded images
+"""
+import time
+from django.core.management.base import BaseCommand
+from core import renditions
+
+
+class Command(BaseCommand):
+    help = 'Write WebP/JPEG renditions for uploads that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate renditions of every upload')
+        parser.add_argument(
+            '--kind', action='append', choices=sorted(renditions.TARGETS),
+            help='Only this kind of upload (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        processed = renditions.backfill(kinds=options['kind'], force=options['all'])
+        
+        lines = ''.join(f'  {kind.capitalize()} images processed: {count}\n' for kind, count in processed.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Image renditions generated!\n'
+            f'{lines}'
+            f'  Elapsed: {time.monotonic() - started:.1f}s'
+        ))
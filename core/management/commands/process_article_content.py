@@ -0,0 +1,26 @@
+"""
+Management command to derive plain text, read time, outline and HTML from article content
+"""
+import time
+from django.core.management.base import BaseCommand
+from core import content
+
+
+class Command(BaseCommand):
+    help = 'Run the content pipeline over articles whose content changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocess every article, even if unchanged')
+        parser.add_argument('--batch-size', type=int, default=200, help='Articles written per batch')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        checked, processed = content.process_articles(force=options['all'], batch_size=options['batch_size'])
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Content processed!\n'
+            f'  Articles checked: {checked}\n'
+            f'  Articles processed: {processed}\n'
+            f'  Elapsed: {time.monotonic() - started:.1f}s'
+        ))
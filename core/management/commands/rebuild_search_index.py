@@ -0,0 +1,31 @@
+"""
+Management command to rebuild the full-text search index
+"""
+import time
+from django.core.management.base import BaseCommand
+from core import search
+from core.models import SearchDocument, SearchPosting
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all published articles, dropping the rest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Articles fetched per batch')
+        parser.add_argument('--clear', action='store_true', help='Drop the whole index before rebuilding')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        if options['clear']:
+            SearchPosting.objects.all().delete()
+            SearchDocument.objects.all().delete()
+        
+        indexed = search.rebuild_index(batch_size=options['batch_size'])
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt!\n'
+            f'  Articles indexed: {indexed}\n'
+            f'  Postings: {SearchPosting.objects.count()}\n'
+            f'  Elapsed: {time.monotonic() - started:.1f}s'
+        ))
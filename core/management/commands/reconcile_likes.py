@@ -0,0 +1,27 @@
+"""
+Management command to recompute Article.likes from the liked_by table
+"""
+from django.core.management.base import BaseCommand
+from core.interactions import reconcile_likes
+
+
+class Command(BaseCommand):
+    help = 'Find (and optionally repair) drift between Article.likes and actual likes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Articles checked per batch')
+        parser.add_argument('--fix', action='store_true', help='Write corrected counts back to the articles')
+
+    def handle(self, *args, **options):
+        drifted = 0
+        
+        for article_id, stored, actual in reconcile_likes(batch_size=options['batch_size'], fix=options['fix']):
+            drifted += 1
+            self.stdout.write(f'  Article {article_id}: stored {stored}, actual {actual}')
+        
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All like counts are consistent.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {drifted} like counts.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{drifted} like counts have drifted. Re-run with --fix to repair them.'))
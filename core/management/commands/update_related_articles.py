@@ -0,0 +1,30 @@
+"""
+Management command to recompute related articles by content similarity
+"""
+import time
+from django.core.management.base import BaseCommand
+from core import related
+from core.models import RelatedArticle
+
+
+class Command(BaseCommand):
+    help = 'Recompute related articles for articles whose text changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every article, not just the affected ones')
+        parser.add_argument('--batch-size', type=int, default=related.BATCH_SIZE, help='Similarity rows computed at once')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        if options['all']:
+            stored = related.rebuild(batch_size=options['batch_size'])
+        else:
+            stored = related.update(batch_size=options['batch_size'])
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Related articles updated!\n'
+            f'  Articles recomputed: {stored}\n'
+            f'  Neighbour rows: {RelatedArticle.objects.count()}\n'
+            f'  Elapsed: {time.monotonic() - started:.1f}s'
+        ))
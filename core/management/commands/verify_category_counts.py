@@ -0,0 +1,29 @@
+"""
+Management command to check the denormalized category article counts
+"""
+from django.core.management.base import BaseCommand
+from core.counts import verify_counts
+
+
+class Command(BaseCommand):
+    help = 'Verify (and optionally rebuild) per-category article counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite counters that have drifted')
+
+    def handle(self, *args, **options):
+        drifted = 0
+        
+        for obj, stored, actual in verify_counts(fix=options['fix']):
+            drifted += 1
+            self.stdout.write(
+                f'  {obj._meta.verbose_name} "{obj}": stored {stored[0]} total / {stored[1]} published, '
+                f'actual {actual[0]} / {actual[1]}'
+            )
+        
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All category counts are consistent.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {drifted} counters.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{drifted} counters have drifted. Re-run with --fix to rebuild them.'))
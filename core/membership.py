@@ -0,0 +1,108 @@
+"""
+Per-user saved/liked membership
+Each user's saved and liked article ids are cached as compact frozensets,
+so article and list pages can tell whether any number of articles are
+saved or liked without loading the user's lists. The toggles in
+core.interactions drop a cached set whenever they change it. That only
+reaches other workers through a shared cache (SHARED_CACHE); with
+per-process caches the sets expire after LOCAL_CACHE_TIMEOUT instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Value
+
+from .models import UserProfile
+
+
+SavedArticle = UserProfile.saved_articles.through
+LikedArticle = UserProfile.liked_articles.through
+
+KINDS = {
+    'saved': SavedArticle,
+    'liked': LikedArticle,
+}
+
+CACHE_TIMEOUT = 3600
+LOCAL_CACHE_TIMEOUT = 5
+
+
+def cache_timeout():
+    return CACHE_TIMEOUT if settings.SHARED_CACHE else LOCAL_CACHE_TIMEOUT
+
+
+def cache_key(kind, profile_id):
+    return f'membership:{kind}:{profile_id}'
+
+
+def profile_id_for(user):
+    """Return the user's profile id, or None if they have no profile yet"""
+    if not user.is_authenticated:
+        return None
+    key = f'membership:profile:{user.pk}'
+    profile_id = cache.get(key)
+    if profile_id is None:
+        profile_id = UserProfile.objects.filter(user=user).values_list('pk', flat=True).first()
+        if profile_id is not None:
+            cache.set(key, profile_id, cache_timeout())
+    return profile_id
+
+
+def article_ids(profile_id, kinds=tuple(KINDS)):
+    """Return {kind: frozenset of article ids} for a profile
+
+    Cached sets are read in one round trip; the missing ones are loaded
+    together in a single UNION over the through-tables' userprofile_id
+    indexes.
+    """
+    keys = {cache_key(kind, profile_id): kind for kind in kinds}
+    ids = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [kind for kind in kinds if kind not in ids]
+    if missing:
+        queries = [
+            KINDS[kind].objects.filter(userprofile_id=profile_id)
+            .annotate(kind=Value(kind, output_field=CharField()))
+            .values_list('article_id', 'kind')
+            for kind in missing
+        ]
+        loaded = {kind: set() for kind in missing}
+        for article_id, kind in queries[0].union(*queries[1:], all=True):
+            loaded[kind].add(article_id)
+        loaded = {kind: frozenset(members) for kind, members in loaded.items()}
+        cache.set_many({cache_key(kind, profile_id): value for kind, value in loaded.items()}, cache_timeout())
+        ids.update(loaded)
+    return ids
+
+
+def invalidate(profile_id, kind):
+    """Forget a cached set after the through-table changed"""
+    cache.delete(cache_key(kind, profile_id))
+
+
+class Membership:
+    """Which articles one user has saved and liked"""
+
+    def __init__(self, saved=frozenset(), liked=frozenset()):
+        self.saved = saved
+        self.liked = liked
+
+    def is_saved(self, article_id):
+        return article_id in self.saved
+
+    def is_liked(self, article_id):
+        return article_id in self.liked
+
+    def annotate(self, cards):
+        """Set is_saved and is_liked on every card, returning them as a list"""
+        cards = list(cards)
+        for card in cards:
+            card.is_saved = card.id in self.saved
+            card.is_liked = card.id in self.liked
+        return cards
+
+
+def for_user(user):
+    """Membership of the given user; empty for anonymous users"""
+    profile_id = profile_id_for(user)
+    if profile_id is None:
+        return Membership()
+    return Membership(**article_ids(profile_id))
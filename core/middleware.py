@@ -0,0 +1,111 @@
+"""
+Core middleware
+"""
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .queryinspector import QueryBudgetExceeded, QueryRecorder, get_query_budget
+
+
+logger = logging.getLogger('core.queries')
+
+
+class QueryInspectorMiddleware:
+    """Log query counts, N+1 patterns and budget overruns for each request
+
+    Enabled with the QUERY_INSPECTOR setting (on by default when DEBUG).
+    Adds an X-Query-Count header so tools can read the count per response.
+    With QUERY_BUDGET_STRICT, as in tests, an overrun raises instead.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_INSPECTOR', settings.DEBUG)
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        
+        request.query_budget = None
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        
+        request.query_budget = None
+        # Connections are per thread, and an async request runs all of its
+        # queries in one worker thread, so the recorder is installed there
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        count = len(recorder)
+        response['X-Query-Count'] = str(count)
+        
+        for group in recorder.n_plus_one():
+            locations = ', '.join(group.locations) or 'view code'
+            logger.warning(
+                'Possible N+1 on %s: %d x %s (from %s)',
+                request.path, group.count, group.shape, locations,
+            )
+        
+        budget = request.query_budget
+        if budget is not None and count > budget:
+            if self.strict:
+                raise QueryBudgetExceeded(f'{request.path} ran {count} queries, budget is {budget}')
+            logger.warning(
+                'Query budget exceeded on %s: %d queries, budget %d',
+                request.path, count, budget,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.enabled:
+            request.query_budget = get_query_budget(view_func)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that lets async requests stay on the event loop
+
+    WhiteNoise 5 is sync-only, so under ASGI Django would hold a thread
+    for the rest of every request just to call it. Finding a static file
+    is a lookup in a dict built at startup, so the async path does it
+    inline.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
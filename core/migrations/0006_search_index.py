@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-17 02:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_article_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.article')),
+                ('title_length', models.PositiveIntegerField(default=0)),
+                ('excerpt_length', models.PositiveIntegerField(default=0)),
+                ('content_length', models.PositiveIntegerField(default=0)),
+                ('category_length', models.PositiveIntegerField(default=0)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('field', models.CharField(choices=[('title', 'Title'), ('excerpt', 'Excerpt'), ('content', 'Content'), ('category', 'Category')], max_length=10)),
+                ('frequency', models.PositiveIntegerField(default=1)),
+                ('field_length', models.PositiveIntegerField(default=0)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='core.article')),
+            ],
+            options={
+                'unique_together': {('term', 'article', 'field')},
+            },
+        ),
+    ]
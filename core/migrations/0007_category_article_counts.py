@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-17 02:39
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_articles(apps, schema_editor):
+    published = Q(articles__status='published')
+    for model_name in ('Category', 'SubCategory'):
+        model = apps.get_model('core', model_name)
+        rows = model.objects.annotate(total=Count('articles'), total_published=Count('articles', filter=published))
+        for obj in rows:
+            obj.article_count = obj.total
+            obj.published_count = obj.total_published
+        model.objects.bulk_update(rows, ['article_count', 'published_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='published_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='published_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_articles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_article_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'updated_at'], name='article_cat_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2 on 2026-10-17 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_popular_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_cat_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_cat_popular_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_trending_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_cat_updated_idx',
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='article_pub_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['status', '-views', '-id'], name='article_pub_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['status', '-trending_score', '-id'], name='article_pub_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'status', '-created_at', '-id'], name='article_cat_pub_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'status', '-views', '-id'], name='article_cat_pub_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'status', 'updated_at'], name='article_cat_pub_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['status', '-created_at', '-id'], name='article_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('is_trending', True)), fields=['status', '-created_at', '-id'], name='article_flagged_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 03:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_article_published_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleevent',
+            name='logged_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-17 04:23
+
+from django.db import migrations, models
+from django.db.models import Avg, FloatField, Value
+from django.db.models.functions import Cast
+
+# core.search's ranking constants when this migration was written
+FIELD_BOOSTS = {'title': 3.0, 'category': 2.0, 'excerpt': 1.5, 'content': 1.0}
+K1 = 1.2
+B = 0.75
+
+
+def compute_impacts(apps, schema_editor):
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    SearchPosting = apps.get_model('core', 'SearchPosting')
+    averages = SearchDocument.objects.aggregate(**{field: Avg(f'{field}_length') for field in FIELD_BOOSTS})
+    for field, boost in FIELD_BOOSTS.items():
+        # One UPDATE per field: tf = boost * frequency / norm, saturated as in BM25
+        norm = Value(1 - B) + Value(B) * Cast('field_length', FloatField()) / Value(averages[field] or 1.0)
+        tf = Value(boost) * Cast('frequency', FloatField()) / norm
+        SearchPosting.objects.filter(field=field).update(impact=tf * Value(K1 + 1) / (tf + Value(K1)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_articleevent_logged_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchposting',
+            name='impact',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', '-impact'], name='posting_term_impact_idx'),
+        ),
+        migrations.RunPython(compute_impacts, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
-from django.utils.text import slugify
+from django.utils import timezone
+
+from .cards import CARD_FIELDS, ArticleCardIterable, resolve_image_srcset, resolve_image_url
 
 
 def category_image_path(instance, filename):
@@ -19,6 +21,12 @@ def profile_photo_path(instance, filename):
     return f'profiles/{instance.user.username}/{filename}'
 
 
+def user_initials(user):
+    """Letter shown in place of a user's photo"""
+    name = user.get_full_name() or user.username
+    return name[0].upper() if name else 'U'
+
+
 class Category(models.Model):
     """Category model for article classification"""
     name = models.CharField(max_length=100)
@@ -26,8 +34,14 @@ class Category(models.Model):
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to=category_image_path, blank=True, null=True, help_text="Upload category image")
     image_url = models.CharField(max_length=255, blank=True, help_text="Or enter image URL/path (e.g., images/articles/placeholder.svg)")
+    # Resized copies of the upload, written by core.renditions
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     order = models.IntegerField(default=0)
     
+    # Maintained by core.counts when articles are written
+    article_count = models.PositiveIntegerField(default=0, editable=False)
+    published_count = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['order', 'name']
@@ -36,27 +50,15 @@ class Category(models.Model):
         return self.name
     
     def get_absolute_url(self):
-        return reverse('category', args=[self.slug])
+        return reverse('core:category', args=[self.slug])
     
     def get_image_url(self):
         """Return the appropriate image URL"""
-        # Prioritize image_url over image field for imported articles
-        if self.image_url:
-            # If it's an external URL (http/https), use it directly
-            if self.image_url.startswith('http://') or self.image_url.startswith('https://'):
-                return self.image_url
-            # If it's already a full path, use it directly
-            if self.image_url.startswith('/'):
-                return self.image_url
-            # If it looks like a static path, prefix with /static/
-            elif self.image_url.startswith('images/'):
-                return f'/static/{self.image_url}'
-            # Otherwise assume it's in the articles folder
-            return f'/static/images/articles/{self.image_url}'
-        elif self.image and hasattr(self.image, 'url'):
-            # Only use ImageField if a file was actually uploaded
-            return self.image.url
-        return '/static/images/placeholder.svg'
+        return resolve_image_url(self.image_url, self.image, self.image_renditions)
+    
+    def get_image_srcset(self):
+        """WebP renditions of the upload for srcset, or '' if there are none"""
+        return resolve_image_srcset(self.image_url, self.image, self.image_renditions)
 
 
 class SubCategory(models.Model):
@@ -65,6 +67,10 @@ class SubCategory(models.Model):
     slug = models.SlugField(max_length=100)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='subcategories')
     
+    # Maintained by core.counts when articles are written
+    article_count = models.PositiveIntegerField(default=0, editable=False)
+    published_count = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         verbose_name_plural = "Sub Categories"
         unique_together = ['slug', 'category']
@@ -73,6 +79,31 @@ class SubCategory(models.Model):
         return f"{self.category.name} - {self.name}"
 
 
+class ArticleQuerySet(models.QuerySet):
+    """Visitor-facing filters, each backed by the indexes in Article.Meta"""
+
+    def published(self):
+        return self.filter(status='published')
+
+    def featured(self):
+        """Published editor's picks, newest first"""
+        return self.published().filter(is_featured=True).order_by('-created_at', '-id')
+
+    def trending(self):
+        """Published articles editors flagged as trending, newest first"""
+        return self.published().filter(is_trending=True).order_by('-created_at', '-id')
+
+    def in_category(self, category):
+        """Published articles in a category, given as an instance or id"""
+        return self.published().filter(category=category)
+
+    def cards(self):
+        """Only the columns list pages show, as ArticleCard objects, in one joined query"""
+        queryset = self.values_list(*CARD_FIELDS)
+        queryset._iterable_class = ArticleCardIterable
+        return queryset
+
+
 class Article(models.Model):
     """Article model for health content"""
     title = models.CharField(max_length=255)
@@ -81,14 +112,19 @@ class Article(models.Model):
     content = models.TextField()
     image = models.ImageField(upload_to=article_image_path, blank=True, null=True, help_text="Upload article image")
     image_url = models.CharField(max_length=255, blank=True, help_text="Or enter image URL/path (e.g., images/articles/placeholder.svg)")
+    # Resized copies of the upload, written by core.renditions
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='articles')
     subcategory = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='articles')
     
     # Metadata
     author = models.CharField(max_length=100, default="Healthline Team")
-    read_time = models.IntegerField(default=5, help_text="Read time in minutes")
+    tags = models.CharField(max_length=255, blank=True, help_text="Comma-separated tags")
+    read_time = models.IntegerField(default=5, help_text="Read time in minutes, computed from the word count")
     views = models.IntegerField(default=0)
     likes = models.IntegerField(default=0, help_text="Number of likes")
+    # Log of forward-decayed recent activity, maintained by core.trending
+    trending_score = models.FloatField(default=0, editable=False)
     
     # Flags
     is_featured = models.BooleanField(default=False)
@@ -101,38 +137,96 @@ class Article(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='published')
     
+    # Derived from content by core.content whenever the content changes
+    plain_text = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    toc = models.JSONField(default=list, blank=True, editable=False)
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    
+    # Hash of the feed row this article was last imported from
+    source_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # Set when the text changes, until core.related recomputes its neighbours
+    related_stale = models.BooleanField(default=True, db_index=True, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ArticleQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        # Every index starts with status, or with category then status,
+        # since ArticleQuerySet filters on it; none span all statuses
+        indexes = [
+            # Keyset pagination keys (core.pagination.ARTICLE_ORDERINGS) and
+            # the trending order. The admin's lists over every status read
+            # each status from these and merge them.
+            models.Index(fields=['status', '-created_at', '-id'], name='article_pub_recent_idx'),
+            models.Index(fields=['status', '-views', '-id'], name='article_pub_popular_idx'),
+            models.Index(fields=['status', '-trending_score', '-id'], name='article_pub_trending_idx'),
+            models.Index(fields=['category', 'status', '-created_at', '-id'], name='article_cat_pub_recent_idx'),
+            models.Index(fields=['category', 'status', '-views', '-id'], name='article_cat_pub_popular_idx'),
+            # Latest change in a category, for conditional GET
+            models.Index(fields=['category', 'status', 'updated_at'], name='article_cat_pub_updated_idx'),
+            # Partial indexes over the few flagged rows the home page picks
+            # from; backends without them (MySQL) use article_pub_recent_idx.
+            # Status is a column rather than part of the condition: queries
+            # pass it as a parameter, and SQLite only matches conditions
+            # against literals
+            models.Index(fields=['status', '-created_at', '-id'], name='article_featured_idx', condition=models.Q(is_featured=True)),
+            models.Index(fields=['status', '-created_at', '-id'], name='article_flagged_idx', condition=models.Q(is_trending=True)),
+        ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the row looked like so counters can apply the difference
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Signal handlers update counters in the same transaction as the write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields if field.attname in self.__dict__
+        }
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
     def get_absolute_url(self):
-        return reverse('article_detail', args=[self.slug])
+        return reverse('core:article_detail', args=[self.slug])
     
     def get_image_url(self):
         """Return the appropriate image URL"""
-        # Prioritize image_url over image field for imported articles
-        if self.image_url:
-            # If it's an external URL (http/https), use it directly
-            if self.image_url.startswith('http://') or self.image_url.startswith('https://'):
-                return self.image_url
-            # If it's already a full path, use it directly
-            if self.image_url.startswith('/'):
-                return self.image_url
-            # If it looks like a static path, prefix with /static/
-            elif self.image_url.startswith('images/'):
-                return f'/static/{self.image_url}'
-            # Otherwise assume it's in the articles folder
-            return f'/static/images/articles/{self.image_url}'
-        elif self.image and hasattr(self.image, 'url'):
-            # Only use ImageField if a file was actually uploaded
-            return self.image.url
-        return '/static/images/placeholder.svg'
+        return resolve_image_url(self.image_url, self.image, self.image_renditions)
+    
+    def get_image_srcset(self):
+        """WebP renditions of the upload for srcset, or '' if there are none"""
+        return resolve_image_srcset(self.image_url, self.image, self.image_renditions)
+
+
+class RelatedArticle(models.Model):
+    """Precomputed nearest neighbours of an article by content similarity (see core.related)"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='neighbours')
+    related = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='neighbour_of')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['article', 'rank']
+        unique_together = ['article', 'rank']
+    
+    def __str__(self):
+        return f"{self.article_id} -> {self.related_id} (#{self.rank})"
 
 
 class Newsletter(models.Model):
@@ -150,6 +244,8 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.CharField(max_length=255, blank=True, help_text="Avatar URL or initials")
     profile_photo = models.ImageField(upload_to=profile_photo_path, blank=True, null=True, help_text="Profile photo")
+    # Resized copies of the photo, written by core.renditions
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     saved_articles = models.ManyToManyField(Article, blank=True, related_name='saved_by')
     liked_articles = models.ManyToManyField(Article, blank=True, related_name='liked_by')
     
@@ -158,13 +254,12 @@ class UserProfile(models.Model):
     
     @property
     def initials(self):
-        name = self.user.get_full_name() or self.user.username
-        return name[0].upper() if name else 'U'
+        return user_initials(self.user)
     
     def get_avatar_url(self):
         """Return the appropriate avatar URL"""
         if self.profile_photo and hasattr(self.profile_photo, 'url'):
-            return self.profile_photo.url
+            return resolve_image_url('', self.profile_photo, self.photo_renditions)
         elif self.avatar:
             # If avatar is a URL
             if self.avatar.startswith('http://') or self.avatar.startswith('https://'):
@@ -175,3 +270,93 @@ class UserProfile(models.Model):
             # Otherwise assume it's initials or use default
             return None
         return None
+    
+    def get_avatar_srcset(self):
+        """WebP renditions of the profile photo for srcset, or '' if there are none"""
+        return resolve_image_srcset('', self.profile_photo, self.photo_renditions)
+
+
+class SearchDocument(models.Model):
+    """Per-article field lengths used for search ranking"""
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title_length = models.PositiveIntegerField(default=0)
+    excerpt_length = models.PositiveIntegerField(default=0)
+    content_length = models.PositiveIntegerField(default=0)
+    category_length = models.PositiveIntegerField(default=0)
+    indexed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Search document for article {self.article_id}"
+
+
+class SearchPosting(models.Model):
+    """Inverted index entry: occurrences of a term in one field of an article"""
+    FIELD_CHOICES = [
+        ('title', 'Title'),
+        ('excerpt', 'Excerpt'),
+        ('content', 'Content'),
+        ('category', 'Category'),
+    ]
+    term = models.CharField(max_length=64)
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='search_postings')
+    field = models.CharField(max_length=10, choices=FIELD_CHOICES)
+    frequency = models.PositiveIntegerField(default=1)
+    field_length = models.PositiveIntegerField(default=0)
+    # BM25F weight of this posting on its own when indexed; ranking reads
+    # each term's postings highest first (see core.search.term_postings)
+    impact = models.FloatField(default=0)
+    
+    class Meta:
+        unique_together = ['term', 'article', 'field']
+        indexes = [
+            models.Index(fields=['term', '-impact'], name='posting_term_impact_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.article_id} ({self.field})"
+
+
+class ArticleEvent(models.Model):
+    """Append-only log of reader interactions, rolled up daily by core.events"""
+    KIND_CHOICES = [
+        ('view', 'View'),
+        ('like', 'Like'),
+        ('unlike', 'Unlike'),
+        ('save', 'Save'),
+        ('unsave', 'Unsave'),
+    ]
+    id = models.BigAutoField(primary_key=True)
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(db_index=True)
+    # When the row was inserted, which trails created_at by the buffering
+    logged_at = models.DateTimeField(default=timezone.now, editable=False)
+    
+    def __str__(self):
+        return f"{self.kind} {self.article_id} at {self.created_at}"
+
+
+class ArticleDailyStat(models.Model):
+    """Per-article, per-day totals rolled up from ArticleEvent"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField(db_index=True)
+    views = models.PositiveIntegerField(default=0)
+    # Net of likes/unlikes and saves/unsaves made that day
+    likes = models.IntegerField(default=0)
+    saves = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['article', 'date']
+    
+    def __str__(self):
+        return f"{self.article_id} on {self.date}"
+
+
+class RollupCheckpoint(models.Model):
+    """Id of the last event a consumer of the event log has processed"""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
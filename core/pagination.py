@@ -0,0 +1,182 @@
+"""
+Keyset (cursor) pagination
+Pages are addressed by the sort key of the row they start after instead
+of an offset, so fetching page N is one indexed range scan of per_page
+rows no matter how deep N is, and no COUNT(*) is needed.
+Cursors are opaque URL-safe tokens.
+"""
+import base64
+import binascii
+import datetime
+import json
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import Article
+
+
+# Article list orderings, each backed by a composite index on Article
+ARTICLE_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'popular': ('-views', '-id'),
+}
+
+# The indexes lead with status, so lists over every status read each one
+# separately (KeysetPaginator's partition)
+ARTICLE_STATUSES = ('status', [value for value, label in Article.STATUS_CHOICES])
+
+
+def _json_value(value):
+    # Full isoformat: a cursor must keep microseconds to seek exactly
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f'Cannot use {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values, direction='next'):
+    """Pack sort key values into an opaque token"""
+    payload = json.dumps({'k': list(values), 'd': direction}, default=_json_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Unpack a token into (values, direction), or None if it is not valid"""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values, direction = payload['k'], payload['d']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+    if not isinstance(values, list) or direction not in ('next', 'previous'):
+        return None
+    return values, direction
+
+
+class KeysetPage:
+    """One page of a keyset paginated list"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """Paginate a queryset by a unique ordering such as ('-created_at', '-id')
+
+    The last field of the ordering must be unique so every row has a
+    distinct position. Back the ordering with a composite index.
+
+    partition is an optional (field, values) pair for an index that leads
+    with field, such as (status, -created_at, -id): each value is then
+    read with its own range scan and the pages merged.
+    """
+
+    def __init__(self, queryset, ordering, per_page, partition=None):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.partition = partition
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _parse(self, values):
+        """Convert decoded JSON values back to Python values of the sort fields"""
+        if len(values) != len(self.fields):
+            raise ValidationError('Cursor does not match the ordering')
+        opts = self.queryset.model._meta
+        parsed = []
+        for field, value in zip(self.fields, values):
+            # Encoded keys are strings and numbers; to_python() would let null through
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise ValidationError('Cursor value has the wrong type')
+            parsed.append(opts.get_field(field).to_python(value))
+        return parsed
+
+    def _seek(self, values, forward):
+        """Q matching the rows strictly after (or before) the given key"""
+        condition = Q()
+        for position in reversed(range(len(self.fields))):
+            field = self.fields[position]
+            descending = self.ordering[position].startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            seek = Q(**{f'{field}__{lookup}': values[position]})
+            if condition:
+                seek |= Q(**{field: values[position]}) & condition
+            condition = seek
+        return condition
+
+    def get_page(self, cursor=None):
+        """Return the page a cursor points at; invalid cursors give the first page"""
+        decoded = decode_cursor(cursor)
+        values, direction = None, 'next'
+        if decoded is not None:
+            try:
+                values, direction = self._parse(decoded[0]), decoded[1]
+            except (ValidationError, TypeError):
+                values, direction = None, 'next'
+
+        forward = direction == 'next'
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        if forward:
+            ordering = self.ordering
+        else:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering)
+        rows = self._fetch(queryset, ordering)
+
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+
+        # Walking backwards, "more" means there are earlier rows; the
+        # cursor we came from guarantees later ones, and vice versa
+        has_next = more if forward else True
+        has_previous = values is not None if forward else more
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(self._key(rows[-1]), 'next') if has_next else None,
+            previous_cursor=encode_cursor(self._key(rows[0]), 'previous') if has_previous else None,
+        )
+
+    def _fetch(self, queryset, ordering):
+        """The first per_page + 1 rows in the ordering"""
+        if self.partition is None:
+            return list(queryset.order_by(*ordering)[:self.per_page + 1])
+        field, values = self.partition
+        rows = []
+        for value in values:
+            rows += queryset.filter(**{field: value}).order_by(*ordering)[:self.per_page + 1]
+        # Stable sorts from the last field to the first give the full ordering
+        for name in reversed(ordering):
+            rows.sort(key=attrgetter(name.lstrip('-')), reverse=name.startswith('-'))
+        return rows[:self.per_page + 1]
@@ -0,0 +1,138 @@
+"""
+SQL query inspector for development and tests
+Records every query a request runs, groups them by shape (the SQL with
+literals stripped), flags repeated shapes as likely N+1 patterns along
+with the template line that triggered them, and checks per-view query
+budgets declared with the query_budget decorator.
+"""
+import re
+import sys
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from django.db import connections
+
+
+# A shape repeated this many times in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+# Transaction control: SQLite's BEGIN outside a test, savepoints inside one
+TRANSACTION_RE = re.compile(r'^(?:BEGIN|SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more queries than its view's budget (QUERY_BUDGET_STRICT)"""
+
+
+def query_budget(limit):
+    """Declare the maximum number of queries a view may run per request
+
+    Apply it as the outermost decorator so the budget stays visible on
+    the function the URLconf resolves to.
+    """
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    return getattr(view_func, 'query_budget', None)
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape by replacing literal values"""
+    shape = STRING_RE.sub('?', sql)
+    shape = NUMBER_RE.sub('?', shape)
+    shape = IN_LIST_RE.sub('IN (...)', shape)
+    return ' '.join(shape.split())
+
+
+def template_location():
+    """Return 'template:line' for the template node currently rendering, if any"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'{origin.template_name or origin.name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+class QueryGroup:
+    """All executions of one query shape"""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.count = 0
+        self.duration = 0.0
+        self.locations = OrderedDict()
+
+    def add(self, duration, location):
+        self.count += 1
+        self.duration += duration
+        if location:
+            self.locations[location] = self.locations.get(location, 0) + 1
+
+
+class QueryRecorder:
+    """Context manager recording the queries run on every database connection"""
+
+    def __init__(self, using=None):
+        self.using = using
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        aliases = [self.using] if self.using else list(connections)
+        for alias in aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        location = template_location()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'duration': time.perf_counter() - started,
+                'location': location,
+                'alias': context['connection'].alias,
+            })
+
+    def __len__(self):
+        """Number of statements, not counting transaction bookkeeping"""
+        return sum(1 for query in self.queries if not TRANSACTION_RE.match(query['sql']))
+
+    @property
+    def duration(self):
+        return sum(query['duration'] for query in self.queries)
+
+    def groups(self):
+        """Query groups by shape, most repeated first"""
+        groups = OrderedDict()
+        for query in self.queries:
+            if TRANSACTION_RE.match(query['sql']):
+                continue
+            shape = normalize_sql(query['sql'])
+            if shape not in groups:
+                groups[shape] = QueryGroup(shape)
+            groups[shape].add(query['duration'], query['location'])
+        return sorted(groups.values(), key=lambda group: -group.count)
+
+    def n_plus_one(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Shapes repeated often enough to look like a query per row"""
+        return [group for group in self.groups() if group.count >= threshold]
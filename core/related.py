@@ -0,0 +1,197 @@
+"""
+Related articles by content similarity
+Builds TF-IDF vectors from article title, tags, excerpt and plain text,
+finds each article's nearest neighbours by cosine similarity with
+batched sparse matrix products, and stores them in RelatedArticle so
+the article page reads them with one indexed lookup.
+
+Editing or (un)publishing an article marks it related_stale. update()
+then recomputes only the rows that can change: the stale articles, the
+articles that list them or that they now outscore, and any article
+short of a full set of neighbours.
+"""
+import math
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from .models import Article, RelatedArticle
+from .search import MAX_TERM_LENGTH, tokenize
+
+
+# Neighbours stored per article, one row of cards on the article page
+TOP_K = 4
+
+# Relative weight of a term occurrence in each field
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'tags': 3.0,
+    'excerpt': 1.5,
+    'plain_text': 1.0,
+}
+
+# Article text fields, content as derived by core.content
+TEXT_FIELDS = tuple(FIELD_WEIGHTS)
+
+# Fields whose change makes an article's neighbours stale
+WATCHED_FIELDS = ('title', 'tags', 'excerpt', 'content', 'status')
+
+# Rows of the similarity matrix computed at once
+BATCH_SIZE = 256
+
+
+def article_terms(fields):
+    """Weighted term frequencies of one article's text"""
+    terms = Counter()
+    for field, text in fields.items():
+        for term in tokenize(text):
+            terms[term[:MAX_TERM_LENGTH]] += FIELD_WEIGHTS[field]
+    return terms
+
+
+class TfidfIndex:
+    """L2-normalized TF-IDF vectors of every published article, one row each"""
+
+    def __init__(self, queryset=None):
+        if queryset is None:
+            queryset = Article.objects.published()
+        vocabulary = {}
+        rows, columns, values = [], [], []
+        self.ids = []
+        for row in queryset.order_by('pk').values_list('pk', *TEXT_FIELDS).iterator(chunk_size=500):
+            terms = article_terms(dict(zip(TEXT_FIELDS, row[1:])))
+            for term, weight in terms.items():
+                rows.append(len(self.ids))
+                columns.append(vocabulary.setdefault(term, len(vocabulary)))
+                # Sublinear tf, so long articles don't swamp the vector
+                values.append(1 + math.log(weight))
+            self.ids.append(row[0])
+        self.row_of = {pk: index for index, pk in enumerate(self.ids)}
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, columns)),
+            shape=(len(self.ids), len(vocabulary)),
+        )
+        documents = np.bincount(matrix.indices, minlength=len(vocabulary))
+        idf = np.log((1 + len(self.ids)) / (1 + documents)).astype(np.float32) + 1
+        matrix = matrix @ sparse.diags(idf)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        self.matrix = sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def similarities(self, indexes):
+        """Dense cosine similarities of the given rows to every article"""
+        scores = (self.matrix[indexes] @ self.matrix.T).toarray()
+        # An article is not its own neighbour
+        scores[np.arange(len(indexes)), indexes] = -1
+        return scores
+
+    def neighbours(self, article_ids, k=TOP_K, batch_size=BATCH_SIZE):
+        """Yield (article_id, [(related_id, score)]) best first, for indexed ids"""
+        indexes = [self.row_of[pk] for pk in article_ids if pk in self.row_of]
+        k = min(k, len(self) - 1)
+        if k < 1:
+            for index in indexes:
+                yield self.ids[index], []
+            return
+        ids = np.asarray(self.ids)
+        for start in range(0, len(indexes), batch_size):
+            batch = indexes[start:start + batch_size]
+            scores = self.similarities(batch)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for index, columns, row in zip(batch, top, scores):
+                # Best score first, lower id breaking ties
+                columns = columns[np.lexsort((ids[columns], -row[columns]))]
+                yield self.ids[index], [
+                    (int(ids[column]), float(row[column]))
+                    for column in columns if row[column] > 0
+                ]
+
+
+def store(results):
+    """Replace the neighbour rows of each article in results"""
+    results = dict(results)
+    with transaction.atomic():
+        RelatedArticle.objects.filter(article_id__in=results).delete()
+        RelatedArticle.objects.bulk_create([
+            RelatedArticle(article_id=article_id, related_id=related_id, rank=rank, score=score)
+            for article_id, neighbours in results.items()
+            for rank, (related_id, score) in enumerate(neighbours)
+        ], batch_size=1000)
+    return len(results)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Recompute the neighbours of every article, returning how many were stored"""
+    index = TfidfIndex()
+    stored = 0
+    with transaction.atomic():
+        RelatedArticle.objects.exclude(article__status='published').delete()
+        for start in range(0, len(index), batch_size):
+            batch = index.ids[start:start + batch_size]
+            stored += store(index.neighbours(batch, batch_size=batch_size))
+        Article.objects.filter(related_stale=True).update(related_stale=False)
+    return stored
+
+
+def stored_floors():
+    """{article_id: (weakest stored score, number of neighbours)}"""
+    return {
+        article_id: (floor, count)
+        for article_id, floor, count in RelatedArticle.objects.values('article_id')
+        .annotate(floor=Min('score'), count=Count('id')).values_list('article_id', 'floor', 'count')
+    }
+
+
+def affected_by(index, changed, k=TOP_K, batch_size=BATCH_SIZE):
+    """Ids of articles whose neighbours may differ after the changed articles moved
+
+    Those listing a changed article, those a changed article now scores
+    above their weakest neighbour, and those short of k neighbours, which
+    includes any that lost one to a deleted article.
+    """
+    k = min(k, len(index) - 1)
+    stored = stored_floors()
+    affected = set(RelatedArticle.objects.filter(related_id__in=changed).values_list('article_id', flat=True))
+    floors = np.zeros(len(index), dtype=np.float32)
+    for row, pk in enumerate(index.ids):
+        floor, count = stored.get(pk, (0, 0))
+        if count < k:
+            affected.add(pk)
+        else:
+            floors[row] = floor
+    indexes = [index.row_of[pk] for pk in changed if pk in index.row_of]
+    for start in range(0, len(indexes), batch_size):
+        scores = index.similarities(indexes[start:start + batch_size])
+        outscored = (scores > floors).any(axis=0)
+        affected.update(index.ids[row] for row in np.flatnonzero(outscored))
+    return affected
+
+
+def update(batch_size=BATCH_SIZE):
+    """Recompute the rows affected by stale articles, returning how many were stored"""
+    changed = list(Article.objects.filter(related_stale=True).values_list('pk', flat=True))
+    index = TfidfIndex()
+    affected = affected_by(index, changed, batch_size=batch_size) | set(changed)
+    stored = 0
+    with transaction.atomic():
+        # Drafts keep no neighbours of their own
+        RelatedArticle.objects.exclude(article__status='published').delete()
+        ordered = sorted(pk for pk in affected if pk in index.row_of)
+        for start in range(0, len(ordered), batch_size):
+            stored += store(index.neighbours(ordered[start:start + batch_size], batch_size=batch_size))
+        Article.objects.filter(pk__in=changed).update(related_stale=False)
+    return stored
+
+
+def related_articles(article, limit=TOP_K):
+    """Card queryset of an article's stored neighbours, best first"""
+    return Article.objects.published().filter(
+        neighbour_of__article=article
+    ).order_by('neighbour_of__rank').cards()[:limit]
@@ -0,0 +1,197 @@
+"""
+Resized copies of uploaded images
+Article and category images and profile photos are stored as uploaded,
+often several megabytes from a phone. Once an upload is committed, a
+background thread writes WebP and JPEG copies at the configured widths
+next to the original and records them on the row. Pages then serve the
+largest JPEG copy as src and the WebP copies as srcset, so browsers
+pick the smallest image that fills the slot.
+
+Renditions are recorded as {'name': upload, 'widths': [...]}; when the
+upload changes, the record no longer matches it and the original is
+served until the new copies are ready. generate_image_renditions
+backfills uploads made before this existed or while it was failing.
+"""
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .auth import invalidate_snapshot
+from .cards import rendition_name
+from .fragments import bump_home_version
+from .models import Article, Category, UserProfile
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Widths of the copies; uploads are never scaled up
+    'WIDTHS': {
+        'article': [320, 640, 960, 1280],
+        'category': [320, 640, 960],
+        'avatar': [64, 128, 256],
+    },
+    'QUALITY': {'webp': 80, 'jpeg': 82},
+    # Process uploads in a thread after the response; off runs them inline
+    'BACKGROUND': True,
+}
+
+# kind: (model, image field, renditions field)
+TARGETS = {
+    'article': (Article, 'image', 'image_renditions'),
+    'category': (Category, 'image', 'image_renditions'),
+    'avatar': (UserProfile, 'profile_photo', 'photo_renditions'),
+}
+
+# File extensions of the copies made at each width
+FORMATS = ('webp', 'jpg')
+
+_executor = None
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'IMAGE_RENDITIONS', {})}
+    config['WIDTHS'] = {**DEFAULTS['WIDTHS'], **config['WIDTHS']}
+    return config
+
+
+def target_widths(widths, width):
+    """Configured widths below the original's, plus its own if within range"""
+    chosen = {target for target in widths if target < width}
+    if width <= max(widths):
+        chosen.add(width)
+    return sorted(chosen)
+
+
+def render(image, width, extension, config):
+    """Bytes of image scaled to width in the given format"""
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+    buffer = io.BytesIO()
+    if extension == 'jpg':
+        if resized.mode == 'RGBA':
+            # JPEG has no alpha; flatten onto white like browsers show it
+            flat = Image.new('RGB', resized.size, (255, 255, 255))
+            flat.paste(resized, mask=resized.getchannel('A'))
+            resized = flat
+        resized.save(buffer, 'JPEG', quality=config['QUALITY']['jpeg'], optimize=True, progressive=True)
+    else:
+        resized.save(buffer, 'WEBP', quality=config['QUALITY']['webp'], method=4)
+    return buffer.getvalue()
+
+
+def generate(fieldfile, widths, config=None):
+    """Write the copies of an upload, returning the widths written"""
+    config = config or get_config()
+    storage, name = fieldfile.storage, fieldfile.name
+    with storage.open(name, 'rb') as fp:
+        image = Image.open(fp)
+        # Decode big JPEGs at a reduced scale that still covers the widest copy either way up
+        image.draft('RGB', (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    written = target_widths(widths, image.width)
+    for width in written:
+        for extension in FORMATS:
+            path = rendition_name(name, width, extension)
+            storage.delete(path)
+            storage.save(path, ContentFile(render(image, width, extension, config)))
+    return written
+
+
+def remove(storage, renditions):
+    for width in renditions.get('widths', []):
+        for extension in FORMATS:
+            storage.delete(rendition_name(renditions['name'], width, extension))
+
+
+def process(kind, pk, force=False, config=None):
+    """Bring one row's renditions up to date with its upload, returning True if it had to"""
+    model, image_field, renditions_field = TARGETS[kind]
+    instance = model.objects.filter(pk=pk).only('pk', image_field, renditions_field).first()
+    if instance is None:
+        return False
+    fieldfile = getattr(instance, image_field)
+    previous = getattr(instance, renditions_field) or {}
+    if not force and previous.get('name', '') == (fieldfile.name or ''):
+        return False
+    config = config or get_config()
+    renditions = {}
+    if fieldfile:
+        try:
+            renditions = {'name': fieldfile.name, 'widths': generate(fieldfile, config['WIDTHS'][kind], config)}
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Unreadable uploads keep being served as they are
+            logger.warning('Could not make renditions of %s', fieldfile.name, exc_info=True)
+            renditions = {'name': fieldfile.name, 'widths': []}
+
+    changes = {renditions_field: renditions}
+    if model is Article:
+        # Pages validated against updated_at pick up the new srcset
+        changes['updated_at'] = timezone.now()
+    # Unless another upload replaced this one meanwhile
+    if fieldfile:
+        unchanged = Q(**{image_field: fieldfile.name})
+    else:
+        unchanged = Q(**{image_field: ''}) | Q(**{f'{image_field}__isnull': True})
+    updated = model.objects.filter(unchanged, pk=pk).update(**changes)
+    if previous.get('widths') and previous.get('name') != renditions.get('name'):
+        remove(fieldfile.storage, previous)
+    if updated and kind == 'avatar':
+        # The header shows the photo, and update() sends no signal
+        invalidate_snapshot(instance.user_id)
+    elif updated:
+        bump_home_version()
+    return bool(updated)
+
+
+def run(kind, pk):
+    """Background entry point: process one row on this thread's own connection"""
+    try:
+        process(kind, pk)
+    except Exception:
+        logger.exception('Image renditions failed for %s %s', kind, pk)
+    finally:
+        connections.close_all()
+
+
+def schedule(kind, pk):
+    """Process a row once the transaction that saved its upload commits"""
+    def submit():
+        global _executor
+        if not get_config()['BACKGROUND']:
+            process(kind, pk)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='renditions')
+        _executor.submit(run, kind, pk)
+    transaction.on_commit(submit)
+
+
+def pending(kind, force=False):
+    """Ids of rows whose upload has no current renditions"""
+    model, image_field, renditions_field = TARGETS[kind]
+    rows = (
+        model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+        .order_by('pk').values_list('pk', image_field, renditions_field)
+    )
+    for pk, name, renditions in rows.iterator(chunk_size=2000):
+        if force or (renditions or {}).get('name') != name:
+            yield pk
+
+
+def backfill(kinds=None, force=False):
+    """Process every upload missing renditions, returning {kind: processed}"""
+    config = get_config()
+    processed = {}
+    for kind in kinds or TARGETS:
+        processed[kind] = sum(process(kind, pk, force, config) for pk in list(pending(kind, force)))
+    return processed
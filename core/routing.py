@@ -0,0 +1,149 @@
+"""
+Read-replica routing
+Views marked with replica_read send their reads to the REPLICA_DATABASE
+alias; everything else, every write and the whole admin panel use the
+primary. Replicas lag, so a client that just wrote is pinned to the
+primary for REPLICA_LAG seconds by a cookie: a form POST followed by its
+redirect, or a toggle followed by a reload, reads its own writes. A view
+that writes while serving a GET reads from the primary from then on.
+
+Without REPLICA_DATABASE set, every query goes to the primary.
+"""
+import math
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+STICKY_COOKIE = 'db_primary_until'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """How the current request may read"""
+    __slots__ = ('pinned', 'replica', 'wrote')
+
+    def __init__(self, pinned):
+        # Recent write by this client, or a method that writes
+        self.pinned = pinned
+        # Inside a replica_read view
+        self.replica = False
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+def same_database(alias, other):
+    first, second = connections[alias].settings_dict, connections[other].settings_dict
+    return all(first.get(key) == second.get(key) for key in ('ENGINE', 'HOST', 'PORT', 'NAME'))
+
+
+def replica_alias():
+    """The replica to read from, or None to read the primary"""
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    # A test mirror points at the primary's own database; reading through
+    # the primary's connection lets tests see their uncommitted rows
+    if alias and same_database(alias, DEFAULT_DB_ALIAS):
+        return None
+    return alias
+
+
+def replica_lag():
+    return getattr(settings, 'REPLICA_LAG', 5)
+
+
+class ReplicaRouter:
+    """Routes reads of replica_read views to the replica"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        alias = replica_alias()
+        if alias and state is not None and state.replica and not state.pinned and not state.wrote:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows read from the replica are the primary's rows
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def replica_read(view_func):
+    """Let a view's GET requests read from the replica"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or request.method not in SAFE_METHODS:
+            return view_func(request, *args, **kwargs)
+        state.replica = True
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            state.replica = False
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """Tracks writes per request and pins recent writers to the primary"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_alias():
+            return self.get_response(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        if not replica_alias():
+            return await self.get_response(request)
+        state = self.start(request)
+        # Worker threads running the request's queries see a copy of this context
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return RoutingState(pinned=pinned_until > time.time() or request.method not in SAFE_METHODS)
+
+    def finish(self, request, response, state):
+        if state.wrote or request.method not in SAFE_METHODS:
+            lag = replica_lag()
+            response.set_cookie(
+                STICKY_COOKIE, str(math.ceil(time.time() + lag)), max_age=math.ceil(lag), httponly=True, samesite='Lax',
+            )
+        return response
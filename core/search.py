@@ -0,0 +1,324 @@
+"""
+Full-text search engine
+Inverted index over the title, excerpt, content and category of
+published articles with BM25F ranking. Works on any database backend
+supported by the ORM. Drafts are kept out, so result totals and pages
+only count what the site can show.
+
+A query's ranking is cached under the index version, which every index
+write bumps, so paging through results ranks the query once. Each term
+reads at most MAX_POSTINGS_PER_TERM postings, highest impact first, so
+a term found in every article costs no more than a rare one.
+"""
+import bisect
+import hashlib
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.utils.html import strip_tags
+
+from .models import Article, SearchDocument, SearchPosting
+from .pagination import decode_cursor, encode_cursor
+
+
+# Relative weight of a term occurrence in each field
+FIELD_BOOSTS = {
+    'title': 3.0,
+    'category': 2.0,
+    'excerpt': 1.5,
+    'content': 1.0,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+STATS_CACHE_KEY = 'search:stats'
+STATS_CACHE_TIMEOUT = 300
+IMPACT_LENGTHS_KEY = 'search:impact-lengths'
+
+# Postings read per query term; articles a common term matches beyond
+# these, which it weighs least, are left out of its results
+MAX_POSTINGS_PER_TERM = 1000
+
+INDEX_VERSION_KEY = 'search:version'
+# Without a shared cache other processes' writes don't bump this one's
+# version, so rankings are kept briefly
+RANKING_CACHE_TIMEOUT = 60
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by can do for from has have how if in into is it
+its of on or so than that the their them then there these they this to was
+we were what when which who will with you your
+""".split())
+
+
+def tokenize(text):
+    """Split text into lowercase index terms"""
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def article_fields(article):
+    """Return the searchable text of an article keyed by field"""
+    return {
+        'title': article.title,
+        'excerpt': article.excerpt,
+        'content': article.plain_text or strip_tags(article.content),
+        'category': article.category.name if article.category_id else '',
+    }
+
+
+def saturate(tf):
+    return tf * (K1 + 1) / (tf + K1)
+
+
+def posting_impact(field, frequency, field_length, avg_lengths):
+    """BM25F weight of one posting on its own, before idf"""
+    norm = 1 - B + B * field_length / avg_lengths[field]
+    return saturate(FIELD_BOOSTS[field] * frequency / norm)
+
+
+def build_postings(article):
+    """Build unsaved postings and field lengths for an article"""
+    avg_lengths = impact_lengths()
+    postings = []
+    lengths = {}
+    for field, text in article_fields(article).items():
+        terms = [term[:MAX_TERM_LENGTH] for term in tokenize(text)]
+        lengths[field] = len(terms)
+        for term, frequency in Counter(terms).items():
+            postings.append(SearchPosting(
+                term=term,
+                article_id=article.pk,
+                field=field,
+                frequency=frequency,
+                field_length=len(terms),
+                impact=posting_impact(field, frequency, len(terms), avg_lengths),
+            ))
+    return postings, lengths
+
+
+def index_article(article):
+    """Replace the index entries of a single article, returning whether it is indexed
+
+    Unpublished articles are dropped from the index instead.
+    """
+    if article.status != 'published':
+        remove_article(article.pk)
+        return False
+    postings, lengths = build_postings(article)
+    with transaction.atomic():
+        SearchPosting.objects.filter(article_id=article.pk).delete()
+        SearchPosting.objects.bulk_create(postings, batch_size=500)
+        SearchDocument.objects.update_or_create(
+            article_id=article.pk,
+            defaults={f'{field}_length': length for field, length in lengths.items()},
+        )
+    index_changed()
+    return True
+
+
+def remove_article(article_id):
+    """Drop an article from the index"""
+    SearchPosting.objects.filter(article_id=article_id).delete()
+    SearchDocument.objects.filter(article_id=article_id).delete()
+    index_changed()
+
+
+def reindex_category(category):
+    """Refresh the category field of every article in a category
+
+    All of them share the same category name, so this is a fixed number
+    of statements no matter how many articles the category holds.
+    """
+    terms = Counter(term[:MAX_TERM_LENGTH] for term in tokenize(category.name))
+    length = sum(terms.values())
+    avg_lengths = impact_lengths()
+    article_ids = list(SearchDocument.objects.filter(article__category=category).values_list('article_id', flat=True))
+    with transaction.atomic():
+        SearchPosting.objects.filter(field='category', article__category=category).delete()
+        SearchPosting.objects.bulk_create([
+            SearchPosting(
+                term=term, article_id=article_id, field='category', frequency=frequency, field_length=length,
+                impact=posting_impact('category', frequency, length, avg_lengths),
+            )
+            for article_id in article_ids
+            for term, frequency in terms.items()
+        ], batch_size=500)
+        SearchDocument.objects.filter(article__category=category).update(category_length=length)
+    index_changed()
+
+
+def rebuild_index(queryset=None, batch_size=200):
+    """Re-index every article in the queryset, returning the number of published ones indexed"""
+    if queryset is None:
+        queryset = Article.objects.all()
+    queryset = queryset.select_related('category').order_by('pk')
+    indexed = 0
+    for article in queryset.iterator(chunk_size=batch_size):
+        indexed += index_article(article)
+    return indexed
+
+
+def index_version():
+    """Current version of the index, which cached rankings are keyed on"""
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        # Start from the clock so an evicted key never reuses an old version
+        cache.add(INDEX_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def index_changed():
+    """Drop the cached statistics and rankings after writing to the index"""
+    cache.delete(STATS_CACHE_KEY)
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        index_version()
+
+
+def index_stats():
+    """Return document count and average field lengths, cached briefly"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        aggregates = SearchDocument.objects.aggregate(
+            documents=Count('pk'),
+            **{field: Avg(f'{field}_length') for field in FIELD_BOOSTS},
+        )
+        stats = {
+            'documents': aggregates.pop('documents'),
+            'avg_lengths': {field: value or 1.0 for field, value in aggregates.items()},
+        }
+        cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def impact_lengths():
+    """Average field lengths that new postings' impacts are worked out with
+
+    Impacts only order each term's postings, so unlike index_stats() these
+    aren't dropped on every index write.
+    """
+    lengths = cache.get(IMPACT_LENGTHS_KEY)
+    if lengths is None:
+        lengths = index_stats()['avg_lengths']
+        cache.set(IMPACT_LENGTHS_KEY, lengths, STATS_CACHE_TIMEOUT)
+    return lengths
+
+
+def rank_key(item):
+    """Sort key of a ranked (article_id, score) pair: best score first, then id"""
+    article_id, score = item
+    return (-score, article_id)
+
+
+class SearchResults:
+    """A page of ranked search results
+
+    Pages are addressed by a cursor holding the (score, id) of the last
+    result shown, so a deep page is found by bisecting the ranking.
+    """
+
+    def __init__(self, query, ranked, per_page, cursor=None):
+        self.query = query
+        self.total = len(ranked)
+        self.per_page = per_page
+        start = 0
+        decoded = decode_cursor(cursor)
+        if decoded is not None and decoded[1] == 'next' and len(decoded[0]) == 2:
+            score, article_id = decoded[0]
+            if isinstance(score, (int, float)) and isinstance(article_id, int):
+                start = bisect.bisect_right(ranked, (-score, article_id), key=rank_key)
+        self.ranked = ranked[start:start + per_page]
+        self.has_next = start + per_page < self.total
+        self._articles = None
+
+    @property
+    def article_ids(self):
+        return [article_id for article_id, score in self.ranked]
+
+    @property
+    def articles(self):
+        """Articles on this page in rank order"""
+        if self._articles is None:
+            by_id = {card.id: card for card in Article.objects.published().filter(pk__in=self.article_ids).cards()}
+            self._articles = [by_id[pk] for pk in self.article_ids if pk in by_id]
+        return self._articles
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        article_id, score = self.ranked[-1]
+        return encode_cursor([score, article_id])
+
+
+def term_postings(term):
+    """(postings, number of articles containing the term), highest impact first
+
+    One indexed read of at most MAX_POSTINGS_PER_TERM rows; only a term
+    with more postings than that needs a second query to count its articles.
+    """
+    postings = list(
+        SearchPosting.objects.filter(term=term).order_by('-impact')
+        .values_list('article_id', 'field', 'frequency', 'field_length')[:MAX_POSTINGS_PER_TERM + 1]
+    )
+    if len(postings) <= MAX_POSTINGS_PER_TERM:
+        return postings, len({posting[0] for posting in postings})
+    matched = SearchPosting.objects.filter(term=term).values('article_id').distinct().count()
+    return postings[:MAX_POSTINGS_PER_TERM], matched
+
+
+def rank(terms):
+    """Score the articles matching any of the terms, best first"""
+    if not terms:
+        return []
+    stats = index_stats()
+    documents = stats['documents']
+    avg_lengths = stats['avg_lengths']
+
+    scores = defaultdict(float)
+    for term in terms:
+        postings, df = term_postings(term)
+        idf = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+        # Accumulate the BM25F pseudo-frequency per article
+        weighted = defaultdict(float)
+        for article_id, field, frequency, field_length in postings:
+            norm = 1 - B + B * field_length / avg_lengths[field]
+            weighted[article_id] += FIELD_BOOSTS[field] * frequency / norm
+        for article_id, tf in weighted.items():
+            scores[article_id] += idf * saturate(tf)
+
+    return sorted(scores.items(), key=rank_key)
+
+
+def cached_rank(terms):
+    """rank(terms), shared by every page of the search until the index changes"""
+    if not terms:
+        return []
+    digest = hashlib.sha1(' '.join(terms).encode()).hexdigest()
+    key = f'search:ranked:{index_version()}:{digest}'
+    ranked = cache.get(key)
+    if ranked is None:
+        ranked = rank(terms)
+        cache.set(key, ranked, RANKING_CACHE_TIMEOUT)
+    return ranked
+
+
+def search(query, cursor=None, per_page=10):
+    """Run a ranked search and return the page of results after the cursor"""
+    terms = sorted(set(term[:MAX_TERM_LENGTH] for term in tokenize(query)))
+    return SearchResults(query, cached_rank(terms), per_page, cursor)
@@ -0,0 +1,129 @@
+"""
+Signal handlers keeping derived data in sync with article writes
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import auth, autocomplete, content, counts, related, renditions, search
+from .fragments import bump_home_version
+from .models import Article, Category, UserProfile
+
+
+@receiver(post_save, sender=Article)
+def index_saved_article(sender, instance, raw=False, **kwargs):
+    """Re-index an article whenever it is saved, or drop it once unpublished"""
+    if raw:
+        return
+    search.index_article(instance)
+
+
+@receiver(post_delete, sender=Article)
+def unindex_deleted_article(sender, instance, **kwargs):
+    """Drop a deleted article from the search index"""
+    search.remove_article(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_name(sender, instance, created=False, raw=False, **kwargs):
+    """Category names are indexed with each article, so refresh them on rename"""
+    if raw or created:
+        return
+    search.reindex_category(instance)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_home_fragments(sender, raw=False, **kwargs):
+    """Home page sections are rendered from articles and categories"""
+    if raw:
+        return
+    bump_home_version()
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_autocomplete(sender, raw=False, **kwargs):
+    """Processes fold changed titles, tags and names into their suggestions"""
+    if raw:
+        return
+    autocomplete.bump_version()
+
+
+@receiver(pre_save, sender=Article)
+def derive_content(sender, instance, raw=False, **kwargs):
+    """Refresh plain text, read time, outline and rendered HTML when the content changed"""
+    if raw or 'content' not in instance.__dict__:
+        return
+    content.process(instance)
+
+
+@receiver(pre_save, sender=Article)
+def remember_counted_state(sender, instance, raw=False, **kwargs):
+    """Capture the category/status the article is currently counted under"""
+    if raw:
+        return
+    instance._counted_state = counts.loaded_state(instance)
+
+
+@receiver(post_save, sender=Article)
+def update_category_counts(sender, instance, raw=False, **kwargs):
+    """Adjust category counters for a created, moved or re-published article"""
+    if raw:
+        return
+    old = getattr(instance, '_counted_state', None)
+    new = counts.counted_state(instance)
+    if old != new:
+        counts.apply_change(old, new)
+
+
+@receiver(post_delete, sender=Article)
+def decrement_category_counts(sender, instance, **kwargs):
+    """Remove a deleted article from its category counters"""
+    counts.apply_change(counts.counted_state(instance), None)
+
+
+@receiver(pre_save, sender=Article)
+def mark_related_stale(sender, instance, raw=False, **kwargs):
+    """Queue the article for core.related when its text or status changes"""
+    if raw or instance.related_stale:
+        return
+    # New articles start out stale; compare only fields loaded from the row
+    loaded = getattr(instance, '_loaded_values', {})
+    if any(loaded[field] != instance.__dict__.get(field, loaded[field]) for field in related.WATCHED_FIELDS if field in loaded):
+        instance.related_stale = True
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=UserProfile)
+def queue_image_renditions(sender, instance, raw=False, **kwargs):
+    """Resize a new or replaced upload once it is committed"""
+    if raw:
+        return
+    for kind, (model, image_field, renditions_field) in renditions.TARGETS.items():
+        if model is sender:
+            break
+    if image_field not in instance.__dict__ or renditions_field not in instance.__dict__:
+        return
+    upload = getattr(instance, image_field).name or ''
+    if upload != (getattr(instance, renditions_field) or {}).get('name', ''):
+        renditions.schedule(kind, instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Staff changes, profile edits, password changes and logins all save the user"""
+    auth.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_header_snapshot(sender, instance, **kwargs):
+    """The header shows the profile photo"""
+    auth.invalidate_snapshot(instance.user_id)
@@ -0,0 +1,404 @@
+"""
+Synthetic data for capacity testing
+Generates articles with HTML bodies, users with profiles, their liked
+and saved articles, and newsletter subscribers in volumes the seed feed
+never reaches, with bulk inserts.
+
+Every row is drawn from its own random generator, seeded with the seed,
+its kind and its number, so a row comes out the same whatever the batch
+size, the number of processes or the order chunks are written in. Rows
+are written in chunks, each in one transaction, leaving out those whose
+slug, username or email is already taken, and the likes and saves of
+users who have some; an interrupted run picks up where it stopped and a
+rerun with larger volumes only adds the difference.
+Chunks of one kind are independent and can be spread over processes;
+the kinds are generated in PHASES order, since likes and saves pick
+from the articles and profiles already written.
+
+Bulk inserts bypass model signals. Articles are written with their
+derived content and search postings, and finish() brings the category
+counters and like counts up to date and invalidates cached pages.
+"""
+import random
+from array import array
+from bisect import bisect
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import autocomplete, content, counts, search
+from .fragments import bump_home_version
+from .importer import Taxonomy
+from .interactions import LikedArticle, SavedArticle, reconcile_likes
+from .models import Article, Category, Newsletter, SearchDocument, SearchPosting, UserProfile
+
+
+PHASES = ('articles', 'users', 'interactions', 'subscribers')
+
+# Categories and their subcategories, most written about first
+TAXONOMY = {
+    'nutrition': ['diets', 'foods', 'supplements', 'beverages', 'macronutrients'],
+    'wellness': ['sleep', 'self-care', 'hydration', 'recovery', 'lifestyle'],
+    'fitness': ['workouts', 'strength', 'running', 'yoga', 'recovery', 'equipment'],
+    'mental-health': ['anxiety', 'depression', 'mindfulness', 'resilience', 'self-esteem', 'positive-psychology'],
+    'conditions': ['diabetes', 'heart', 'arthritis', 'headaches', 'thyroid', 'autoimmune'],
+    'lifestyle': ['relationships', 'productivity', 'finance', 'travel', 'minimalism', 'sustainability'],
+}
+
+# Zipf exponents: the n-th category gets 1/n**s of the first one's articles,
+# and the n-th most popular article 1/n**s of the first one's likes
+CATEGORY_SKEW = 1.1
+POPULARITY_SKEW = 1.2
+
+# Share of articles filed under a category only
+NO_SUBCATEGORY_RATE = 0.1
+DRAFT_RATE = 0.05
+FEATURED_RATE = 0.005
+UNSUBSCRIBED_RATE = 0.08
+
+# Rows are dated over this many days before the run, more of them recent
+HISTORY_DAYS = 3 * 365
+
+USERNAME_PREFIX = 'synthetic-'
+SUBSCRIBER_DOMAINS = ['example.com', 'example.org', 'example.net']
+# Generated users can sign in with this
+PASSWORD = 'synthetic-password'
+
+FIRST_NAMES = """
+Aiden Amara Ana Ben Carla Chen Daniel Elena Emma Farah Grace Hannah Ivan
+Jade James Kai Laura Leo Lucia Maya Mei Nadia Noah Olivia Omar Priya Rosa
+Sam Sofia Tariq Uma Victor Wei Yara Zoe
+""".split()
+
+LAST_NAMES = """
+Adams Ahmed Brown Chen Clark Davis Diaz Evans Garcia Green Hall Ito Jones
+Khan Kim Lee Lopez Martin Miller Nguyen Novak Okafor Park Patel Roberts
+Santos Shah Silva Smith Taylor Turner Walker White Wilson Wong Young
+""".split()
+
+AUTHORS = [
+    'Healthline Team', 'Dr. Sarah Johnson', 'Dr. Robert Kim', 'Emily Roberts', 'Michael Chen',
+    'Dr. Laura Martinez', 'Priya Sharma', 'Dr. James Wilson', 'Nicole Taylor', 'Dr. Maria Santos',
+]
+
+IMAGES = [
+    f'https://images.unsplash.com/photo-{photo}?w=800&h=600&fit=crop'
+    for photo in (
+        '1490645935967-10de6ba17061', '1498837167922-ddd27525d352', '1506126613408-eca07ce68773',
+        '1517842645767-c639042777db', '1541781774459-bb2af2f05b55', '1544367567-0f2fcb009e0b',
+        '1546069900-b7ee55c8c6ca', '1559757148-5c350d0d3c56', '1571019613454-1cb2f99b2d8b',
+        '1576941089067-2de3c901e126',
+    )
+]
+
+TITLES = [
+    '{count} Ways {topic} Can Improve Your {benefit}',
+    'What to Know About {topic}',
+    'The Science Behind {topic}',
+    'Is {topic} Good for Your {benefit}?',
+    'A Beginner\'s Guide to {topic}',
+    '{count} Myths About {topic}, Debunked',
+    'How {topic} Affects Your {benefit}',
+    '{count} Expert Tips for Better {topic}',
+]
+
+BENEFITS = ['Health', 'Energy', 'Sleep', 'Mood', 'Heart', 'Focus', 'Immunity', 'Longevity', 'Digestion', 'Wellbeing']
+
+HEADINGS = [
+    'What the research says', 'Potential benefits', 'Possible risks', 'How to get started', 'Who should avoid it',
+    'Common mistakes', 'When to see a doctor', 'The bottom line', 'Practical tips', 'How it works',
+]
+
+WORDS = """
+health body research studies suggest may help support reduce risk improve daily habits sleep stress energy
+balance nutrients protein fiber vitamins minerals water exercise muscles heart blood pressure levels brain
+mood focus inflammation immune system gut bacteria digestion metabolism weight calories diet foods meals
+vegetables fruits grains fats sugar routine recovery rest movement strength flexibility breathing mindful
+anxiety symptoms condition treatment doctor evidence benefits effects people adults children older common
+changes long term short regular moderate small simple practical important healthy better lower higher
+often several many most some researchers found trial review participants compared group results overall
+""".split()
+
+
+def zipf_weights(count, skew):
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def pick(rng, items, cum_weights):
+    return items[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def sentence(rng, low=8, high=22):
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    return ' '.join(words).capitalize() + '.'
+
+
+def paragraph(rng, topic=None):
+    sentences = [sentence(rng) for _ in range(rng.randint(2, 6))]
+    if topic:
+        sentences[0] = f'{topic} {sentences[0][0].lower()}{sentences[0][1:]}'
+    return ' '.join(sentences)
+
+
+def body(rng, topic):
+    """HTML with the structure of an editorial article: intro, sections, lists, the odd image"""
+    parts = [f'<p>{paragraph(rng, topic)}</p>']
+    sections = min(12, 2 + int(rng.expovariate(1 / 4)))
+    for _ in range(sections):
+        parts.append(f'<h2>{rng.choice(HEADINGS)}</h2>')
+        for _ in range(rng.randint(1, 4)):
+            parts.append(f'<p>{paragraph(rng)}</p>')
+        roll = rng.random()
+        if roll < 0.25:
+            items = ''.join(f'<li>{sentence(rng, 4, 10)}</li>' for _ in range(rng.randint(3, 6)))
+            parts.append(f'<ul>{items}</ul>')
+        elif roll < 0.35:
+            parts.append(f'<h3>{rng.choice(HEADINGS)}</h3><p>{paragraph(rng)}</p>')
+        elif roll < 0.42:
+            parts.append(f'<blockquote>{sentence(rng)}</blockquote>')
+        elif roll < 0.47:
+            parts.append(f'<figure><img src="{rng.choice(IMAGES)}" alt="{topic}"><figcaption>{sentence(rng, 4, 8)}</figcaption></figure>')
+    return ''.join(parts)
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk inserts keep the dates set on the rows instead of the current time"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DataGenerator:
+    """Writes numbered synthetic rows of each phase, chunk by chunk"""
+
+    def __init__(self, seed=0, articles=0, users=0, subscribers=0, likes=0, saves=0, batch_size=1000, index=True):
+        """likes and saves are the mean number per user"""
+        self.seed = seed
+        self.volumes = {'articles': articles, 'users': users, 'interactions': users, 'subscribers': subscribers}
+        self.likes = likes
+        self.saves = saves
+        self.batch_size = batch_size
+        self.index = index
+        self.categories = []
+        self.category_weights = []
+        self.password = ''
+        self.until = None
+        self.popular = None
+
+    def prepare(self):
+        """Create the taxonomy and whatever every chunk shares; run once before chunks"""
+        taxonomy = Taxonomy()
+        for slug, subcategories in TAXONOMY.items():
+            category_id = taxonomy.category_id(slug)
+            subs = [(taxonomy.subcategory_id(category_id, sub), sub.replace('-', ' ').title()) for sub in subcategories]
+            self.categories.append((category_id, slug.replace('-', ' ').title(), subs, zipf_weights(len(subs), CATEGORY_SKEW)))
+        # Named as the category's own name, for search postings
+        names = dict(Category.objects.filter(pk__in=[row[0] for row in self.categories]).values_list('pk', 'name'))
+        self.categories = [(pk, names[pk], subs, weights) for pk, _, subs, weights in self.categories]
+        self.category_weights = zipf_weights(len(self.categories), CATEGORY_SKEW)
+        # One hash for every user: hashing half a million passwords would take hours
+        self.password = make_password(PASSWORD)
+        self.until = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return taxonomy.created
+
+    def tasks(self, phase):
+        """(phase, start, stop) of every chunk of the phase"""
+        total = self.volumes[phase]
+        return [(phase, start, min(start + self.batch_size, total)) for start in range(0, total, self.batch_size)]
+
+    def run(self, phase, start, stop):
+        """Write rows start to stop of a phase, returning Counter of rows written and chunks skipped"""
+        return getattr(self, f'write_{phase}')(start, stop)
+
+    def rng(self, kind, number):
+        # String seeds are hashed with SHA-512, the same in every process
+        return random.Random(f'{self.seed}:{kind}:{number}')
+
+    def moment(self, rng, after=None):
+        """A past date, skewed towards the run's"""
+        start = after or self.until - timedelta(days=HISTORY_DAYS)
+        return self.until - (self.until - start) * rng.random() ** 2
+
+    def person(self, rng):
+        return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+    def headline(self, rng):
+        """(category, subcategory_id, topic, title): an article's first draws"""
+        category = pick(rng, self.categories, self.category_weights)
+        subcategory_id, topic = None, category[1]
+        if rng.random() >= NO_SUBCATEGORY_RATE:
+            subcategory_id, topic = pick(rng, category[2], category[3])
+        title = rng.choice(TITLES).format(count=rng.randint(3, 12), topic=topic, benefit=rng.choice(BENEFITS))
+        return category, subcategory_id, topic, title
+
+    def article_slug(self, number):
+        title = self.headline(self.rng('article', number))[3]
+        return f'{slugify(title)}-{number}'
+
+    def article(self, number):
+        rng = self.rng('article', number)
+        (category_id, category_name, _, _), subcategory_id, topic, title = self.headline(rng)
+        html = body(rng, topic)
+        created_at = self.moment(rng)
+        article = Article(
+            title=title,
+            slug=f'{slugify(title)}-{number}',
+            excerpt=sentence(rng, 14, 26),
+            content=html,
+            image_url=rng.choice(IMAGES),
+            category_id=category_id,
+            subcategory_id=subcategory_id,
+            author=rng.choice(AUTHORS),
+            tags=', '.join(dict.fromkeys([topic.lower()] + rng.sample(WORDS, rng.randint(2, 4)))),
+            views=int(rng.lognormvariate(5, 1.5)),
+            status='draft' if rng.random() < DRAFT_RATE else 'published',
+            is_featured=rng.random() < FEATURED_RATE,
+            created_at=created_at,
+            updated_at=self.moment(rng, after=created_at),
+            **content.derive(html),
+        )
+        # For search postings, without a query
+        article.category = Category(pk=category_id, name=category_name)
+        return article
+
+    def missing(self, model, field, keys):
+        """Numbers of the rows, keyed {key: number}, not written yet"""
+        existing = set(model.objects.filter(**{f'{field}__in': keys}).values_list(field, flat=True))
+        return [number for key, number in keys.items() if key not in existing]
+
+    def write_articles(self, start, stop):
+        numbers = self.missing(Article, 'slug', {self.article_slug(number): number for number in range(start, stop)})
+        if not numbers:
+            return Counter(skipped=stop - start)
+        articles = [self.article(number) for number in numbers]
+        fields = [Article._meta.get_field('created_at'), Article._meta.get_field('updated_at')]
+        with transaction.atomic(), explicit_timestamps(*fields):
+            Article.objects.bulk_create(articles)
+            if self.index:
+                if not all(article.pk for article in articles):
+                    # Backends that can't return ids from a bulk insert
+                    pks = dict(Article.objects.filter(slug__in=[a.slug for a in articles]).values_list('slug', 'pk'))
+                    for article in articles:
+                        article.pk = pks[article.slug]
+                postings, documents = [], []
+                for article in articles:
+                    if article.status != 'published':
+                        continue
+                    article_postings, lengths = search.build_postings(article)
+                    postings += article_postings
+                    documents.append(SearchDocument(
+                        article_id=article.pk, **{f'{field}_length': length for field, length in lengths.items()}
+                    ))
+                SearchPosting.objects.bulk_create(postings, batch_size=2000)
+                SearchDocument.objects.bulk_create(documents)
+        return Counter(articles=len(articles), skipped=stop - start - len(articles))
+
+    def user(self, number):
+        rng = self.rng('user', number)
+        first_name, last_name = self.person(rng)
+        return User(
+            username=f'{USERNAME_PREFIX}{number}',
+            email=f'{first_name}.{last_name}{number}@example.com'.lower(),
+            first_name=first_name,
+            last_name=last_name,
+            password=self.password,
+            date_joined=self.moment(rng),
+        )
+
+    def write_users(self, start, stop):
+        numbers = self.missing(User, 'username', {f'{USERNAME_PREFIX}{number}': number for number in range(start, stop)})
+        if not numbers:
+            return Counter(skipped=stop - start)
+        users = [self.user(number) for number in numbers]
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if all(user.pk for user in users):
+                user_ids = [user.pk for user in users]
+            else:
+                user_ids = User.objects.filter(username__in=[user.username for user in users]).values_list('pk', flat=True)
+            UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in user_ids])
+        return Counter(users=len(users), skipped=stop - start - len(users))
+
+    def popular_articles(self):
+        """Published article ids, most popular first; the same order in every process"""
+        if self.popular is None:
+            pks = list(Article.objects.published().order_by('pk').values_list('pk', flat=True))
+            random.Random(f'{self.seed}:popularity').shuffle(pks)
+            self.popular = (array('q', pks), zipf_weights(len(pks), POPULARITY_SKEW))
+        return self.popular
+
+    def picks(self, rng, mean):
+        """A user's share of articles: how many is exponential, which ones Zipf-skewed"""
+        articles, weights = self.popular_articles()
+        wanted = min(int(rng.expovariate(1 / mean)) if mean else 0, len(articles))
+        chosen = set()
+        # Popular articles come up again; give up on the long tail eventually
+        for _ in range(wanted * 4):
+            if len(chosen) == wanted:
+                break
+            chosen.add(pick(rng, articles, weights))
+        return sorted(chosen)
+
+    def write_interactions(self, start, stop):
+        profiles = dict(
+            UserProfile.objects.filter(user__username__in=[f'{USERNAME_PREFIX}{n}' for n in range(start, stop)])
+            .values_list('user__username', 'pk')
+        )
+        # Users with likes or saves already had theirs written; picks move
+        # when articles were added since, so the rows can't be matched
+        done = set(LikedArticle.objects.filter(userprofile_id__in=profiles.values()).values_list('userprofile_id', flat=True))
+        done.update(SavedArticle.objects.filter(userprofile_id__in=profiles.values()).values_list('userprofile_id', flat=True))
+        likes, saves = [], []
+        for number in range(start, stop):
+            profile_id = profiles.get(f'{USERNAME_PREFIX}{number}')
+            if profile_id is None or profile_id in done:
+                continue
+            rng = self.rng('interactions', number)
+            likes += [LikedArticle(userprofile_id=profile_id, article_id=pk) for pk in self.picks(rng, self.likes)]
+            saves += [SavedArticle(userprofile_id=profile_id, article_id=pk) for pk in self.picks(rng, self.saves)]
+        with transaction.atomic():
+            LikedArticle.objects.bulk_create(likes, batch_size=5000)
+            SavedArticle.objects.bulk_create(saves, batch_size=5000)
+        return Counter(likes=len(likes), saves=len(saves), skipped=len(done))
+
+    def subscriber(self, number):
+        rng = self.rng('subscriber', number)
+        first_name, last_name = self.person(rng)
+        return Newsletter(
+            email=f'{first_name}.{last_name}.{number}@{rng.choice(SUBSCRIBER_DOMAINS)}'.lower(),
+            is_active=rng.random() >= UNSUBSCRIBED_RATE,
+            subscribed_at=self.moment(rng),
+        )
+
+    def write_subscribers(self, start, stop):
+        subscribers = {subscriber.email: subscriber for subscriber in map(self.subscriber, range(start, stop))}
+        existing = set(Newsletter.objects.filter(email__in=subscribers).values_list('email', flat=True))
+        subscribers = [subscriber for email, subscriber in subscribers.items() if email not in existing]
+        if not subscribers:
+            return Counter(skipped=stop - start)
+        with transaction.atomic(), explicit_timestamps(Newsletter._meta.get_field('subscribed_at')):
+            Newsletter.objects.bulk_create(subscribers)
+        return Counter(subscribers=len(subscribers), skipped=stop - start - len(subscribers))
+
+    def finish(self):
+        """Refresh what the model signals would have maintained"""
+        for _ in counts.verify_counts(fix=True):
+            pass
+        for _ in reconcile_likes(batch_size=5000, fix=True):
+            pass
+        search.index_changed()
+        bump_home_version()
+        autocomplete.bump_version()
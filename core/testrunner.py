@@ -0,0 +1,16 @@
+"""
+Test runner
+Every request a test makes is held to its view's query budget, whether
+or not the test asserts on it: the query inspector runs in strict mode,
+so an overrun fails the test instead of logging a warning.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_INSPECTOR = True
+        settings.QUERY_BUDGET_STRICT = True
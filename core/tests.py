@@ -1,3 +1,1344 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.models import Max
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import clear_url_caches, resolve, reverse
+from PIL import Image
+
+from admin_panel import stats as dashboard_stats
+from .counters import view_counter
+from .events import event_log
+from .importer import ArticleImporter, iter_articles, prepare
+from .models import Article, ArticleDailyStat, ArticleEvent, Category, RelatedArticle, Newsletter, SearchDocument, SubCategory, UserProfile
+from .queryinspector import QueryRecorder, get_query_budget, normalize_sql
+from .pagination import ARTICLE_ORDERINGS, ARTICLE_STATUSES, KeysetPaginator, encode_cursor
+from . import auth, autocomplete, benchmark, content, counters, counts, events, export, fragments, interactions, membership, related, renditions, routing, search as search_engine, synthetic, trending, urls as core_urls, views
+
+
+def create_sample_content(categories=3, articles_per_category=6):
+    """Create enough categories and articles for per-row query patterns to show"""
+    articles = []
+    for c in range(categories):
+        category = Category.objects.create(name=f'Category {c}', slug=f'category-{c}', order=c)
+        subcategory = SubCategory.objects.create(name=f'Sub {c}', slug=f'sub-{c}', category=category)
+        for a in range(articles_per_category):
+            articles.append(Article.objects.create(
+                title=f'Healthy habit {c}-{a}',
+                slug=f'healthy-habit-{c}-{a}',
+                excerpt='Simple ways to sleep better and eat well.',
+                content='<p>Sleep, nutrition and exercise all matter.</p>',
+                category=category,
+                subcategory=subcategory,
+                is_featured=a == 0,
+                is_trending=a == 1,
+            ))
+    Newsletter.objects.create(email='reader@example.com')
+    return articles
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class QueryBudgetTestCase(TestCase):
+    """Fails when a view runs more queries than the budget declared next to it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.articles = create_sample_content()
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password', first_name='Rea')
+        cls.profile = UserProfile.objects.create(user=cls.user)
+        cls.profile.saved_articles.add(*cls.articles[:5])
+        cls.profile.liked_articles.add(*cls.articles[5:10])
+
+    def setUp(self):
+        cache.clear()
+        view_counter.flush()
+        event_log.flush()
+
+    def tearDown(self):
+        # Buffered writes belong to this test's database
+        view_counter.flush()
+        event_log.flush()
+
+    def assertWithinBudget(self, path, method='get', data=None):
+        budget = get_query_budget(resolve(path.split('?')[0]).func)
+        self.assertIsNotNone(budget, f'No query budget declared for {path}')
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(path, data or {})
+        if len(recorder) > budget:
+            report = '\n'.join(
+                f'  {group.count} x {group.shape[:120]} {list(group.locations)}'
+                for group in recorder.groups()
+            )
+            self.fail(f'{path} ran {len(recorder)} queries, budget is {budget}:\n{report}')
+        return response
+
+
+class CoreQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_every_view_declares_a_budget(self):
+        for pattern in core_urls.urlpatterns:
+            self.assertIsNotNone(get_query_budget(pattern.callback), f'{pattern.name} has no query budget')
+
+    def test_home(self):
+        self.assertWithinBudget(reverse('core:home'))
+
+    def test_category(self):
+        self.assertWithinBudget(reverse('core:category', args=['category-0']))
+
+    def test_article_detail(self):
+        related.rebuild()
+        self.assertWithinBudget(reverse('core:article_detail', args=[self.articles[0].slug]))
+
+    def test_trending_api(self):
+        self.assertWithinBudget(reverse('core:trending_api') + '?limit=5')
+
+    def test_search(self):
+        self.assertWithinBudget(reverse('core:search') + '?q=healthy+sleep')
+
+    def test_profile(self):
+        self.assertWithinBudget(reverse('core:profile'))
+
+    def test_like_and_save(self):
+        article = self.articles[-1]
+        self.assertWithinBudget(reverse('core:like_article', args=[article.id]), method='post')
+        self.assertWithinBudget(reverse('core:save_article', args=[article.id]), method='post')
+        self.assertWithinBudget(reverse('core:remove_saved_article', args=[article.id]))
+
+    def test_newsletter_subscribe(self):
+        self.assertWithinBudget(reverse('core:newsletter_subscribe'), method='post', data={'email': 'new@example.com'})
+
+    def test_signin_page(self):
+        self.client.logout()
+        self.assertWithinBudget(reverse('core:signin'))
+        self.assertWithinBudget(reverse('core:signup'))
+
+
+class QueryInspectorTests(TestCase):
+
+    def test_normalize_sql_strips_literals(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id = 12 AND name = 'x''y' AND pk IN (%s, %s)"),
+            'SELECT * FROM t WHERE id = ? AND name = ? AND pk IN (...)',
+        )
+
+    def test_repeated_template_lookups_are_flagged(self):
+        create_sample_content(categories=1)
+        from django.template import Context, Template
+        template = Template('{% for a in articles %}{{ a.category.name }}{% endfor %}')
+        with QueryRecorder() as recorder:
+            template.render(Context({'articles': Article.objects.all()}))
+        groups = recorder.n_plus_one()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0].count, 6)
+        self.assertEqual(list(groups[0].locations), ['<unknown source>:1'])
+
+
+class ViewCounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.article = create_sample_content(categories=1, articles_per_category=1)[0]
+
+    def test_timer_flushes_without_new_views(self):
+        counter = counters.ViewCounter({**counters.get_config(), 'BACKEND': 'memory'})
+        counter.record(self.article.id)
+        counter.last_flush -= counter.config['FLUSH_INTERVAL']
+        # One pass of the timer loop, run here so it uses this test's connection
+        with mock.patch.object(counters, 'connection'):
+            with mock.patch.object(counters.time, 'sleep', side_effect=[None, StopIteration]):
+                with self.assertRaises(StopIteration):
+                    counter.run_timer()
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 1)
+
+    def test_evicted_keys_keep_their_views(self):
+        buffer = counters.CacheBuffer('default')
+        buffer.add(self.article.id, 3)
+        with mock.patch.object(buffer.cache, 'decr', side_effect=ValueError):
+            self.assertEqual(buffer.drain(), {self.article.id: 3})
+
+
+class CategoryCountTests(TestCase):
+
+    def test_counts_follow_article_writes(self):
+        articles = create_sample_content(categories=2, articles_per_category=3)
+        first, second = Category.objects.order_by('order')
+        article = articles[0]
+        article.status = 'draft'
+        article.save()
+        article.category = second
+        article.subcategory = None
+        article.save()
+        articles[1].delete()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.article_count, first.published_count), (1, 1))
+        self.assertEqual((second.article_count, second.published_count), (4, 3))
+        self.assertEqual(list(counts.verify_counts()), [])
+
+        # A counter that drifted low stops at 0 rather than breaking its CHECK constraint
+        Category.objects.filter(pk=first.pk).update(article_count=0, published_count=0)
+        articles[2].delete()
+        first.refresh_from_db()
+        self.assertEqual((first.article_count, first.published_count), (0, 0))
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_sample_content(categories=1, articles_per_category=7)
+        # Ties on views so the id tiebreaker matters
+        Article.objects.filter(pk__in=Article.objects.order_by('pk').values('pk')[:4]).update(views=3)
+
+    def walk(self, ordering):
+        paginator = KeysetPaginator(Article.objects.all(), ordering, per_page=3)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_pages_cover_the_ordering_in_both_directions(self):
+        for ordering in ARTICLE_ORDERINGS.values():
+            paginator, pages = self.walk(ordering)
+            expected = list(Article.objects.order_by(*ordering))
+            self.assertEqual([article for page in pages for article in page], expected)
+            self.assertFalse(pages[0].has_previous)
+            self.assertEqual([len(page) for page in pages], [3, 3, 1])
+            back = paginator.get_page(pages[2].previous_cursor)
+            self.assertEqual(list(back), list(pages[1]))
+            self.assertTrue(back.has_next)
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(Article.objects.all(), ARTICLE_ORDERINGS['newest'], per_page=3)
+        first = list(paginator.get_page())
+        for cursor in ('garbage', encode_cursor(['x', 'y']), encode_cursor([1]), encode_cursor([None, None])):
+            self.assertEqual(list(paginator.get_page(cursor)), first)
+
+    def test_category_page_ignores_malformed_cursors(self):
+        self.client.force_login(User.objects.create_user('reader'))
+        url = reverse('core:category', args=['category-0'])
+        newest = Article.objects.order_by(*ARTICLE_ORDERINGS['newest']).first()
+        for sort in ARTICLE_ORDERINGS:
+            for cursor in (encode_cursor([None, None]), encode_cursor([{}, []]), encode_cursor([True, 1])):
+                response = self.client.get(url, {'sort': sort, 'cursor': cursor})
+                self.assertContains(response, newest.title)
+
+    def test_search_cursor_continues_the_ranking(self):
+        search_engine.rebuild_index()
+        ranked = search_engine.search('sleep', per_page=100).article_ids
+        first = search_engine.search('sleep', per_page=4)
+        second = search_engine.search('sleep', cursor=first.next_cursor, per_page=4)
+        self.assertEqual(first.article_ids + second.article_ids, ranked)
+        self.assertFalse(second.has_next)
+
+        # Later pages reuse the ranking until the index changes
+        with mock.patch.object(search_engine, 'rank', wraps=search_engine.rank) as rank:
+            search_engine.search('sleep', cursor=first.next_cursor, per_page=4)
+            rank.assert_not_called()
+            search_engine.index_article(Article.objects.get(pk=ranked[0]))
+            search_engine.search('sleep', cursor=first.next_cursor, per_page=4)
+            rank.assert_called_once()
+
+        # A common term reads only its highest-impact postings, scored as before
+        with mock.patch.object(search_engine, 'MAX_POSTINGS_PER_TERM', 3):
+            capped = search_engine.rank(['habit'])
+        self.assertEqual(len(capped), 3)
+        self.assertEqual(capped, [item for item in search_engine.rank(['habit']) if item in capped])
+
+        # Unpublished articles leave the index, so totals count only what the site shows
+        draft = Article.objects.get(pk=ranked[0])
+        draft.status = 'draft'
+        draft.save()
+        results = search_engine.search('sleep', per_page=100)
+        self.assertEqual(results.total, len(ranked) - 1)
+        self.assertNotIn(draft.pk, results.article_ids)
+        self.assertEqual(search_engine.rebuild_index(), Article.objects.published().count())
+        self.assertFalse(SearchDocument.objects.filter(article=draft).exists())
+
+
+class ArticleCardTests(TestCase):
+
+    def test_cards_match_the_model_without_loading_content(self):
+        create_sample_content(categories=2, articles_per_category=2)
+        Article.objects.filter(pk=Article.objects.order_by('pk')[0].pk).update(image_url='images/sleep.jpg')
+        with QueryRecorder() as recorder:
+            cards = list(Article.objects.cards())
+        self.assertEqual(len(recorder), 1)
+        self.assertNotIn('"content"', recorder.queries[0]['sql'])
+        for card, article in zip(cards, Article.objects.select_related('category')):
+            self.assertEqual(card.pk, article.pk)
+            self.assertEqual(card.category.name, article.category.name)
+            self.assertEqual(card.get_image_url(), article.get_image_url())
+            self.assertEqual(card.get_absolute_url(), article.get_absolute_url())
+
+
+class MembershipTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.articles = create_sample_content(categories=1, articles_per_category=3)
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        cls.profile = UserProfile.objects.create(user=cls.user)
+        cls.profile.saved_articles.add(cls.articles[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_sets_follow_toggles(self):
+        first, second = self.articles[:2]
+        self.assertTrue(membership.for_user(self.user).is_saved(first.pk))
+        with QueryRecorder() as recorder:
+            saved_liked = membership.for_user(self.user)
+        self.assertEqual(len(recorder), 0)
+        self.assertFalse(saved_liked.is_liked(second.pk))
+
+        interactions.toggle_like(self.profile.pk, second.pk)
+        interactions.toggle_save(self.profile.pk, first.pk)
+        saved_liked = membership.for_user(self.user)
+        self.assertTrue(saved_liked.is_liked(second.pk))
+        self.assertFalse(saved_liked.is_saved(first.pk))
+
+    def test_annotate_cards(self):
+        cards = membership.for_user(self.user).annotate(Article.objects.order_by('pk').cards())
+        self.assertEqual([card.is_saved for card in cards], [True, False, False])
+
+    def test_per_process_cache_keeps_sets_briefly(self):
+        # Another worker's toggle can't invalidate this process's copy
+        for shared, timeout in ((True, membership.CACHE_TIMEOUT), (False, membership.LOCAL_CACHE_TIMEOUT)):
+            cache.clear()
+            with self.subTest(shared=shared), override_settings(SHARED_CACHE=shared), \
+                    mock.patch.object(membership.cache, 'set_many', wraps=cache.set_many) as set_many:
+                membership.for_user(self.user)
+                self.assertEqual(set_many.call_args.args[1], timeout)
+
+
+class InteractionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.articles = create_sample_content(categories=1, articles_per_category=3)
+        cls.profile = UserProfile.objects.create(user=User.objects.create_user('reader'))
+
+    def test_reconcile_likes_repairs_drift(self):
+        first, second, third = self.articles
+        interactions.toggle_like(self.profile.pk, first.pk)
+        interactions.toggle_like(self.profile.pk, second.pk)
+        Article.objects.filter(pk=first.pk).update(likes=7)
+        Article.objects.filter(pk=second.pk).update(likes=0)
+        drift = [(first.pk, 7, 1), (second.pk, 0, 1)]
+        self.assertEqual(list(interactions.reconcile_likes(batch_size=2)), drift)
+        # Reporting alone leaves the counters as they were
+        self.assertEqual(Article.objects.get(pk=first.pk).likes, 7)
+        self.assertEqual(list(interactions.reconcile_likes(batch_size=2, fix=True)), drift)
+        self.assertEqual(list(Article.objects.order_by('pk').values_list('likes', flat=True)), [1, 1, 0])
+        self.assertEqual(list(interactions.reconcile_likes()), [])
+
+    def test_concurrent_like_is_not_counted_twice(self):
+        article = self.articles[0]
+        LikedArticle = interactions.LikedArticle
+        # Another request inserts the row between this toggle's delete and insert
+        LikedArticle.objects.create(userprofile_id=self.profile.pk, article_id=article.pk)
+        Article.objects.filter(pk=article.pk).update(likes=1)
+        nothing_to_delete = mock.Mock(**{'delete.return_value': (0, {})})
+        with mock.patch.object(LikedArticle.objects, 'filter', return_value=nothing_to_delete):
+            self.assertEqual(interactions.toggle_like(self.profile.pk, article.pk), (True, 1))
+        self.assertEqual(Article.objects.get(pk=article.pk).likes, 1)
+        self.assertEqual(LikedArticle.objects.filter(article_id=article.pk).count(), 1)
+
+
+class ImporterTests(TestCase):
+
+    def feed(self, articles):
+        return io.StringIO(json.dumps({'meta': {'articles': 0}, 'articles': articles, 'categories': []}))
+
+    def test_stream_decodes_across_reads(self):
+        articles = [{'slug': f'a-{i}', 'title': 'T' * i, 'views': i * 1000} for i in range(40)]
+        self.assertEqual(list(iter_articles(self.feed(articles), read_size=7)), articles)
+
+    def test_reimport_skips_unchanged_rows(self):
+        articles = [
+            {'slug': f'tea-{i}', 'title': f'Tea {i}', 'category': 'nutrition', 'subcategory': 'drinks',
+             'content': '<p>Green tea</p>', 'readTime': '3 min read'}
+            for i in range(5)
+        ]
+        importer = ArticleImporter(batch_size=2)
+        importer.run(map(prepare, iter_articles(self.feed(articles))))
+        version = autocomplete.current_version()
+        importer.finish()
+        self.assertNotEqual(autocomplete.current_version(), version)
+        self.assertEqual(importer.stats['created'], 5)
+        self.assertEqual(Category.objects.get(slug='nutrition').article_count, 5)
+
+        articles[0]['title'] = 'Oolong'
+        importer = ArticleImporter(batch_size=2)
+        stats = importer.run(map(prepare, iter_articles(self.feed(articles))))
+        self.assertEqual((stats['created'], stats['updated'], stats['unchanged']), (0, 1, 4))
+        self.assertEqual(Article.objects.get(slug='tea-0').title, 'Oolong')
+        # Derived from the content rather than the feed's readTime
+        self.assertEqual(Article.objects.get(slug='tea-1').plain_text, 'Green tea')
+        self.assertEqual(Article.objects.get(slug='tea-1').read_time, 1)
+
+
+class SyntheticDataTests(TestCase):
+
+    def generate(self, batch_size, **volumes):
+        generator = synthetic.DataGenerator(seed=7, batch_size=batch_size, **volumes)
+        generator.prepare()
+        written = Counter()
+        for phase in synthetic.PHASES:
+            for task in generator.tasks(phase):
+                written += generator.run(*task)
+        generator.finish()
+        return generator, written
+
+    def test_generates_consistent_data_and_resumes(self):
+        volumes = {'articles': 12, 'users': 6, 'subscribers': 5, 'likes': 3, 'saves': 2}
+        generator, written = self.generate(5, **volumes)
+        self.assertEqual((written['articles'], written['users'], written['subscribers']), (12, 6, 5))
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith=synthetic.USERNAME_PREFIX).count(), 6)
+        self.assertEqual(list(counts.verify_counts()), [])
+        self.assertEqual(list(interactions.reconcile_likes()), [])
+        self.assertEqual(search_engine.index_stats()['documents'], 12)
+        article = Article.objects.order_by('pk').first()
+        self.assertTrue(article.content_html and article.toc)
+        self.assertLess(article.created_at, timezone.now() - timedelta(hours=1))
+
+        # Rows don't depend on the batch size, and written chunks are skipped
+        again, written = self.generate(4, **volumes)
+        self.assertEqual(again.article(3).content, generator.article(3).content)
+        self.assertEqual(written['articles'] + written['users'] + written['subscribers'], 0)
+        self.assertEqual(Article.objects.count(), 12)
+
+        # Larger volumes only add the difference
+        _, written = self.generate(5, **{**volumes, 'articles': 15})
+        self.assertEqual(written['articles'], 3)
+        self.assertEqual(Article.objects.count(), 15)
+
+
+class ArticleQueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.articles = create_sample_content()
+        cls.draft = cls.articles[6]
+        Article.objects.filter(pk=cls.draft.pk).update(status='draft')
+
+    def plans(self, func):
+        """EXPLAIN output of every query func runs, with the parameters it ran with"""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            func()
+        plans = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # A few rows are cheaper to scan; ask for the plan large tables get
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for sql, params in queries:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                plans.append(' '.join(str(value) for row in cursor.fetchall() for value in row))
+        return plans
+
+    def assertUsesIndex(self, func, index):
+        plans = self.plans(func)
+        self.assertTrue(any(index in plan for plan in plans), plans)
+        # SQLite's sort step: rows should come off the index in order
+        self.assertFalse(any('TEMP B-TREE' in plan for plan in plans), plans)
+
+    def test_hot_queries_use_indexes(self):
+        category = self.draft.category
+        category_page = lambda sort: list(KeysetPaginator(
+            Article.objects.in_category(category).cards(), ARTICLE_ORDERINGS[sort], views.CATEGORY_ARTICLES_PER_PAGE,
+        ).get_page(None))
+        cases = {
+            'article_featured_idx': views._home_featured_article,
+            'article_flagged_idx': lambda: list(Article.objects.trending().cards()[:4]),
+            'article_pub_popular_idx': lambda: list(views._most_viewed(8)),
+            'article_pub_recent_idx': lambda: list(Article.objects.published().order_by('-created_at', '-id').cards()[:4]),
+            'article_pub_trending_idx': lambda: list(trending.top(8)),
+            'article_cat_pub_recent_idx': lambda: category_page('newest'),
+            'article_cat_pub_popular_idx': lambda: category_page('popular'),
+            'article_cat_pub_updated_idx': lambda: Article.objects.in_category(category).aggregate(Max('updated_at')),
+        }
+        for index, func in cases.items():
+            with self.subTest(index=index):
+                self.assertUsesIndex(func, index)
+
+    def test_admin_lists_read_each_status_off_the_indexes(self):
+        category = self.draft.category
+        admin_page = lambda articles: list(KeysetPaginator(
+            articles.cards(), ARTICLE_ORDERINGS['newest'], 15, partition=ARTICLE_STATUSES,
+        ).get_page(None))
+        self.assertUsesIndex(lambda: admin_page(Article.objects.all()), 'article_pub_recent_idx')
+        self.assertUsesIndex(lambda: admin_page(Article.objects.filter(category=category)), 'article_cat_pub_recent_idx')
+        # Merged in order across both statuses
+        self.assertEqual(
+            [card.id for card in admin_page(Article.objects.all())],
+            list(Article.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[:15]),
+        )
+
+    def test_drafts_stay_off_the_site(self):
+        Article.objects.filter(pk=self.draft.pk).update(is_featured=True, is_trending=True)
+        self.assertNotIn(self.draft, Article.objects.in_category(self.draft.category))
+        self.assertNotIn(self.draft, Article.objects.featured())
+        self.assertNotIn(self.draft, Article.objects.trending())
+        self.client.force_login(User.objects.create_user('reader', password='password'))
+        self.assertEqual(self.client.get(self.draft.get_absolute_url()).status_code, 404)
+        self.assertEqual(self.client.post(reverse('core:save_article', args=[self.draft.pk])).status_code, 404)
+
+
+@override_settings(EVENT_LOG={'SETTLE_SECONDS': 0})
+class ArticleEventTests(TestCase):
+
+    def setUp(self):
+        self.articles = create_sample_content(categories=1, articles_per_category=2)
+        event_log.flush()
+
+    def test_rollup_counts_each_event_once(self):
+        first, second = self.articles
+        for kind in ('view', 'view', 'like', 'save', 'unsave'):
+            events.record_event(first.id, kind)
+        events.record_event(second.id, 'view')
+        event_log.flush()
+        self.assertEqual(events.rollup(batch_size=2), 6)
+        self.assertEqual(events.rollup(), 0)
+
+        stat = ArticleDailyStat.objects.get(article=first)
+        self.assertEqual((stat.views, stat.likes, stat.saves), (2, 1, 0))
+
+        # Later events for the same day update the existing row
+        events.record_event(first.id, 'view')
+        event_log.flush()
+        events.rollup()
+        stat.refresh_from_db()
+        self.assertEqual(stat.views, 3)
+
+        today = stat.date
+        self.assertEqual(events.daily_series(2, today=today)[-1], (today, 4, 1, 0))
+        self.assertEqual(events.daily_series(2, article_id=second.id, today=today)[0][1:], (0, 0, 0))
+
+    def test_purge_keeps_events_not_rolled_up(self):
+        article = self.articles[0]
+        events.record_event(article.id, 'view')
+        event_log.flush()
+        events.rollup()
+        events.record_event(article.id, 'view')
+        event_log.flush()
+        # Trending has read nothing yet
+        self.assertEqual(events.purge(retention_days=-1), 0)
+        trending.update()
+        self.assertEqual(events.purge(retention_days=-1), 1)
+        self.assertEqual(ArticleEvent.objects.count(), 1)
+        self.assertIn(trending.CHECKPOINT, events.CONSUMERS)
+
+    def test_timer_writes_without_new_events(self):
+        log = events.EventLog()
+        log.add(self.articles[0].id, 'view')
+        log.last_flush -= log.config['FLUSH_INTERVAL']
+        # One pass of the timer loop, run here so it uses this test's connection
+        with mock.patch.object(events, 'connection'):
+            with mock.patch.object(events.time, 'sleep', side_effect=[None, StopIteration]):
+                with self.assertRaises(StopIteration):
+                    log.run_timer()
+        self.assertEqual(ArticleEvent.objects.count(), 1)
+        self.assertEqual(log.pending, [])
+
+    def test_rollup_waits_for_events_to_settle(self):
+        article = self.articles[0]
+        now = timezone.now()
+        # A lower id committed after a higher one: neither may be passed until both have settled
+        ArticleEvent.objects.bulk_create([
+            ArticleEvent(article=article, kind='view', created_at=now, logged_at=now),
+            ArticleEvent(article=article, kind='view', created_at=now, logged_at=now - timedelta(minutes=1)),
+        ])
+        with override_settings(EVENT_LOG={'SETTLE_SECONDS': 30}):
+            self.assertEqual(events.rollup(), 0)
+            self.assertEqual(trending.update(), 0)
+        self.assertEqual(events.rollup(), 2)
+        self.assertEqual(trending.update(), 2)
+
+    def test_flush_drops_events_of_deleted_articles(self):
+        kept, deleted = self.articles
+        log = events.EventLog()
+        log.add(kept.id, 'view')
+        log.add(deleted.id, 'view')
+        insert = log.insert
+
+        def check_articles(pending):
+            # What the deferred foreign key check does at commit
+            if any(not Article.objects.filter(pk=article_id).exists() for article_id, _, _ in pending):
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            insert(pending)
+
+        deleted.delete()
+        with mock.patch.object(log, 'insert', side_effect=check_articles), self.assertLogs('core.events', 'WARNING'):
+            self.assertEqual(log.flush(), 1)
+        self.assertEqual(list(ArticleEvent.objects.values_list('article_id', flat=True)), [kept.id])
+        self.assertEqual(log.pending, [])
+
+    def test_failed_flush_keeps_the_newest_events(self):
+        article = self.articles[0]
+        log = events.EventLog({**events.get_config(), 'MAX_PENDING': 3})
+        with mock.patch.object(log, 'insert', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('core.events') as logs:
+            for kind in ('view', 'like', 'save', 'unsave'):
+                log.add(article.id, kind)
+                self.assertEqual(log.flush(), 0)
+        self.assertEqual([kind for _, kind, _ in log.pending], ['like', 'save', 'unsave'])
+        self.assertIn('dropped the 1 oldest events', logs.output[-1])
+        self.assertEqual(log.flush(), 3)
+
+
+class RelatedArticleTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Wellness', slug='wellness')
+        topics = [
+            ('green-tea', 'Green tea benefits', 'tea, antioxidants', 'Green tea is rich in antioxidants.'),
+            ('matcha', 'Matcha versus green tea', 'tea, caffeine', 'Matcha is powdered green tea leaf.'),
+            ('sleep', 'Sleep hygiene basics', 'sleep, rest', 'A dark bedroom helps you sleep.'),
+            ('naps', 'Short naps and sleep', 'sleep, energy', 'Naps restore energy without hurting sleep.'),
+            ('squats', 'Squats for strength', 'exercise, strength', 'Squats build leg strength.'),
+        ]
+        self.articles = {
+            slug: Article.objects.create(
+                title=title, slug=slug, tags=tags, excerpt='', content=f'<p>{content}</p>', category=category,
+            )
+            for slug, title, tags, content in topics
+        }
+
+    def neighbours(self, slug):
+        return list(related.related_articles(self.articles[slug]).values_list('slug', flat=True))
+
+    def test_rebuild_ranks_similar_articles_first(self):
+        self.assertEqual(related.rebuild(), 5)
+        self.assertEqual(self.neighbours('green-tea')[0], 'matcha')
+        self.assertEqual(self.neighbours('sleep')[0], 'naps')
+        self.assertFalse(Article.objects.filter(related_stale=True).exists())
+
+    def test_update_follows_text_and_status_changes(self):
+        related.rebuild()
+        squats = self.articles['squats']
+        squats.content = '<p>Squats before green tea.</p>'
+        squats.save()
+        self.assertEqual(list(Article.objects.filter(related_stale=True)), [squats])
+
+        before = dict(RelatedArticle.objects.filter(article__slug='sleep').values_list('rank', 'related_id'))
+        related.update()
+        self.assertIn('squats', self.neighbours('green-tea'))
+        self.assertEqual(before, dict(RelatedArticle.objects.filter(article__slug='sleep').values_list('rank', 'related_id')))
+
+        # Unpublished articles drop out of every list
+        squats.status = 'draft'
+        squats.save()
+        related.update()
+        self.assertFalse(RelatedArticle.objects.filter(related=squats).exists())
+        self.assertFalse(RelatedArticle.objects.filter(article=squats).exists())
+
+
+@override_settings(TRENDING={'HALF_LIFE_HOURS': 24}, EVENT_LOG={'SETTLE_SECONDS': 0})
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        self.articles = create_sample_content(categories=1, articles_per_category=3)
+
+    def log(self, article, kind, hours_ago, count=1):
+        moment = timezone.now() - timedelta(hours=hours_ago)
+        ArticleEvent.objects.bulk_create([
+            ArticleEvent(article=article, kind=kind, created_at=moment) for _ in range(count)
+        ])
+
+    def test_recent_activity_outranks_older_activity(self):
+        old, recent, quiet = self.articles
+        # Two days of decay quarter the weight of old's views
+        self.log(old, 'view', hours_ago=48, count=10)
+        self.log(recent, 'view', hours_ago=0, count=3)
+        self.assertEqual(trending.update(batch_size=4), 13)
+        self.assertEqual([card.id for card in trending.top()], [recent.id, old.id])
+
+        old.refresh_from_db()
+        self.assertAlmostEqual(trending.current_score(old.trending_score), 2.5, places=3)
+
+        # Only articles with new activity are rewritten
+        self.log(old, 'like', hours_ago=0)
+        quiet_score = Article.objects.get(pk=quiet.pk).trending_score
+        self.assertEqual(trending.update(), 1)
+        self.assertEqual([card.id for card in trending.top()], [old.id, recent.id])
+        self.assertEqual(Article.objects.get(pk=quiet.pk).trending_score, quiet_score)
+
+
+class FragmentCacheTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_warm_home_reads_only_the_session_and_user(self):
+        self.assertWithinBudget(reverse('core:home'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('core:home'))
+
+    def test_article_and_category_writes_bump_the_version(self):
+        article = self.articles[0]
+        category = article.category
+        writes = (
+            article.save, category.save,
+            lambda: Article.objects.get(pk=self.articles[1].pk).delete(),
+            lambda: Category.objects.create(name='Empty', slug='empty').delete(),
+        )
+        for write in writes:
+            version = fragments.home_version()
+            write()
+            self.assertGreater(fragments.home_version(), version)
+
+    def test_per_process_caches_expire_fragments_quickly(self):
+        self.assertEqual(fragments.fragment_timeout(), fragments.LOCAL_FRAGMENT_TIMEOUT)
+        with override_settings(SHARED_CACHE=True):
+            self.assertEqual(fragments.fragment_timeout(), fragments.FRAGMENT_TIMEOUT)
+
+
+class ConditionalGetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def revalidate(self, path):
+        etag = self.client.get(path)['ETag']
+        return self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_rendered(self):
+        for path in (
+            reverse('core:home'),
+            reverse('core:category', args=['category-0']),
+            reverse('core:article_detail', args=[self.articles[0].slug]),
+        ):
+            response = self.revalidate(path)
+            self.assertEqual(response.status_code, 304, path)
+            self.assertFalse(hasattr(response, 'templates') and response.templates, path)
+            self.assertIn('private', response['Cache-Control'])
+
+    def test_article_changes_and_user_state_refresh_the_page(self):
+        article = self.articles[0]
+        path = reverse('core:article_detail', args=[article.slug])
+        etag = self.client.get(path)['ETag']
+
+        interactions.toggle_save(self.profile.id, article.id)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(path)['ETag']
+        article.title = 'Renamed'
+        article.save()
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Another user gets their own copy
+        etag = self.client.get(path)['ETag']
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_not_modified_article_still_counts_the_view(self):
+        article = self.articles[0]
+        self.revalidate(reverse('core:article_detail', args=[article.slug]))
+        view_counter.flush()
+        article.refresh_from_db()
+        self.assertEqual(article.views, 2)
+
+
+class ContentPipelineTests(TestCase):
+
+    def test_derive_sanitizes_and_outlines(self):
+        derived = content.derive(
+            '<h2>Why sleep</h2><p onclick="x()">Rest <script>alert(1)</script>matters.</p>'
+            '<img src="/a.png" onerror="x()"><a href="javascript:x()">link</a>'
+            '<h3>Why sleep</h3><p>More ' + 'words ' * 400 + '</p>'
+        )
+        html = derived['content_html']
+        self.assertNotIn('script', html)
+        self.assertNotIn('onclick', html)
+        self.assertNotIn('javascript', html)
+        self.assertIn('<img src="/a.png" loading="lazy" decoding="async">', html)
+        self.assertIn('<h2 id="why-sleep">', html)
+        self.assertEqual(derived['toc'], [
+            {'level': 2, 'id': 'why-sleep', 'title': 'Why sleep'},
+            {'level': 3, 'id': 'why-sleep-2', 'title': 'Why sleep'},
+        ])
+        self.assertTrue(derived['plain_text'].startswith('Why sleep\nRest matters.\nlink'))
+        self.assertEqual(derived['word_count'], 408)
+        self.assertEqual(derived['read_time'], 3)
+
+    def test_plain_text_content_keeps_its_line_breaks(self):
+        self.assertEqual(content.derive('One\n\nTwo')['content_html'], '<p>One</p>\n\n<p>Two</p>')
+
+    def test_unchanged_content_is_not_reprocessed(self):
+        article = create_sample_content(categories=1, articles_per_category=1)[0]
+        self.assertEqual(article.plain_text, 'Sleep, nutrition and exercise all matter.')
+        self.assertFalse(content.process(article))
+
+        Article.objects.filter(pk=article.pk).update(content='<p>Changed in bulk</p>')
+        self.assertEqual(content.process_articles(), (1, 1))
+        self.assertEqual(Article.objects.get(pk=article.pk).plain_text, 'Changed in bulk')
+        self.assertEqual(content.process_articles(), (1, 0))
+
+
+class AutocompleteTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        autocomplete.autocomplete = autocomplete.Autocomplete()
+
+    def suggest(self, query):
+        # Look at the version on every request instead of once a second
+        autocomplete.autocomplete.checked = 0
+        response = self.assertWithinBudget(f'/site/api/autocomplete/?q={query}')
+        return [(item['type'], item['title']) for item in response.json()['suggestions']]
+
+    def test_suggestions_match_any_word_by_popularity(self):
+        Article.objects.filter(pk=self.articles[7].pk).update(views=50)
+        Article.objects.filter(pk=self.articles[2].pk).update(likes=20, tags='Sleep hygiene, Insomnia')
+        suggestions = self.suggest('habit')
+        self.assertEqual(suggestions[:2], [('article', 'Healthy habit 0-2'), ('article', 'Healthy habit 1-1')])
+        self.assertEqual(len(suggestions), 8)
+        self.assertEqual(self.suggest('INSOM'), [('article', 'Healthy habit 0-2')])
+        self.assertEqual(self.suggest('category 1'), [('category', 'Category 1')])
+        self.assertEqual(self.suggest('  '), [])
+
+    def test_warm_index_reads_only_the_session_and_user(self):
+        self.suggest('hea')
+        with self.assertNumQueries(2):
+            response = self.client.get('/site/api/autocomplete/?q=healthy+habit+2&limit=3')
+        self.assertEqual(
+            [item['url'] for item in response.json()['suggestions']],
+            [f'/site/article/healthy-habit-2-{a}/' for a in range(3)],
+        )
+
+    def test_changes_are_folded_in(self):
+        self.suggest('habit')
+        article = self.articles[0]
+        article.title = 'Morning walks'
+        article.save()
+        self.assertEqual(self.suggest('walk'), [('article', 'Morning walks')])
+        self.assertNotIn(('article', 'Healthy habit 0-0'), self.suggest('habit'))
+
+        article.status = 'draft'
+        article.save()
+        self.assertEqual(self.suggest('walk'), [])
+
+        self.articles[1].delete()
+        category = self.articles[6].category
+        category.name = 'Fitness'
+        category.save()
+        self.assertNotIn(('article', 'Healthy habit 0-1'), self.suggest('habit'))
+        self.assertEqual(self.suggest('fit'), [('category', 'Fitness')])
+
+    def test_per_process_caches_sync_on_the_clock(self):
+        self.suggest('habit')
+        article = self.articles[0]
+        # Saved in another worker, whose version bump this one's cache never sees
+        with mock.patch.object(autocomplete, 'bump_version'):
+            article.status = 'draft'
+            article.save()
+        self.assertIn(('article', 'Healthy habit 0-0'), self.suggest('habit 0-0'))
+        autocomplete.autocomplete.refreshed -= autocomplete.LOCAL_REFRESH_INTERVAL
+        self.assertEqual(self.suggest('habit 0-0'), [])
+
+        # A shared cache carries every bump, so there is no need to poll
+        with override_settings(SHARED_CACHE=True), mock.patch.object(autocomplete, 'bump_version'):
+            article.status = 'published'
+            article.save()
+            autocomplete.autocomplete.refreshed -= autocomplete.LOCAL_REFRESH_INTERVAL
+            self.assertEqual(self.suggest('habit 0-0'), [])
+
+    def test_signed_out_visitors_are_sent_to_sign_in(self):
+        self.client.logout()
+        response = self.client.get('/site/api/autocomplete/?q=hea')
+        self.assertRedirects(response, reverse('core:signin'), fetch_redirect_response=False)
+
+    def test_kept_results_follow_changes(self):
+        index = autocomplete.PrefixIndex(
+            autocomplete.article_item((pk, f'Sleep tip {pk}', f'tip-{pk}', 'rest', pk, 0, 1, 'published'), 0)
+            for pk in range(40)
+        )
+        index.rank_short_prefixes()
+        for prefix in ('sleep', 'sleep tip 1', 're'):
+            index.lookup(prefix, 5)
+        # Leaving the top, entering it, moving within it and disappearing
+        for pk, view_count in ((39, 0), (3, 100), (35, 36)):
+            index.add(*autocomplete.article_item((pk, f'Sleep tip {pk}', f'tip-{pk}', 'rest', view_count, 0, 1, 'published'), 0))
+        index.remove(('article', 38))
+        for results in (index.short, index.results):
+            for prefix, ranked in results.items():
+                self.assertEqual(ranked, index.rank(prefix), prefix)
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=['core.auth.CachedModelBackend'],
+    SHARED_CACHE=True,
+)
+class CachedAuthTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def auth_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        tables = ('django_session', 'auth_user', 'core_userprofile')
+        return response, [query['sql'] for query in queries if any(table in query['sql'] for table in tables)]
+
+    def test_steady_state_pages_skip_session_user_and_profile(self):
+        self.auth_queries('/site/')
+        response, queries = self.auth_queries('/site/')
+        self.assertEqual(queries, [])
+        self.assertContains(response, '<span class="header-auth-name">Rea</span>', html=True)
+        # The article page still reads saved/liked state, but not the session or user
+        response, queries = self.auth_queries(f'/site/article/{self.articles[0].slug}/')
+        self.assertEqual([sql for sql in queries if 'django_session' in sql or 'FROM "auth_user"' in sql], [])
+
+    def test_user_and_profile_writes_refresh_the_header(self):
+        self.auth_queries('/site/')
+        self.client.post('/site/profile/', {'first_name': 'Renamed', 'last_name': '', 'email': 'r@example.com'})
+        response, _ = self.auth_queries('/site/')
+        self.assertContains(response, 'Renamed')
+
+        # Staff changes made elsewhere, e.g. admin_panel's user_toggle_staff
+        user = User.objects.get(pk=self.user.pk)
+        user.is_staff = True
+        user.save()
+        self.assertIsNone(cache.get(auth.user_key(user.pk)))
+        self.client.get('/site/')
+        self.assertTrue(cache.get(auth.snapshot_key(user.pk))['is_staff'])
+
+        UserProfile.objects.get(user=user).save()
+        self.assertIsNone(cache.get(auth.snapshot_key(user.pk)))
+
+    @override_settings(SHARED_CACHE=False)
+    def test_per_process_cache_keeps_snapshots_briefly(self):
+        with mock.patch.object(auth.cache, 'set', wraps=cache.set) as cache_set:
+            self.client.get('/site/')
+        timeouts = {call.args[0]: call.args[2] for call in cache_set.call_args_list}
+        self.assertEqual(timeouts[auth.snapshot_key(self.user.pk)], auth.LOCAL_SNAPSHOT_TIMEOUT)
+
+    def test_deactivated_users_are_signed_out(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/site/profile/')
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncViewTestCase(QueryBudgetTestCase):
+    """Routes the JSON endpoints to their async views, as ASYNC_VIEWS does"""
+
+    @staticmethod
+    def reload_urls():
+        from admin_panel import urls as admin_urls
+        # The routes are picked when the URLconfs are imported, and included ones are kept by the root's
+        importlib.reload(core_urls)
+        importlib.reload(admin_urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reload_urls()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.reload_urls()
+
+
+class AsyncViewTests(AsyncViewTestCase):
+    """The async JSON endpoints, requested the way ASGI serves them"""
+
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(self.user)
+
+    async def test_like_and_save(self):
+        article = self.articles[-1]
+        likes = await Article.objects.filter(pk=article.pk).values_list('likes', flat=True).aget()
+        url = reverse('core:like_article', args=[article.id])
+        response = await self.async_client.post(url)
+        self.assertEqual(response.json(), {'success': True, 'liked': True, 'likes_count': likes + 1})
+        # Queries run in a worker thread, where the inspector records them too
+        self.assertTrue(0 < int(response['X-Query-Count']) <= 7)
+        response = await self.async_client.post(url)
+        self.assertEqual(response.json()['likes_count'], likes)
+
+        response = await self.async_client.post(reverse('core:save_article', args=[article.id]))
+        self.assertEqual(response.json(), {'success': True, 'saved': True})
+        response = await self.async_client.post(reverse('core:save_article', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_method_and_login_checks(self):
+        url = reverse('core:like_article', args=[self.articles[0].id])
+        with self.assertLogs('django.request', 'WARNING'):
+            response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 405)
+        await sync_to_async(self.async_client.logout)()
+        response = await self.async_client.post(url)
+        self.assertRedirects(response, f"{reverse('core:signin')}?next={url}", fetch_redirect_response=False)
+
+    async def test_newsletter_subscribe(self):
+        url = reverse('core:newsletter_subscribe')
+        response = await self.async_client.post(url, {'email': 'new@example.com'})
+        self.assertTrue(response.json()['success'])
+        response = await self.async_client.post(url, {'email': 'new@example.com'})
+        self.assertEqual(response.json()['error'], 'Email already subscribed')
+        await Newsletter.objects.filter(email='new@example.com').aupdate(is_active=False)
+        response = await self.async_client.post(url, {'email': 'new@example.com'})
+        self.assertTrue(response.json()['success'])
+        self.assertTrue(await Newsletter.objects.filter(email='new@example.com', is_active=True).aexists())
+
+    def test_routed_to_async_views(self):
+        self.assertIs(resolve(reverse('core:like_article', args=[1])).func, views.alike_article)
+
+
+class BenchmarkTests(TestCase):
+
+    def row(self, requests=100, errors=0, rps=50.0, p50=10.0, p95=20.0, p99=30.0, queries=5.0):
+        return {'requests': requests, 'errors': errors, 'rps': rps, 'mean': p50, 'p50': p50, 'p95': p95, 'p99': p99, 'queries': queries}
+
+    def test_compare_applies_thresholds(self):
+        baseline = {'home': self.row(), 'search': self.row(), 'sign_in': self.row(requests=5), 'like_article': self.row()}
+        results = {
+            'home': self.row(p95=30.0, queries=6.0),
+            # Within the thresholds, or too small to matter
+            'search': self.row(p50=11.0, p99=33.0, rps=45.0),
+            'sign_in': self.row(requests=2, rps=1.0),
+            'like_article': self.row(requests=0, errors=40),
+            'new_step': self.row(p99=500.0),
+        }
+        regressions = benchmark.compare(baseline, results)
+        self.assertEqual(regressions, [
+            'home: p95 30.0ms, baseline 20.0ms (limit 25.0ms)',
+            'home: 6.00 queries/request, baseline 5.00',
+            'like_article: 100.0% of requests failed, baseline 0.0%',
+        ])
+
+    def test_load_run_summarizes_steps(self):
+        class Transport:
+            def send(self, step):
+                return (200, 3) if step.name == 'home' else (500, None)
+
+            def close(self):
+                pass
+
+        scenario = benchmark.MixScenario([benchmark.Step('home', 'GET', '/'), benchmark.Step('broken', 'GET', '/broken/')])
+        results = benchmark.LoadRun(scenario, Transport, concurrency=2, duration=0.05, warmup=0).run()
+        self.assertGreater(results['home']['requests'], 0)
+        self.assertEqual(results['home']['queries'], 3)
+        self.assertEqual(results['broken']['requests'], 0)
+        self.assertEqual(results['total']['errors'], results['broken']['errors'])
+
+    def test_site_visitors_sign_in_and_browse(self):
+        create_sample_content()
+        related.rebuild()
+        dashboard_stats.refresh_all()
+        with benchmark.benchmark_users(benchmark.STAFF_EVERY) as (users, password):
+            scenario = benchmark.site_scenario(users, password)
+            transport = benchmark.ClientTransport()
+            # The last visitor is staff, so its first round covers every step
+            steps = scenario.steps(benchmark.STAFF_EVERY - 1)
+            names = []
+            for step in steps:
+                status, queries = transport.send(step)
+                self.assertIn(status, step.expect, step.name)
+                self.assertIsNotNone(queries)
+                names.append(step.name)
+                if step.name == 'admin_dashboard':
+                    break
+            self.assertEqual(names, [
+                'signin_page', 'sign_in', 'home', 'category', 'article_detail', 'search', 'like_article', 'save_article',
+                'admin_dashboard',
+            ])
+            self.assertTrue(User.objects.get(username=users[-1][0]).is_staff)
+            self.assertEqual(Session.objects.count(), 1)
+        # The run's accounts and their sessions don't outlive it
+        self.assertFalse(User.objects.filter(username__in=[username for username, _ in users]).exists())
+        self.assertFalse(Session.objects.exists())
+        # Buffered writes belong to this test's database
+        view_counter.flush()
+        event_log.flush()
+
+
+@mock.patch.object(routing, 'replica_alias', return_value='replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only; no query reaches either database"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = routing.ReplicaRouter()
+
+    def request(self, method='get', view=None, write=False, cookie=None):
+        """(alias the view's reads went to, response)"""
+        seen = []
+
+        def read_and_write(request):
+            seen.append(self.router.db_for_read(Article))
+            if write:
+                self.router.db_for_write(Article)
+                seen.append(self.router.db_for_read(Article))
+            return HttpResponse()
+
+        request = getattr(self.factory, method)('/site/')
+        if cookie is not None:
+            request.COOKIES[routing.STICKY_COOKIE] = cookie
+        response = routing.ReplicaStickinessMiddleware(view or routing.replica_read(read_and_write))(request)
+        if view is None:
+            return seen, response
+        return response
+
+    def test_page_reads_go_to_the_replica(self, alias):
+        seen, response = self.request()
+        self.assertEqual(seen, ['replica'])
+        self.assertNotIn(routing.STICKY_COOKIE, response.cookies)
+        # Outside requests and unmarked views read the primary
+        self.assertIsNone(self.router.db_for_read(Article))
+        self.assertIsNone(routing.replica_read(lambda request: self.router.db_for_read(Article))(self.factory.get('/')))
+
+    def test_writers_are_pinned_to_the_primary(self, alias):
+        seen, response = self.request(write=True)
+        self.assertEqual(seen, ['replica', None])
+        cookie = response.cookies[routing.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+
+        seen, response = self.request(method='post')
+        self.assertEqual(seen, [None])
+        self.assertIn(routing.STICKY_COOKIE, response.cookies)
+
+        seen, _ = self.request(cookie=cookie.value)
+        self.assertEqual(seen, [None])
+        seen, _ = self.request(cookie=str(int(time.time()) - 1))
+        self.assertEqual(seen, ['replica'])
+        seen, _ = self.request(cookie='garbage')
+        self.assertEqual(seen, ['replica'])
+
+    def test_nothing_is_routed_without_a_replica(self, alias):
+        alias.return_value = None
+        seen, response = self.request(write=True)
+        self.assertEqual(seen, [None, None])
+        self.assertNotIn(routing.STICKY_COOKIE, response.cookies)
+
+
+@override_settings(REPLICA_DATABASE='replica', STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Requests against a real second database standing in for a lagging replica"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Not in DATABASES, so the runner neither creates nor flushes it;
+        # each test copies the primary into it instead
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica'] = dict(
+            connections['default'].settings_dict, NAME=os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.article = create_sample_content(categories=1, articles_per_category=2)[0]
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        related.rebuild()
+        # The replica catches up with everything so far, then falls behind
+        connections['default'].ensure_connection()
+        connections['replica'].ensure_connection()
+        connections['default'].connection.backup(connections['replica'].connection)
+        Article.objects.filter(pk=self.article.pk).update(title='Healthy habit, revised')
+
+    def tearDown(self):
+        view_counter.flush()
+        event_log.flush()
+
+    def test_reads_writes_and_stickiness(self):
+        self.assertEqual(routing.replica_alias(), 'replica')
+        path = reverse('core:article_detail', args=[self.article.slug])
+
+        # Pages read the replica, which hasn't seen the new title
+        response = self.client.get(path)
+        self.assertContains(response, 'Healthy habit 0-0')
+        self.assertNotContains(response, 'Healthy habit, revised')
+        self.assertNotIn(routing.STICKY_COOKIE, response.cookies)
+
+        # Writes go to the primary only, and pin this client to it
+        response = self.client.post(reverse('core:like_article', args=[self.article.id]))
+        self.assertEqual(response.json()['likes_count'], 1)
+        self.assertIn(routing.STICKY_COOKIE, response.cookies)
+        self.assertEqual(Article.objects.using('default').get(pk=self.article.pk).likes, 1)
+        self.assertEqual(Article.objects.using('replica').get(pk=self.article.pk).likes, 0)
+
+        # The pinned client reads its own write from the primary
+        response = self.client.get(path)
+        self.assertContains(response, 'Healthy habit, revised')
+
+        # Once the pin expires, reads go back to the replica
+        self.client.cookies[routing.STICKY_COOKIE] = str(int(time.time()) - 1)
+        response = self.client.get(path)
+        self.assertContains(response, 'Healthy habit 0-0')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class StaticExportTests(TestCase):
+
+    def setUp(self):
+        self.articles = create_sample_content(categories=2, articles_per_category=2)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def export(self):
+        return export.StaticExporter(self.root).run()
+
+    def read(self, path):
+        with open(os.path.join(self.root, path)) as fp:
+            return fp.read()
+
+    def test_export_is_incremental(self):
+        stats = self.export()
+        # Home, search, two categories and four articles
+        self.assertEqual((stats['pages'], stats['rendered']), (8, 8))
+        self.assertIn('Healthy habit 0-0', self.read('site/article/healthy-habit-0-0/index.html'))
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'site/index.html.gz')))
+
+        stats = self.export()
+        self.assertEqual((stats['rendered'], stats['index_written']), (0, 0))
+
+        article = self.articles[0]
+        article.title = 'Sleep well'
+        article.save()
+        stats = self.export()
+        # The article, its category page, the home page and the sibling showing it as related
+        self.assertEqual(stats['rendered'], 4)
+
+        article.status = 'draft'
+        article.save()
+        self.export()
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'site/article/healthy-habit-0-0/index.html')))
+
+    def test_search_index_is_sharded_by_prefix(self):
+        self.export()
+        meta = json.loads(self.read('search-index/meta.json'))
+        self.assertEqual(meta['documents'], 4)
+        self.assertIn('sl', meta['prefixes'])
+        shard = json.loads(self.read('search-index/terms/sl.json'))
+        self.assertEqual({article_id for article_id, weight in shard['sleep']}, {a.id for a in self.articles})
+        self.assertNotIn('nutrition', shard)
+        docs = json.loads(self.read(f'search-index/docs/{self.articles[0].id // export.DOC_SHARD_SIZE}.json'))
+        self.assertEqual(docs[str(self.articles[0].id)][1], 'Healthy habit 0-0')
+
+
+def image_upload(name, size, mode='RGB', format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 80, 40, 128)[:len(mode)]).save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(IMAGE_RENDITIONS={'BACKGROUND': False})
+class ImageRenditionTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media = media
+        self.category = Category.objects.create(name='Sleep', slug='sleep')
+        self.article = Article.objects.create(
+            title='Sleep well', slug='sleep-well', excerpt='Rest.', content='Rest more.', category=self.category,
+        )
+
+    def upload(self, instance, field, upload):
+        setattr(instance, field, upload)
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        instance.refresh_from_db()
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media, name))
+
+    def test_upload_gets_webp_and_jpeg_copies(self):
+        self.upload(self.article, 'image', image_upload('photo.jpg', (2000, 1000)))
+        name = self.article.image.name
+        self.assertEqual(self.article.image_renditions, {'name': name, 'widths': [320, 640, 960, 1280]})
+        for width in (320, 1280):
+            for extension in ('webp', 'jpg'):
+                self.assertTrue(self.exists(f'{name[:-4]}-{width}w.{extension}'))
+        self.assertEqual(self.article.get_image_url(), f'/media/{name[:-4]}-1280w.jpg')
+        card = Article.objects.filter(pk=self.article.pk).cards()[0]
+        self.assertEqual(card.get_image_srcset(), self.article.get_image_srcset())
+        self.assertTrue(self.article.get_image_srcset().startswith(f'/media/{name[:-4]}-320w.webp 320w, '))
+
+        # A replacement is served as uploaded until its copies exist, then the old ones go
+        self.article.image = image_upload('other.png', (500, 400), mode='RGBA', format='PNG')
+        self.article.save()
+        self.assertEqual(self.article.get_image_url(), f'/media/{self.article.image.name}')
+        self.assertEqual(self.article.get_image_srcset(), '')
+        renditions.process('article', self.article.pk)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.image_renditions['widths'], [320, 500])
+        self.assertFalse(self.exists(f'{name[:-4]}-320w.webp'))
+
+    def test_avatar_renditions(self):
+        user = User.objects.create_user('reader')
+        profile = UserProfile.objects.create(user=user)
+        self.upload(profile, 'profile_photo', image_upload('me.jpg', (200, 200)))
+        self.assertEqual(profile.photo_renditions['widths'], [64, 128, 200])
+        self.assertTrue(profile.get_avatar_url().endswith('-200w.jpg'))
+        self.assertIn('-64w.webp 64w', profile.get_avatar_srcset())
+
+    def test_backfill_and_unreadable_uploads(self):
+        with self.assertLogs('core.renditions', 'WARNING'):
+            self.upload(self.category, 'image', SimpleUploadedFile('broken.jpg', b'not an image'))
+        self.assertEqual(self.category.image_renditions['widths'], [])
+        self.assertEqual(self.category.get_image_url(), f'/media/{self.category.image.name}')
+
+        self.upload(self.article, 'image', image_upload('photo.jpg', (400, 300)))
+        Article.objects.filter(pk=self.article.pk).update(image_renditions={})
+        self.assertEqual(renditions.backfill(), {'article': 1, 'category': 0, 'avatar': 0})
+        self.assertEqual(renditions.backfill(), {'article': 0, 'category': 0, 'avatar': 0})
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.image_renditions['widths'], [320, 400])
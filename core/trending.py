@@ -0,0 +1,114 @@
+"""
+Time-decayed trending scores
+Each view, like and save is worth its weight times exp(-age / tau), so
+activity fades with a configurable half-life. Scores use forward decay:
+an event at time t adds weight * exp((t - EPOCH) / tau), which grows
+instead of the old scores shrinking. Ordering by that sum is the same
+as ordering by the decayed score at any moment, so only articles with
+new activity are ever rewritten.
+
+The sum is stored as its logarithm in Article.trending_score to stay in
+float range; articles with no recorded activity keep 0. update() folds
+new ArticleEvent rows in behind its own checkpoint, and trending lists
+are read from the (-trending_score, -id) index. Like the rollups, it only
+reads events core.events.settled_events() has let settle.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .events import settled_events
+from .models import Article, RollupCheckpoint
+
+
+DEFAULTS = {
+    # Hours for an event's contribution to halve
+    'HALF_LIFE_HOURS': 24,
+    # Contribution of each event kind; unlikes and unsaves are not counted
+    'WEIGHTS': {'view': 1.0, 'like': 5.0, 'save': 3.0},
+}
+
+CHECKPOINT = 'trending'
+
+# Fixed origin of the forward-decay clock
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TRENDING', {})}
+
+
+def tau(config=None):
+    """Mean lifetime in seconds for the configured half-life"""
+    config = config or get_config()
+    return config['HALF_LIFE_HOURS'] * 3600 / math.log(2)
+
+
+def log_weight(weight, moment, lifetime):
+    """Forward-decayed log contribution of an event at moment"""
+    return math.log(weight) + (moment - EPOCH).total_seconds() / lifetime
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without overflow"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def current_score(stored, now=None, config=None):
+    """Decayed activity an article has at now, from its stored score"""
+    if not stored:
+        return 0.0
+    now = now or timezone.now()
+    return math.exp(stored - (now - EPOCH).total_seconds() / tau(config))
+
+
+def update_batch(batch_size=5000, config=None):
+    """Fold the next batch of events into trending scores, returning how many were read"""
+    config = config or get_config()
+    lifetime = tau(config)
+    weights = config['WEIGHTS']
+    with transaction.atomic():
+        RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+        checkpoint = RollupCheckpoint.objects.select_for_update().get(name=CHECKPOINT)
+        events = settled_events(checkpoint.last_event_id, batch_size)
+        if not events:
+            return 0
+
+        added = defaultdict(lambda: -math.inf)
+        for pk, article_id, kind, created_at in events:
+            if weights.get(kind, 0) > 0:
+                added[article_id] = log_add(added[article_id], log_weight(weights[kind], created_at, lifetime))
+
+        articles = list(Article.objects.filter(pk__in=added).only('pk', 'trending_score'))
+        for article in articles:
+            stored = article.trending_score or -math.inf
+            article.trending_score = log_add(stored, added[article.pk])
+        Article.objects.bulk_update(articles, ['trending_score'], batch_size=500)
+
+        checkpoint.last_event_id = events[-1][0]
+        checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+    return len(events)
+
+
+def update(batch_size=5000):
+    """Fold every pending event into trending scores, returning how many were read"""
+    config = get_config()
+    read = 0
+    while True:
+        count = update_batch(batch_size, config)
+        read += count
+        if count < batch_size:
+            return read
+
+
+def top(limit=10):
+    """Card queryset of the most trending published articles, read off the index"""
+    return (
+        Article.objects.published().filter(trending_score__gt=0)
+        .order_by('-trending_score', '-id').cards()[:limit]
+    )
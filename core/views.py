@@ -1,14 +1,30 @@
+from functools import wraps
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.http import require_POST
 from django import forms
+from django.db.models import Max
 from django.urls import reverse
 from .models import Category, Article, Newsletter, UserProfile
+from . import asyncviews, autocomplete, conditional, interactions, membership, related, search as search_engine, trending
+from .counters import record_view
+from .events import arecord_event, record_event
+from .fragments import fragment_timeout, home_version
+from .pagination import ARTICLE_ORDERINGS, KeysetPaginator
+from .queryinspector import query_budget
+from .routing import replica_read
+
+
+SEARCH_RESULTS_PER_PAGE = 10
+CATEGORY_ARTICLES_PER_PAGE = 12
+TRENDING_API_DEFAULT = 10
+TRENDING_API_MAX = 50
+AUTOCOMPLETE_API_DEFAULT = 8
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -32,6 +48,7 @@ class CustomUserCreationForm(UserCreationForm):
 
 def frontend_login_required(view_func):
     """Decorator that requires frontend login (separate from admin)"""
+    @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             # Store the attempted URL
@@ -41,111 +58,238 @@ def frontend_login_required(view_func):
     return wrapper
 
 
+def _home_featured_article():
+    """Article shown in the hero section"""
+    return Article.objects.featured().cards().first()
+
+
+def _home_trending_articles():
+    """Editor-flagged trending articles, topped up by trending score, then by views"""
+    trending_articles = list(Article.objects.trending().cards()[:4])
+    # Each top-up reads at most 8 rows off an index
+    for ranked in (trending.top, _most_viewed):
+        if len(trending_articles) >= 4:
+            break
+        trending_articles += [
+            article for article in ranked(8) if article not in trending_articles
+        ][:4 - len(trending_articles)]
+    return trending_articles
+
+
+def _most_viewed(limit):
+    return Article.objects.published().order_by('-views', '-id').cards()[:limit]
+
+
+def _home_featured_articles():
+    """Articles for editor's picks, topped up with the latest if there are too few"""
+    featured_articles = list(Article.objects.featured().cards()[:4])
+    if len(featured_articles) < 4:
+        featured_articles = list(Article.objects.published().order_by('-created_at', '-id').cards()[:4])
+    return featured_articles
+
+
+def _home_categories():
+    """Categories for the category grid with their article counts"""
+    return list(Category.objects.all())
+
+
+@query_budget(10)
+@replica_read
 @frontend_login_required
 def home(request):
     """Home page view"""
-    # Get featured article for hero section
-    featured_article = Article.objects.filter(is_featured=True).first()
-    
-    # Get trending articles (if not enough trending, get most viewed)
-    trending_articles = Article.objects.filter(is_trending=True)[:4]
-    if trending_articles.count() < 4:
-        trending_articles = Article.objects.order_by('-views')[:4]
-    
-    # Get featured articles for editor's picks
-    featured_articles = Article.objects.filter(is_featured=True)[:4]
-    if featured_articles.count() < 4:
-        featured_articles = Article.objects.all()[:4]
-    
-    # Get all categories
-    categories = Category.objects.all()
-    
+    fragment_version = home_version()
+    # Sections are evaluated lazily so that cached fragments never hit the database
     context = {
-        'featured_article': featured_article,
-        'trending_articles': trending_articles,
-        'featured_articles': featured_articles,
-        'categories': categories,
+        'featured_article': SimpleLazyObject(_home_featured_article),
+        'trending_articles': SimpleLazyObject(_home_trending_articles),
+        'featured_articles': SimpleLazyObject(_home_featured_articles),
+        'categories': SimpleLazyObject(_home_categories),
+        'fragment_version': fragment_version,
+        'fragment_timeout': fragment_timeout(),
     }
-    return render(request, 'home.html', context)
+    # Trending and view-based sections change without bumping the version
+    etag = conditional.make_etag(
+        'home', fragment_version, conditional.freshness_bucket(), conditional.user_fingerprint(request),
+    )
+    return conditional.respond(request, etag, None, lambda: render(request, 'home.html', context))
 
 
+@query_budget(9)
+@replica_read
 @frontend_login_required
 def category_view(request, slug):
     """Category page view"""
     category = get_object_or_404(Category, slug=slug)
-    articles = Article.objects.filter(category=category)
+    saved_liked = membership.for_user(request.user)
+    
+    # Any article write bumps updated_at or the count; view counts refresh with the bucket
+    last_modified = Article.objects.in_category(category).aggregate(last=Max('updated_at'))['last']
+    etag = conditional.make_etag(
+        'category', category.pk, category.name, category.description, category.published_count,
+        last_modified, conditional.freshness_bucket(), request.GET.urlencode(),
+        sorted(saved_liked.saved), sorted(saved_liked.liked), conditional.user_fingerprint(request),
+    )
+    return conditional.respond(
+        request, etag, last_modified, lambda: _render_category(request, category, saved_liked),
+    )
+
+
+def _render_category(request, category, saved_liked):
+    """Full render of a category page, only when the client's copy is stale"""
+    articles = Article.objects.in_category(category).cards()
     
     # Filter by subcategory if provided
     subcategory = request.GET.get('sub')
     if subcategory:
         articles = articles.filter(subcategory__slug=subcategory)
     
+    sort = request.GET.get('sort')
+    if sort not in ARTICLE_ORDERINGS:
+        sort = 'newest'
+    paginator = KeysetPaginator(articles, ARTICLE_ORDERINGS[sort], CATEGORY_ARTICLES_PER_PAGE)
+    page = paginator.get_page(request.GET.get('cursor'))
+    saved_liked.annotate(page)
+    
     context = {
         'category': category,
-        'articles': articles,
+        'articles': page,
+        'sort': sort,
         'subcategories': category.subcategories.all(),
     }
     return render(request, 'category.html', context)
 
 
+@query_budget(8)
+@replica_read
 @frontend_login_required
 def article_detail(request, slug):
     """Article detail page view"""
-    article = get_object_or_404(Article, slug=slug)
+    article = get_object_or_404(Article.objects.published().select_related('category').defer('plain_text'), slug=slug)
     
-    # Increment view count
-    article.views += 1
-    article.save(update_fields=['views'])
+    # Count the view; buffered and written to the database in batches
+    record_view(article.id)
+    record_event(article.id, 'view')
     
-    # Get related articles (4 articles in a row)
-    related_articles = Article.objects.filter(
-        category=article.category
-    ).exclude(id=article.id)[:4]
+    # Nearest neighbours precomputed by core.related (4 articles in a row)
+    related_articles = list(related.related_articles(article))
+    if not related_articles:
+        # Not computed yet; fall back to the same category
+        related_articles = Article.objects.in_category(
+            article.category_id
+        ).exclude(id=article.id).order_by('-created_at', '-id').cards()[:4]
     
     # Check if article is saved/liked by user
-    is_saved = False
-    is_liked = False
-    if request.user.is_authenticated:
-        try:
-            profile = request.user.profile
-            is_saved = article in profile.saved_articles.all()
-            is_liked = article in profile.liked_articles.all()
-        except:
-            pass
+    saved_liked = membership.for_user(request.user)
+    related_articles = saved_liked.annotate(related_articles)
     
     context = {
         'article': article,
         'related_articles': related_articles,
-        'is_saved': is_saved,
-        'is_liked': is_liked,
+        'is_saved': saved_liked.is_saved(article.id),
+        'is_liked': saved_liked.is_liked(article.id),
     }
-    return render(request, 'article_detail.html', context)
+    # Likes and the category name change without touching updated_at
+    etag = conditional.make_etag(
+        'article', article.pk, article.updated_at, article.likes, article.category.name,
+        context['is_saved'], context['is_liked'],
+        [(card.slug, card.title, card.get_image_url(), card.read_time, card.is_saved) for card in related_articles],
+        conditional.user_fingerprint(request),
+    )
+    return conditional.respond(
+        request, etag, article.updated_at, lambda: render(request, 'article_detail.html', context),
+    )
+
+
+@query_budget(4)
+@replica_read
+@frontend_login_required
+def trending_api(request):
+    """Most trending articles as JSON, best first"""
+    try:
+        limit = min(max(int(request.GET.get('limit', TRENDING_API_DEFAULT)), 1), TRENDING_API_MAX)
+    except ValueError:
+        limit = TRENDING_API_DEFAULT
+    return JsonResponse({
+        'articles': [{
+            'slug': article.slug,
+            'url': article.get_absolute_url(),
+            'title': article.title,
+            'excerpt': article.excerpt,
+            'category': article.category.name,
+            'image_url': article.get_image_url(),
+            'read_time': article.read_time,
+            'views': article.views,
+            'likes': article.likes,
+        } for article in trending.top(limit)],
+    })
 
 
+# Beyond the session and user, queries only when this process's suggestions are refreshed
+@query_budget(5)
+@frontend_login_required
+def autocomplete_api(request):
+    """Suggestions for a partly typed search query as JSON, from memory"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', AUTOCOMPLETE_API_DEFAULT)), 1), autocomplete.MAX_SUGGESTIONS)
+    except ValueError:
+        limit = AUTOCOMPLETE_API_DEFAULT
+    suggestions = []
+    for entry, category in autocomplete.suggest(query, limit):
+        if entry.kind == 'article':
+            url = reverse('core:article_detail', args=[entry.slug])
+        else:
+            url = reverse('core:category', args=[entry.slug])
+        suggestions.append({
+            'type': entry.kind,
+            'title': entry.label,
+            'url': url,
+            'category': category.label if category else None,
+        })
+    return JsonResponse({'query': query, 'suggestions': suggestions})
+
+
+@query_budget(10)
+@replica_read
 @frontend_login_required
 def search(request):
     """Search results view"""
     query = request.GET.get('q', '')
-    articles = []
     categories = Category.objects.all()
     
-    if query:
-        articles = Article.objects.filter(
-            Q(title__icontains=query) |
-            Q(excerpt__icontains=query) |
-            Q(content__icontains=query) |
-            Q(category__name__icontains=query)
-        ).distinct()
+    cursor = request.GET.get('cursor')
+    results = search_engine.search(query, cursor=cursor, per_page=SEARCH_RESULTS_PER_PAGE) if query else None
+    articles = membership.for_user(request.user).annotate(results.articles) if results else []
+    
+    # Load More button fetches further pages as JSON
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'articles': [{
+                'slug': article.slug,
+                'url': article.get_absolute_url(),
+                'title': article.title,
+                'excerpt': article.excerpt,
+                'category': article.category.name,
+                'image_url': article.get_image_url(),
+                'read_time': article.read_time,
+            } for article in articles],
+            'has_more': bool(results and results.has_next),
+            'next_cursor': results.next_cursor if results else None,
+        })
     
     context = {
         'query': query,
         'articles': articles,
         'categories': categories,
-        'total_results': articles.count() if query else 0,
+        'total_results': results.total if results else 0,
+        'has_more': bool(results and results.has_next),
+        'next_cursor': results.next_cursor if results else None,
     }
     return render(request, 'search_results.html', context)
 
 
+@query_budget(5)
 def signin_view(request):
     """Sign in view"""
     if request.method == 'POST':
@@ -168,6 +312,7 @@ def signin_view(request):
     return render(request, 'signin.html', {'form': form})
 
 
+@query_budget(11)
 def signup_view(request):
     """Sign up view"""
     if request.method == 'POST':
@@ -187,6 +332,7 @@ def signup_view(request):
     return render(request, 'signup.html', {'form': form})
 
 
+@query_budget(4)
 def signout_view(request):
     """Sign out view"""
     logout(request)
@@ -194,12 +340,14 @@ def signout_view(request):
     return redirect('core:home')
 
 
+@query_budget(7)
+@replica_read
 @login_required
 def profile_view(request):
     """User profile view"""
     user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-    saved_articles = user_profile.saved_articles.all()
-    liked_articles = user_profile.liked_articles.all()
+    saved_articles = user_profile.saved_articles.published().cards()
+    liked_articles = user_profile.liked_articles.published().cards()
     
     # Handle settings form submission
     if request.method == 'POST':
@@ -238,6 +386,7 @@ def profile_view(request):
     return render(request, 'profile.html', context)
 
 
+@query_budget(6)
 @require_POST
 def newsletter_subscribe(request):
     """Newsletter subscription AJAX view"""
@@ -263,31 +412,67 @@ def newsletter_subscribe(request):
     return JsonResponse({'success': True, 'message': 'Successfully subscribed!'})
 
 
+@query_budget(6)
+@asyncviews.require_POST
+async def anewsletter_subscribe(request):
+    """newsletter_subscribe for ASGI (ASYNC_VIEWS)"""
+    email = request.POST.get('email')
+    
+    if not email:
+        return JsonResponse({'success': False, 'error': 'Email is required'})
+    
+    # Check if already subscribed
+    if await Newsletter.objects.filter(email=email, is_active=True).aexists():
+        return JsonResponse({'success': False, 'error': 'Email already subscribed'})
+    
+    # Create or reactivate subscription
+    newsletter, created = await Newsletter.objects.aget_or_create(
+        email=email,
+        defaults={'is_active': True}
+    )
+    
+    if not created:
+        newsletter.is_active = True
+        await newsletter.asave()
+    
+    return JsonResponse({'success': True, 'message': 'Successfully subscribed!'})
+
+
+@query_budget(6)
 @require_POST
 @login_required
 def save_article(request, article_id):
     """Save/unsave article for user"""
-    article = get_object_or_404(Article, id=article_id)
-    profile = request.user.profile
+    try:
+        saved = interactions.toggle_save(interactions.get_profile_id(request.user), article_id)
+    except Article.DoesNotExist:
+        raise Http404('Article not found')
+    record_event(article_id, 'save' if saved else 'unsave')
     
-    if article in profile.saved_articles.all():
-        profile.saved_articles.remove(article)
-        saved = False
-    else:
-        profile.saved_articles.add(article)
-        saved = True
+    return JsonResponse({'success': True, 'saved': saved})
+
+
+@query_budget(6)
+@asyncviews.require_POST
+@asyncviews.login_required
+async def asave_article(request, article_id):
+    """save_article for ASGI (ASYNC_VIEWS)"""
+    profile_id = await interactions.aget_profile_id(request.user)
+    try:
+        saved = await interactions.atoggle_save(profile_id, article_id)
+    except Article.DoesNotExist:
+        raise Http404('Article not found')
+    await arecord_event(article_id, 'save' if saved else 'unsave')
     
     return JsonResponse({'success': True, 'saved': saved})
 
 
+@query_budget(4)
 @login_required
 def remove_saved_article(request, article_id):
     """Remove saved article from user's profile"""
-    article = get_object_or_404(Article, id=article_id)
-    profile = request.user.profile
-    
-    if article in profile.saved_articles.all():
-        profile.saved_articles.remove(article)
+    if interactions.remove_saved(interactions.get_profile_id(request.user), article_id):
+        record_event(article_id, 'unsave')
         messages.success(request, 'Article removed from saved list.')
     else:
         messages.error(request, 'Article not found in saved list.')
@@ -295,22 +480,30 @@ def remove_saved_article(request, article_id):
     return redirect('core:profile')
 
 
+@query_budget(7)
 @require_POST
 @login_required
 def like_article(request, article_id):
     """Like/unlike article for user"""
-    article = get_object_or_404(Article, id=article_id)
-    profile = request.user.profile
+    try:
+        liked, likes_count = interactions.toggle_like(interactions.get_profile_id(request.user), article_id)
+    except Article.DoesNotExist:
+        raise Http404('Article not found')
+    record_event(article_id, 'like' if liked else 'unlike')
     
-    if article in profile.liked_articles.all():
-        profile.liked_articles.remove(article)
-        article.likes -= 1
-        liked = False
-    else:
-        profile.liked_articles.add(article)
-        article.likes += 1
-        liked = True
-    
-    article.save(update_fields=['likes'])
+    return JsonResponse({'success': True, 'liked': liked, 'likes_count': likes_count})
+
+
+@query_budget(7)
+@asyncviews.require_POST
+@asyncviews.login_required
+async def alike_article(request, article_id):
+    """like_article for ASGI (ASYNC_VIEWS)"""
+    profile_id = await interactions.aget_profile_id(request.user)
+    try:
+        liked, likes_count = await interactions.atoggle_like(profile_id, article_id)
+    except Article.DoesNotExist:
+        raise Http404('Article not found')
+    await arecord_event(article_id, 'like' if liked else 'unlike')
     
-    return JsonResponse({'success': True, 'liked': liked, 'likes_count': article.likes})
+    return JsonResponse({'success': True, 'liked': liked, 'likes_count': likes_count})
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings, read from the project root by every gunicorn command
+
+The site is served as WSGI: `gunicorn healthline.wsgi` runs sync
+workers, WEB_CONCURRENCY of them (gunicorn's default is 1; use about one
+per CPU core).
+
+ASGI is opt-in. It runs uvicorn event loops instead, with the JSON
+endpoints as async views, and only pays off while requests wait on a
+networked database:
+
+    GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker ASYNC_VIEWS=True \
+        DATABASE_CONN_MAX_AGE=0 gunicorn healthline.asgi
+
+Measure it with `python manage.py benchmark_asgi` first.
+"""
+import os
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+# Seconds a worker may go silent before it's restarted, and to keep idle
+# connections from the load balancer open between requests
+timeout = 30
+keepalive = 5
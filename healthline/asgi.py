@@ -0,0 +1,26 @@
+"""
+ASGI config for healthline project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Async views run on the event loop; sync views and middleware run in a
+worker thread per request. WSGI is the default deployment; serve this
+with ASYNC_VIEWS=True and DATABASE_CONN_MAX_AGE=0 (see gunicorn.conf.py).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthline.settings')
+
+application = get_asgi_application()
+
+# Imported once apps are loaded
+from core.counters import view_counter  # noqa: E402
+from core.events import event_log  # noqa: E402
+
+view_counter.start_timer()
+event_log.start_timer()
@@ -48,7 +48,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise for static files
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise for static files
+    'core.middleware.QueryInspectorMiddleware',  # Query counts and N+1 warnings in development
+    'core.routing.ReplicaStickinessMiddleware',  # Pins clients that just wrote to the primary
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.header',
             ],
         },
     },
@@ -78,16 +81,25 @@ TEMPLATES = [
 WSGI_APPLICATION = 'healthline.wsgi.application'
 
 
+# Route the JSON endpoints to their async views. Only for healthline.asgi
+# under uvicorn workers (see gunicorn.conf.py); WSGI is the default.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
+
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
 # Use DATABASE_URL environment variable for production (PostgreSQL)
 DATABASE_URL = os.environ.get('DATABASE_URL')
+# Seconds to keep connections open between requests. Set it to 0 when
+# serving healthline.asgi: ASGI runs each request in a thread of its own,
+# and connections kept by finished threads would never be reused or closed.
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
 
 if DATABASE_URL:
     # Production database (PostgreSQL)
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=DATABASE_CONN_MAX_AGE)
     }
 else:
     # Development database (SQLite)
@@ -98,6 +110,54 @@ else:
         }
     }
 
+# Read replica (see core/routing.py)
+# Pages marked replica_read read from DATABASE_REPLICA_URL; clients that
+# just wrote keep reading the primary for DATABASE_REPLICA_LAG seconds.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+REPLICA_DATABASE = None
+REPLICA_LAG = float(os.environ.get('DATABASE_REPLICA_LAG', 5))
+
+if DATABASE_REPLICA_URL:
+    REPLICA_DATABASE = 'replica'
+    DATABASES[REPLICA_DATABASE] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=DATABASE_CONN_MAX_AGE)
+    # Tests read the primary's test database through the replica alias
+    DATABASES[REPLICA_DATABASE]['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.routing.ReplicaRouter']
+
+
+# Cache
+# Fragment caches, counters and snapshots live here. Point REDIS_URL at a
+# shared Redis server (requires the redis package) when running several
+# workers so invalidations are seen by all of them.
+REDIS_URL = os.environ.get('REDIS_URL')
+# Whether every worker sees the same cache. Per-user entries that other
+# workers would have to invalidate are only kept for seconds without it.
+SHARED_CACHE = bool(REDIS_URL)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sessions and authentication (see core/auth.py)
+# With a shared cache, sessions are read through it and users are kept in
+# it, so signed-in pages don't query the session and user tables. Workers
+# with their own caches would miss logouts and staff changes made in other
+# workers, so this is only switched on with REDIS_URL.
+if REDIS_URL:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTHENTICATION_BACKENDS = ['core.auth.CachedModelBackend']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -140,10 +200,67 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # WhiteNoise configuration for static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Pre-rendered public site written by the export_static command
+# (see core/export.py); serve it with WHITENOISE_ROOT or any file server
+STATIC_EXPORT_ROOT = os.environ.get('STATIC_EXPORT_ROOT', os.path.join(BASE_DIR, 'static_export'))
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Query inspector (see core/queryinspector.py)
+# Logs per-request query counts, N+1 patterns and query budget overruns.
+# QUERY_BUDGET_STRICT turns overruns into errors; the test runner sets both.
+QUERY_INSPECTOR = os.environ.get('QUERY_INSPECTOR', str(DEBUG)) == 'True'
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False') == 'True'
+TEST_RUNNER = 'core.testrunner.TestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Article view counting (see core/counters.py)
+# Views are buffered and flushed to Article.views in batches. Set
+# VIEW_COUNTER_BACKEND=cache with a shared cache to buffer across workers.
+VIEW_COUNTER = {
+    'BACKEND': os.environ.get('VIEW_COUNTER_BACKEND', 'memory'),
+    'FLUSH_INTERVAL': int(os.environ.get('VIEW_COUNTER_FLUSH_INTERVAL', 10)),
+    'FLUSH_THRESHOLD': int(os.environ.get('VIEW_COUNTER_FLUSH_THRESHOLD', 100)),
+}
+
+# Article event log (see core/events.py)
+# View/like/save events are appended in batches and rolled up into daily
+# stats by the rollup_article_events command, which also deletes raw
+# events older than RETENTION_DAYS.
+EVENT_LOG = {
+    'FLUSH_INTERVAL': int(os.environ.get('EVENT_LOG_FLUSH_INTERVAL', 10)),
+    'FLUSH_THRESHOLD': int(os.environ.get('EVENT_LOG_FLUSH_THRESHOLD', 200)),
+    'MAX_PENDING': int(os.environ.get('EVENT_LOG_MAX_PENDING', 10000)),
+    'SETTLE_SECONDS': int(os.environ.get('EVENT_LOG_SETTLE_SECONDS', 5)),
+    'RETENTION_DAYS': int(os.environ.get('EVENT_LOG_RETENTION_DAYS', 30)),
+}
+
+# Trending scores (see core/trending.py)
+# update_trending_scores folds new events into each article's decayed
+# score; an event's weight halves every HALF_LIFE_HOURS.
+TRENDING = {
+    'HALF_LIFE_HOURS': float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24)),
+}
+
+# Image renditions (see core/renditions.py)
+# Uploads are resized to WebP/JPEG copies in a background thread after
+# they are saved; generate_image_renditions backfills existing media.
+IMAGE_RENDITIONS = {
+    'BACKGROUND': os.environ.get('IMAGE_RENDITIONS_BACKGROUND', 'True') == 'True',
+}
+
 # Login settings
 LOGIN_URL = 'core:signin'
 LOGIN_REDIRECT_URL = 'core:home'
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthline.settings')
 
 application = get_wsgi_application()
+
+# Imported once apps are loaded
+from core.counters import view_counter  # noqa: E402
+from core.events import event_log  # noqa: E402
+
+view_counter.start_timer()
+event_log.start_timer()
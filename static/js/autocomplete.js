@@ -0,0 +1,94 @@
+/**
+ * Healthline Clone - Header search suggestions
+ * Asks the autocomplete API for suggestions as the user types and lists
+ * them under the header search box.
+ */
+
+(function () {
+  const script = document.currentScript;
+  const apiUrl = script.dataset.url;
+  const minChars = 2;
+  const delay = 150;
+
+  const form = document.querySelector('.header-search-form');
+  const input = form && form.querySelector('.header-search-input');
+  const container = form && form.querySelector('.search-suggestions');
+  if (!input || !container) return;
+
+  let timer = null;
+  let controller = null;
+  const cache = new Map();
+
+  function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+  }
+
+  function hide() {
+    container.classList.remove('active');
+    container.innerHTML = '';
+  }
+
+  function show(suggestions) {
+    if (!suggestions.length) {
+      hide();
+      return;
+    }
+    container.innerHTML = suggestions.map(suggestion => `
+      <a class="search-suggestion" href="${escapeHtml(suggestion.url)}">
+        <span class="search-suggestion-text">${escapeHtml(suggestion.title)}</span>
+        <span class="search-suggestion-category">${escapeHtml(suggestion.type === 'category' ? 'Category' : suggestion.category || '')}</span>
+      </a>
+    `).join('');
+    container.classList.add('active');
+  }
+
+  async function fetchSuggestions(query) {
+    if (cache.has(query)) return cache.get(query);
+    if (controller) controller.abort();
+    controller = new AbortController();
+    const response = await fetch(`${apiUrl}?q=${encodeURIComponent(query)}`, { signal: controller.signal });
+    const data = await response.json();
+    cache.set(query, data.suggestions);
+    return data.suggestions;
+  }
+
+  input.addEventListener('input', () => {
+    clearTimeout(timer);
+    const query = input.value.trim();
+    if (query.length < minChars) {
+      hide();
+      return;
+    }
+    timer = setTimeout(async () => {
+      try {
+        const suggestions = await fetchSuggestions(query);
+        // Ignore answers for text the user has since changed
+        if (input.value.trim() === query) show(suggestions);
+      } catch (error) {
+        if (error.name !== 'AbortError') hide();
+      }
+    }, delay);
+  });
+
+  input.addEventListener('keydown', (e) => {
+    const items = [...container.querySelectorAll('.search-suggestion')];
+    const current = items.findIndex(item => item.classList.contains('active'));
+    if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+      if (!items.length) return;
+      e.preventDefault();
+      const next = e.key === 'ArrowDown' ? Math.min(current + 1, items.length - 1) : Math.max(current - 1, 0);
+      items.forEach((item, index) => item.classList.toggle('active', index === next));
+    } else if (e.key === 'Enter' && current >= 0) {
+      e.preventDefault();
+      window.location.href = items[current].href;
+    } else if (e.key === 'Escape') {
+      hide();
+    }
+  });
+
+  document.addEventListener('click', (e) => {
+    if (!form.contains(e.target)) hide();
+  });
+})();
@@ -0,0 +1,99 @@
+/**
+ * Healthline Clone - Search for the static export
+ * Looks the query up in the sharded index written by export_static,
+ * downloading only the term shards for the query's words and the
+ * metadata shards for the results shown.
+ */
+
+(function () {
+  const script = document.currentScript;
+  const indexUrl = script.dataset.indexUrl;
+  const maxResults = 20;
+
+  const fetchJson = (path) => fetch(indexUrl + path).then(response => response.ok ? response.json() : {});
+
+  function tokenize(text, meta) {
+    const stopWords = new Set(meta.stop_words);
+    return [...new Set((text.toLowerCase().match(/[a-z0-9]+/g) || [])
+      .filter(token => token.length > 1 && !stopWords.has(token))
+      .map(token => token.slice(0, meta.max_term_length)))];
+  }
+
+  async function rank(terms, meta) {
+    const prefixes = new Set(meta.prefixes);
+    const wanted = [...new Set(terms.map(term => term.slice(0, meta.prefix_length)))].filter(prefix => prefixes.has(prefix));
+    const shards = {};
+    await Promise.all(wanted.map(async prefix => { shards[prefix] = await fetchJson(`terms/${prefix}.json`); }));
+
+    // Same BM25 sum as the live search: idf times the stored term weight
+    const scores = new Map();
+    terms.forEach(term => {
+      const postings = (shards[term.slice(0, meta.prefix_length)] || {})[term] || [];
+      const df = postings.length;
+      const idf = Math.log(1 + (meta.documents - df + 0.5) / (df + 0.5));
+      postings.forEach(([id, weight]) => scores.set(id, (scores.get(id) || 0) + idf * weight));
+    });
+    return [...scores.entries()].sort((a, b) => b[1] - a[1] || a[0] - b[0]);
+  }
+
+  async function documents(ids, meta) {
+    const numbers = [...new Set(ids.map(id => Math.floor(id / meta.doc_shard_size)))];
+    const docs = {};
+    await Promise.all(numbers.map(async number => Object.assign(docs, await fetchJson(`docs/${number}.json`))));
+    return ids.filter(id => docs[id]).map(id => docs[id]);
+  }
+
+  function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+  }
+
+  function render(query, total, docs) {
+    const hero = document.querySelector('.search-hero p');
+    if (hero) {
+      hero.textContent = `Found ${total} result${total === 1 ? '' : 's'} for "${query}"`;
+    }
+    const input = document.querySelector('.search-form-large input[name="q"]');
+    if (input) {
+      input.value = query;
+    }
+    if (!docs.length) {
+      return;
+    }
+    const list = document.createElement('div');
+    list.className = 'search-results-list';
+    list.innerHTML = docs.map(([url, title, excerpt, category, image, readTime]) => `
+      <article class="search-result-item">
+        <a href="${url}">
+          <div class="search-result-image">
+            <img src="${image}" alt="${escapeHtml(title)}" loading="lazy">
+          </div>
+          <div class="search-result-content">
+            <span class="search-result-category">${escapeHtml(category)}</span>
+            <h3 class="search-result-title">${escapeHtml(title)}</h3>
+            <p class="search-result-excerpt">${escapeHtml(excerpt)}</p>
+            <div class="search-result-meta">
+              <span>${readTime} min read</span>
+            </div>
+          </div>
+        </a>
+      </article>
+    `).join('');
+    const empty = document.querySelector('.no-results');
+    if (empty) {
+      empty.replaceWith(list);
+    }
+  }
+
+  document.addEventListener('DOMContentLoaded', async function () {
+    const query = new URLSearchParams(window.location.search).get('q') || '';
+    if (!query.trim()) {
+      return;
+    }
+    const meta = await fetchJson('meta.json');
+    const ranked = await rank(tokenize(query, meta), meta);
+    const docs = await documents(ranked.slice(0, maxResults).map(([id]) => id), meta);
+    render(query, ranked.length, docs);
+  });
+})();